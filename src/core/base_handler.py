@@ -1,20 +1,25 @@
 # src/core/base_handler.py
 from abc import ABC, abstractmethod
+from src.core.user_context import UserContext
 
 class BaseHandler(ABC):
     priority: int = 0  # Default priority, higher numbers processed first
+    # Dispatch index: what this handler owns, so the webhook can route to it without trying the whole chain
+    reply_ids: tuple = ()  # Exact button_reply/list_reply ids, e.g. ('docs_btn',)
+    reply_prefixes: tuple = ()  # Reply id prefixes, e.g. ('doc_file_',)
+    text_intents: tuple = ()  # Exact texts (case-insensitive) routed here when no conversation context is active
 
     @abstractmethod
-    def try_process_interactive(self, sender_id: str, company_id: str, interactive_data: dict) -> bool:
+    def try_process_interactive(self, ctx: UserContext, interactive_data: dict) -> bool:
         """Process interactive messages (buttons, lists). Return True if handled."""
         pass
 
     @abstractmethod
-    def try_process_text(self, sender_id: str, company_id: str, text: str) -> bool:
+    def try_process_text(self, ctx: UserContext, text: str) -> bool:
         """Process text messages. Return True if handled."""
         pass
 
-    def check_context(self, sender_id: str, company_id: str, msg_type: str, data: any) -> bool:
+    def check_context(self, ctx: UserContext, msg_type: str, data: any) -> bool:
         """Stub: Override in subclasses to validate if action is user-prompted and contextually valid.
         Prevents ghost messaging by ensuring no unprompted sends."""
         # Default: Always true; subclasses should implement strict checks, e.g., via bot_state
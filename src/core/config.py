@@ -35,8 +35,83 @@ BOT_PHONE_NUMBER = os.getenv("BOT_PHONE_NUMBER")
 EMAIL_FEEDBACK_TO = os.getenv("EMAIL_FEEDBACK_TO")
 EMAIL_HR_TO = os.getenv("EMAIL_HR_TO")
 GROK_MODEL = os.getenv("GROK_MODEL", "grok-3-mini")  # Default to grok-3-mini if not set
+GROK_API_URL = os.getenv("GROK_API_URL", "https://api.x.ai/v1")  # Any OpenAI-compatible base URL (e.g. a local stub)
 DB_HOST = os.getenv("DB_HOST")
 DB_NAME = os.getenv("DB_NAME")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_PORT = os.getenv("DB_PORT", "5432")  # Default to 5432 if not set
-DB_USER = os.getenv("DB_USER")
\ No newline at end of file
+DB_USER = os.getenv("DB_USER")
+
+# Optional tuning (defaults are sized for one gunicorn worker)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))  # Connections kept open per worker process
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "4"))  # Extra short-lived connections under burst
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Close connections older than this (seconds)
+DB_POOL_IDLE_TIMEOUT = int(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # Close connections idle longer than this
+DB_POOL_PING_AFTER = int(os.getenv("DB_POOL_PING_AFTER", "30"))  # Health-check connections idle longer than this
+SESSION_JSONB_PATCH = os.getenv("SESSION_JSONB_PATCH", "true").lower() == "true"  # Patch changed keys instead of rewriting data
+SESSION_FLUSH_RETRIES = int(os.getenv("SESSION_FLUSH_RETRIES", "2"))  # Rebase-and-retry attempts on version conflicts
+STATE_BACKEND = os.getenv("STATE_BACKEND", "postgres").lower()  # Sessions/dedup/rate limit: "postgres" or "redis"
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "proquery:")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(30 * 24 * 3600)))  # Redis sessions expire after 30 idle days
+DEDUP_TTL_SECONDS = int(os.getenv("DEDUP_TTL_SECONDS", str(7 * 24 * 3600)))  # How long processed message ids are remembered
+DEDUP_PRUNE_INTERVAL = int(os.getenv("DEDUP_PRUNE_INTERVAL", "3600"))  # Seconds between processed_messages cleanups
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))  # In-process LRU of recently claimed message ids
+DEDUP_CACHE_TTL = int(os.getenv("DEDUP_CACHE_TTL", "600"))
+WEBHOOK_ASYNC = os.getenv("WEBHOOK_ASYNC", "true").lower() == "true"  # Ack Meta immediately, process on worker threads
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))  # Worker threads per gunicorn worker (keep <= DB_POOL_SIZE + overflow)
+WEBHOOK_QUEUE_MAX = int(os.getenv("WEBHOOK_QUEUE_MAX", "500"))  # Per-worker backlog; beyond it the webhook waits, then gets a 503
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT", "2"))  # Seconds to wait for room in a full queue before answering 503
+WEBHOOK_QUEUE_PATH = os.getenv("WEBHOOK_QUEUE_PATH", "")  # SQLite file for a durable queue; empty keeps it in memory
+WHATSAPP_CONNECT_TIMEOUT = float(os.getenv("WHATSAPP_CONNECT_TIMEOUT", "5"))
+WHATSAPP_READ_TIMEOUT = float(os.getenv("WHATSAPP_READ_TIMEOUT", "15"))
+WHATSAPP_MAX_TRIES = int(os.getenv("WHATSAPP_MAX_TRIES", "3"))  # Attempts per message on 429/5xx/connection errors
+WHATSAPP_POOL_SIZE = int(os.getenv("WHATSAPP_POOL_SIZE", "10"))  # Keep-alive connections to the Graph API
+OUTBOUND_ASYNC = os.getenv("OUTBOUND_ASYNC", "true").lower() == "true"  # Queue sends per recipient instead of sending inline
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "8"))  # Sender threads; different recipients are sent in parallel
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", "50"))  # Messages per second across all recipients (Cloud API default is 80)
+OUTBOUND_BURST = float(os.getenv("OUTBOUND_BURST", "50"))
+OUTBOUND_STATUS_TIMEOUT = float(os.getenv("OUTBOUND_STATUS_TIMEOUT", "3"))  # Release the next message if no status webhook by then
+OUTBOUND_STATUS_POLL = float(os.getenv("OUTBOUND_STATUS_POLL", "0.25"))  # Seconds between checks for statuses handled by other workers
+OUTBOUND_STATUS_TTL = int(os.getenv("OUTBOUND_STATUS_TTL", "300"))  # How long published statuses are kept in the state store
+LEXICAL_TOP_N = int(os.getenv("LEXICAL_TOP_N", "15"))  # Documents offered to the LLM after BM25 pre-ranking
+LEXICAL_DECISIVE_RATIO = float(os.getenv("LEXICAL_DECISIVE_RATIO", "2.5"))  # Skip the LLM when best score >= ratio x runner-up
+LEXICAL_REFRESH_INTERVAL = int(os.getenv("LEXICAL_REFRESH_INTERVAL", "60"))  # Seconds between checks for changed documents
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))  # Concurrent summary calls to Grok per worker process
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"  # Reuse spell-check/selection/summary results
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2000"))  # In-process entries; the shared tier (llm_cache table or Redis) backs it
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"  # Stream summaries to WhatsApp as they are generated
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "400"))  # Send a streamed paragraph once this much text is buffered
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))  # Per-attempt cap; also bounded by the query deadline
+LLM_MAX_TRIES = int(os.getenv("LLM_MAX_TRIES", "3"))  # Attempts per call on timeouts/429/5xx
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))  # Keep-alive connections to the LLM provider
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # Consecutive failures before the circuit opens
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))  # Seconds before a trial call is let through
+QUERY_DEADLINE_SECONDS = float(os.getenv("QUERY_DEADLINE_SECONDS", "45"))  # End-to-end time budget for one query
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1200"))  # Target characters per document_chunks row
+SNIPPET_CHARS = int(os.getenv("SNIPPET_CHARS", "200"))  # Precomputed per-document snippet shown to AI selection
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "1000"))  # Document passages per summary prompt, in tokens
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))  # Rough estimate used to size prompts without a tokenizer
+SEMANTIC_SEARCH = os.getenv("SEMANTIC_SEARCH", "false").lower() == "true"  # Select documents by local embeddings (needs numpy)
+SEMANTIC_INDEX_DIR = os.getenv("SEMANTIC_INDEX_DIR", "data/semantic")  # Per-company matrices from tools/build_semantic_index.py
+SEMANTIC_DIMENSIONS = int(os.getenv("SEMANTIC_DIMENSIONS", "128"))  # LSA dimensions per chunk vector
+SEMANTIC_MAX_TERMS = int(os.getenv("SEMANTIC_MAX_TERMS", "8000"))  # Vocabulary cap when building
+SEMANTIC_MIN_SCORE = float(os.getenv("SEMANTIC_MIN_SCORE", "0.2"))  # Cosine below this is not a match
+INTERPRET_BUDGET_SECONDS = float(os.getenv("INTERPRET_BUDGET_SECONDS", "5"))  # Query budget slice for LLM spelling correction
+SELECT_BUDGET_SECONDS = float(os.getenv("SELECT_BUDGET_SECONDS", "10"))  # Query budget slice for LLM document selection
+SUMMARY_MIN_SECONDS = float(os.getenv("SUMMARY_MIN_SECONDS", "10"))  # Below this much budget left, send document links instead
+S3_POOL_SIZE = int(os.getenv("S3_POOL_SIZE", "20"))  # Keep-alive connections shared by all threads in a worker
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", "3"))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "10"))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "3"))  # botocore "standard" retry mode, including the first try
+PRESIGNED_URL_EXPIRES = int(os.getenv("PRESIGNED_URL_EXPIRES", "3600"))  # Seconds a generated PDF link stays valid
+PRESIGNED_URL_MARGIN = int(os.getenv("PRESIGNED_URL_MARGIN", "600"))  # Stop reusing a link this long before it expires
+PRESIGNED_URL_CACHE_SIZE = int(os.getenv("PRESIGNED_URL_CACHE_SIZE", "5000"))
+MANIFEST_RECONCILE = os.getenv("MANIFEST_RECONCILE", "true").lower() == "true"  # Keep documents' S3 metadata current in the background
+MANIFEST_RECONCILE_INTERVAL = int(os.getenv("MANIFEST_RECONCILE_INTERVAL", "900"))  # Seconds between S3 listings
+MANIFEST_MAX_AGE = int(os.getenv("MANIFEST_MAX_AGE", "3600"))  # Older verifications fall back to head_object
+BULK_SEND_CONCURRENCY = int(os.getenv("BULK_SEND_CONCURRENCY", "8"))  # Parallel existence checks/presigning/sends for multi-file requests
+DOCUMENT_SYNC_INTERVAL = int(os.getenv("DOCUMENT_SYNC_INTERVAL", "60"))  # Seconds between background chunk/catalogue passes
+DOCUMENT_SYNC_MAX_BATCHES = int(os.getenv("DOCUMENT_SYNC_MAX_BATCHES", "20"))  # Per pass, so one bad row can't spin the job
@@ -1,188 +1,111 @@
 # src/core/db_handler.py
-import psycopg2
-from psycopg2.extras import Json
-from src.core.config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT
+from src.core.db_pool import pg_connection
+from src.core.session import Session
+from src.core.state_store import get_state_store
+from src.core.user_context import UserContext
 from src.core.logger import logger
 import re
 from datetime import datetime, timedelta
 
-def get_pg_conn():
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            port=DB_PORT
-        )
-        return conn
-    except Exception as e:
-        logger.error(f"Error creating PG connection: {e}")
-        return None
-
-def get_user_id(sender_id: str) -> int | None:
-    conn = get_pg_conn()
-    if not conn:
-        return None
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE phone_number = %s", (sender_id,))
-            row = cur.fetchone()
-            return row[0] if row else None
-    except Exception as e:
-        logger.error(f"Error getting user_id for {sender_id}: {e}")
-        return None
-    finally:
-        conn.close()
-
-def get_bot_state(sender_id: str, company_id: str) -> dict:
-    user_id = get_user_id(sender_id)
-    if not user_id:
-        return {}
-    conn = get_pg_conn()
-    if not conn:
-        return {}
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT data FROM sessions WHERE user_id = %s", (user_id,))
-            row = cur.fetchone()
-            if row:
-                return row[0] or {}
-            else:
+def get_user_context(sender_id: str) -> UserContext | None:
+    """Single users-table lookup for the whole message; None if the number is unknown."""
+    with pg_connection() as conn:
+        if not conn:
+            logger.error("No PG connection")
+            return None
+        try:
+            with conn.cursor() as cur:
                 cur.execute(
-                    "INSERT INTO sessions (user_id, state, data) VALUES (%s, %s, %s)",
-                    (user_id, 'active', Json({}))
+                    "SELECT id, company_id, role_id, full_name FROM users WHERE phone_number = %s",
+                    (sender_id,)
                 )
-                conn.commit()
-                return {}
-    except Exception as e:
-        logger.error(f"Get bot_state failed for {sender_id}: {e}")
+                row = cur.fetchone()
+                if not row:
+                    return None
+                return UserContext(sender_id=sender_id, user_id=row[0], company_id=row[1], role=row[2], name=row[3])
+        except Exception as e:
+            logger.error(f"Error fetching user info for {sender_id}: {e}")
+            return None
+
+def get_user_contexts(sender_ids) -> dict[str, UserContext]:
+    """Bulk get_user_context for a batched webhook: one query for all senders, keyed by phone number."""
+    sender_ids = list(sender_ids)
+    if not sender_ids:
         return {}
-    finally:
-        conn.close()
-
-def update_bot_state(sender_id: str, company_id: str, state: dict):
-    user_id = get_user_id(sender_id)
-    if not user_id:
-        return
-    conn = get_pg_conn()
-    if not conn:
-        return
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "UPDATE sessions SET data = %s, last_updated = CURRENT_TIMESTAMP WHERE user_id = %s",
-                (Json(state), user_id)
-            )
-            if cur.rowcount == 0:
+    with pg_connection() as conn:
+        if not conn:
+            logger.error("No PG connection")
+            return {}
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT phone_number, id, company_id, role_id, full_name FROM users WHERE phone_number = ANY(%s)",
+                    (sender_ids,)
+                )
+                return {
+                    row[0]: UserContext(sender_id=row[0], user_id=row[1], company_id=row[2], role=row[3], name=row[4])
+                    for row in cur.fetchall()
+                }
+        except Exception as e:
+            logger.error(f"Error fetching user info for {len(sender_ids)} senders: {e}")
+            return {}
+
+def load_sessions(contexts):
+    """Preload sessions for several users in one backend round trip (sets ctx.session)."""
+    pending = [ctx for ctx in contexts if ctx.session is None]
+    if pending:
+        get_state_store().load_sessions(pending)
+
+def save_session(ctx: UserContext) -> bool:
+    """Flush the message's session changes in a single write (no-op if nothing changed)."""
+    return get_state_store().save_session(ctx)
+
+def get_bot_state(ctx: UserContext) -> Session:
+    """The message's session, loaded on first use and shared by all handlers."""
+    if ctx.session is None:
+        ctx.session = get_state_store().load_session(ctx)
+    return ctx.session
+
+def get_pending_feedback(ctx: UserContext) -> dict | None:
+    return get_bot_state(ctx).get('pending_feedback')
+
+def set_pending_feedback(ctx: UserContext, feedback_data: dict):
+    get_bot_state(ctx)['pending_feedback'] = feedback_data
+
+def clear_pending_feedback(ctx: UserContext):
+    get_bot_state(ctx).pop('pending_feedback')
+
+def log_user_query(ctx: UserContext, query: str, answer: str) -> bool:
+    with pg_connection() as conn:
+        if not conn:
+            return False
+        try:
+            with conn.cursor() as cur:
                 cur.execute(
-                    "INSERT INTO sessions (user_id, state, data, last_updated) VALUES (%s, %s, %s, CURRENT_TIMESTAMP)",
-                    (user_id, 'active', Json(state))
+                    "INSERT INTO queries (user_id, query_text, answer_text, timestamp) VALUES (%s, %s, %s, CURRENT_TIMESTAMP)",
+                    (ctx.user_id, query, answer)
                 )
-            conn.commit()
-    except Exception as e:
-        logger.error(f"Update bot_state failed for {sender_id}: {e}")
-    finally:
-        conn.close()
-
-def get_pending_feedback(sender_id: str, company_id: str) -> dict | None:
-    state = get_bot_state(sender_id, company_id)
-    return state.get('pending_feedback')
-
-def set_pending_feedback(sender_id: str, company_id: str, feedback_data: dict):
-    state = get_bot_state(sender_id, company_id)
-    state['pending_feedback'] = feedback_data
-    update_bot_state(sender_id, company_id, state)
-
-def clear_pending_feedback(sender_id: str, company_id: str):
-    state = get_bot_state(sender_id, company_id)
-    if 'pending_feedback' in state:
-        del state['pending_feedback']
-        update_bot_state(sender_id, company_id, state)
-
-def get_user_info(sender_id: str):
-    conn = get_pg_conn()
-    if not conn:
-        logger.error("No PG connection")
-        return None, None, None, None
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT company_id, role_id, full_name, NULL FROM users WHERE phone_number = %s",
-                (sender_id,)
-            )
-            row = cur.fetchone()
-            if row:
-                return row
-            else:
-                return None, None, None, None
-    except Exception as e:
-        logger.error(f"Error fetching user info for {sender_id}: {e}")
-        return None, None, None, None
-    finally:
-        conn.close()
-
-def log_user_query(sender_id: str, query: str, answer: str, company_id: str) -> bool:
-    user_id = get_user_id(sender_id)
-    if not user_id:
-        return False
-    conn = get_pg_conn()
-    if not conn:
-        return False
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO queries (user_id, query_text, answer_text, timestamp) VALUES (%s, %s, %s, CURRENT_TIMESTAMP)",
-                (user_id, query, answer)
-            )
-            conn.commit()
-        return True
-    except Exception as e:
-        logger.error(f"Error logging query: {e}")
-        return False
-    finally:
-        conn.close()
-
-def is_message_processed(sender_id: str, message_id: str, company_id: str) -> bool:
-    user_id = get_user_id(sender_id)
-    if not user_id:
-        return False
-    conn = get_pg_conn()
-    if not conn:
-        return False
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT 1 FROM audit_logs WHERE user_id = %s AND action = 'processed_message' AND details->>'message_id' = %s",
-                (user_id, message_id)
-            )
-            return bool(cur.fetchone())
-    except Exception as e:
-        logger.error(f"Error checking processed message {message_id}: {e}")
-        return False
-    finally:
-        conn.close()
-
-def mark_message_processed(sender_id: str, message_id: str, company_id: str) -> bool:
-    user_id = get_user_id(sender_id)
-    if not user_id:
-        return False
-    conn = get_pg_conn()
-    if not conn:
-        return False
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO audit_logs (user_id, action, details, timestamp) VALUES (%s, %s, %s, CURRENT_TIMESTAMP)",
-                (user_id, 'processed_message', Json({'message_id': message_id}))
-            )
-            conn.commit()
-        return True
-    except Exception as e:
-        logger.error(f"Error marking processed message {message_id}: {e}")
-        return False
-    finally:
-        conn.close()
+                conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error logging query: {e}")
+            return False
+
+def claim_message(ctx: UserContext, message_id: str) -> bool:
+    """Check-and-mark in one atomic step; False means the message was already handled."""
+    return get_state_store().claim_message(ctx, message_id)
+
+def claim_messages(items: list[tuple[UserContext, str]]) -> set[str]:
+    """Bulk claim_message; returns the message ids this process should handle."""
+    return get_state_store().claim_messages(items)
+
+def complete_messages(message_ids: list[str]):
+    """Record that claimed messages were handled (only needed when jobs are journaled)."""
+    get_state_store().complete_messages(message_ids)
+
+def release_messages(message_ids: list[str]) -> set[str]:
+    """Undo uncompleted claims of a dead process's job so its replay handles them."""
+    return get_state_store().release_messages(message_ids)
 
 # Validation functions
 def validate_sender_id(sender_id: str) -> bool:
@@ -198,12 +121,8 @@ def validate_doc_type(doc_type: str) -> bool:
 def validate_filename(filename: str) -> bool:
     return bool(re.match(r'^[\w\.-]+\.pdf$', filename))  # Alphanum, _, -, .pdf
 
-def get_last_response_time(sender_id: str, company_id: str) -> datetime | None:
-    state = get_bot_state(sender_id, company_id)
-    ts = state.get('last_response_time')
-    return datetime.fromisoformat(ts) if ts else None
+def get_last_response_time(ctx: UserContext) -> datetime | None:
+    return get_state_store().get_last_response_time(ctx)
 
-def update_last_response_time(sender_id: str, company_id: str):
-    state = get_bot_state(sender_id, company_id)
-    state['last_response_time'] = datetime.now().isoformat()
-    update_bot_state(sender_id, company_id, state)
\ No newline at end of file
+def update_last_response_time(ctx: UserContext):
+    get_state_store().set_last_response_time(ctx, datetime.now())
\ No newline at end of file
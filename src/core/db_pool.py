@@ -0,0 +1,218 @@
+# src/core/db_pool.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
+from src.core.config import (
+    DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT,
+    DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_IDLE_TIMEOUT, DB_POOL_PING_AFTER
+)
+from src.core.logger import logger
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+    - Keeps up to `size` idle connections open, allows `max_overflow` extra under burst
+    - Health-checks connections that sat idle longer than `ping_after` with SELECT 1
+    - Recycles connections older than `recycle` or idle longer than `idle_timeout`
+    """
+
+    def __init__(self, size: int, max_overflow: int, timeout: float, recycle: int, idle_timeout: int, ping_after: int):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self._idle = []  # [(conn, created_at, returned_at)], most recently returned last
+        self._created_at = {}  # id(conn) -> created_at
+        self._open = 0  # Idle + checked out
+        self._cond = threading.Condition()
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'timeouts': 0,
+            'overflow_checkouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'health_check_failures': 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(
+            host=DB_HOST,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            port=DB_PORT
+        )
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._metrics['connections_created'] += 1
+        return conn
+
+    def _close(self, conn):
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn, created_at: float, returned_at: float) -> bool:
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if now - created_at > self.recycle or now - returned_at > self.idle_timeout:
+            with self._cond:
+                self._metrics['connections_recycled'] += 1
+            return False
+        if now - returned_at > self.ping_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception as e:
+                logger.warning(f"PG pool health check failed, reconnecting: {e}")
+                with self._cond:
+                    self._metrics['health_check_failures'] += 1
+                return False
+        return True
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry = None
+            with self._cond:
+                if not self._idle and self._open >= self.size + self.max_overflow:
+                    self._metrics['waits'] += 1
+                    wait_start = time.monotonic()
+                    while not self._idle and self._open >= self.size + self.max_overflow:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._metrics['timeouts'] += 1
+                            raise PoolTimeout(f"No PG connection free after {self.timeout}s")
+                        self._cond.wait(remaining)
+                    self._metrics['wait_time_total'] += time.monotonic() - wait_start
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._open += 1
+                    if self._open > self.size:
+                        self._metrics['overflow_checkouts'] += 1
+            if entry is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                self._count_checkout()
+                return conn
+            conn, created_at, returned_at = entry
+            if self._is_usable(conn, created_at, returned_at):
+                self._count_checkout()
+                return conn
+            # Stale or broken: drop it and try again (another idle one or a fresh connect)
+            self._close(conn)
+            self._release_slot()
+
+    def _count_checkout(self):
+        with self._cond:
+            self._metrics['checkouts'] += 1
+
+    def putconn(self, conn, discard: bool = False):
+        if not discard and not conn.closed:
+            try:
+                status = conn.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()  # Never hand out a connection mid-transaction
+            except Exception:
+                discard = True
+        with self._cond:
+            created_at = self._created_at.get(id(conn), time.monotonic())
+            keep = not discard and not conn.closed and len(self._idle) < self.size
+            if keep:
+                self._idle.append((conn, created_at, time.monotonic()))
+                self._cond.notify()
+                return
+        self._close(conn)
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {
+                **self._metrics,
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'overflow': max(0, self._open - self.size),
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool, rebuilt after fork so gunicorn workers never share sockets."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    size=DB_POOL_SIZE,
+                    max_overflow=DB_POOL_MAX_OVERFLOW,
+                    timeout=DB_POOL_TIMEOUT,
+                    recycle=DB_POOL_RECYCLE,
+                    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                    ping_after=DB_POOL_PING_AFTER
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def get_pool_metrics() -> dict:
+    return get_pool().metrics()
+
+
+@contextmanager
+def pg_connection():
+    """Borrow a pooled connection; yields None if the database is unreachable."""
+    pool = get_pool()
+    try:
+        conn = pool.getconn()
+    except Exception as e:
+        logger.error(f"Error getting PG connection: {e}")
+        conn = None
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            pool.putconn(conn)
@@ -0,0 +1,297 @@
+# src/core/document_catalogue.py
+import re
+from datetime import date, datetime
+from psycopg2.extras import execute_values
+from src.core.db_pool import pg_connection
+from src.core.logger import logger
+
+# Stored in documents.category; the keys double as the documents menu row ids (doc_type_<key>)
+CATEGORIES = {
+    'job_description': '📋 Job Description',
+    'payslips': '💰 Payslips',
+    'employee_handbook': '📖 Employee Handbook',
+    'performance_reviews': '⭐ Performance Reviews',
+    'benefits_guide': '📌 Benefits Guide',
+    'warning_letters': '⚠️ Warning Letters',
+    'other': 'Other',
+}
+
+# First match wins: (category, doc_type substring, filename substring)
+_RULES = (
+    ('job_description', 'job_description', 'jobdescription'),
+    ('payslips', 'payslip', 'payslip'),
+    ('employee_handbook', 'handbook', 'handbook'),
+    ('performance_reviews', 'review', 'performance'),
+    ('benefits_guide', 'benefits', 'benefit'),
+    ('warning_letters', 'warning', 'warning'),
+)
+
+_MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+_DATE_RE = re.compile(
+    r'(\bjan\b|\bfeb\b|\bmar\b|\bapr\b|\bmay\b|\bjun\b|\bjul\b|\baug\b|\bsep\b|\boct\b|\bnov\b|\bdec\b|january|february|march|april|may|june|july|august|september|october|november|december)[\s_-]*(\d{4})?'
+)
+_NAME_PREFIX_RE = re.compile(r'^[A-Za-z\s]+_[A-Za-z\s]+_')  # e.g. Jake_Zondagh_...
+_PAYSLIP_MONTH_RE = re.compile(
+    r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|january|february|march|april|may|june|july|august|september|october|november|december)\s*[-/]?\s*(\d{4})?'
+)
+_QUARTER_RE = re.compile(r'(q[1-4]|quarter\s*[1-4])\s*[-/]?\s*(\d{4})?')
+_YEAR_RE = re.compile(r'\b(20\d{2})\b')
+_WARNING_NUMBER_RE = re.compile(r'(letter\s*)?(\d+|[IVXL]+)\b')
+_WARNING_DATE_RE = re.compile(r'(\d{4})[.-]?(\d{1,2})?[.-]?(\d{1,2})?')
+_SOP_CODE_RE = re.compile(r'(sop|policy)[-\s]*([a-zA-Z0-9-]+)')
+_LEADING_WORDS_RE = re.compile(r'^[A-Za-z\s]+(?:\s+-\s*)?')
+_YEAR_PREFIX_RE = re.compile(r'\d{4}')
+
+# What a catalogue entry is computed from; must match the documents_catalogue_stale_idx predicate
+_INPUTS_HASH_SQL = "md5(coalesce(s3_key, '') || '|' || coalesce(doc_type, ''))"
+
+
+def categorize(s3_key: str, doc_type: str | None) -> str:
+    doc_type_str = doc_type.lower() if doc_type else ''
+    filename = s3_key.split('/')[-1].lower()
+    for category, type_hint, name_hint in _RULES:
+        if type_hint in doc_type_str or name_hint in filename:
+            return category
+    return 'other'
+
+
+def parse_doc_date(filename: str) -> date | None:
+    """
+    First of the month named in the filename, for newest-first listing. With no year in the name the
+    current year is assumed, i.e. the year the row is catalogued, not the year it is later shown.
+    """
+    match = _DATE_RE.search(filename.lower())
+    if not match:
+        return None
+    year = match.group(2) or str(datetime.now().year)
+    try:
+        return date(int(year), _MONTHS.index(match.group(1)[:3]) + 1, 1)
+    except ValueError:  # e.g. year 0000
+        return None
+
+
+def display_label(filename: str, category: str) -> str:
+    """
+    Generate a clean, short title (max ~24 chars) for WhatsApp list rows.
+    Prioritizes date extraction, then document type hints, then filename shortening.
+    A month or quarter without a year gets the current year, fixed when the label is catalogued.
+    """
+    base = filename.replace('.pdf', '').strip()
+
+    # Remove common prefix (e.g. employee name)
+    base = _NAME_PREFIX_RE.sub('', base)
+    base = base.replace('_', ' ').strip()
+
+    # 1. Payslips - try to extract month + year
+    if 'payslip' in category.lower() or 'payslip' in base.lower():
+        match = _PAYSLIP_MONTH_RE.search(base.lower())
+        if match:
+            month_str = match.group(1)[:3].capitalize()
+            year = match.group(2) or str(datetime.now().year)
+            return f"{month_str} {year}"
+
+    # 2. Performance Reviews / Quarterly reviews
+    if 'review' in category.lower() or 'performance' in category.lower():
+        # Look for Q1/Q2/Q3/Q4 or numbers like 2025 Q2
+        match = _QUARTER_RE.search(base.lower())
+        if match:
+            quarter = match.group(1).upper().replace('QUARTER ', 'Q')
+            year = match.group(2) or str(datetime.now().year)
+            return f"{quarter} {year}"
+
+        # Fallback: look for year only
+        year_match = _YEAR_RE.search(base)
+        if year_match:
+            return f"Review {year_match.group(1)}"
+
+    # 3. Warning Letters - try to extract number or date
+    if 'warning' in category.lower():
+        # Look for "Warning 1", "Warning Letter 2", etc.
+        num_match = _WARNING_NUMBER_RE.search(base.lower())
+        if num_match:
+            num = num_match.group(2).upper()
+            return f"Warning {num}"
+
+        # Try date
+        date_match = _WARNING_DATE_RE.search(base)
+        if date_match:
+            year = date_match.group(1)
+            month = date_match.group(2)
+            if month and 1 <= int(month) <= 12:
+                month_str = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'][
+                    int(month) - 1]
+                return f"Warning {month_str} {year}"
+            return f"Warning {year}"
+
+    # 4. Job Description, Handbook, Benefits - usually static, just nice name
+    if 'job' in category.lower():
+        return "Job Description"
+    if 'handbook' in category.lower():
+        return "Employee Handbook"
+    if 'benefits' in category.lower():
+        return "Benefits Guide"
+
+    # 5. SOPs / Policies (company-wide) - try to keep main topic
+    if 'sop' in base.lower() or 'policy' in base.lower():
+        # Try to extract code like SOP-HR-001 or just main topic
+        code_match = _SOP_CODE_RE.search(base.lower())
+        if code_match:
+            code = code_match.group(2).upper()
+            return f"SOP {code[:8]}"  # e.g. SOP HR-001
+
+        # Fallback: take first few words
+        words = base.split()
+        short = ' '.join(words[:3])
+        return short[:24].strip().title()
+
+    # 6. Generic fallback: smart truncation
+    # Remove employee name prefix if still present
+    base = _LEADING_WORDS_RE.sub('', base).strip()
+
+    # Take meaningful parts
+    parts = base.split()
+    if len(parts) >= 2:
+        # Try keeping first two words + last if looks like date/number
+        candidate = f"{parts[0]} {parts[1]}"
+        if len(candidate) <= 20 and (parts[-1].isdigit() or _YEAR_PREFIX_RE.match(parts[-1])):
+            candidate += f" {parts[-1]}"
+        if len(candidate) <= 24:
+            return candidate.title()
+
+    # Ultimate fallback: just truncate with ellipsis if needed
+    title = base.title()[:21]
+    if len(base) > 21:
+        title += "…"
+    return title.strip()
+
+
+def catalogue_entry(s3_key: str, doc_type: str | None) -> tuple[str, date | None, str]:
+    """(category, doc_date, display_label) for a documents row; ingestion should store these with the row."""
+    filename = s3_key.split('/')[-1]
+    category = categorize(s3_key, doc_type)
+    return category, parse_doc_date(filename), display_label(filename, category)
+
+
+def _scope(company_id, user_id) -> tuple[str, list]:
+    where, params = "", []
+    if company_id is not None:
+        where += " AND company_id = %s"
+        params.append(company_id)
+    if user_id is not None:
+        where += " AND user_id = %s"
+        params.append(user_id)
+    return where, params
+
+
+def sync_document_catalogue(company_id=None, user_id=None, batch_size: int = 500) -> int:
+    """
+    Catalogue up to batch_size rows that were never catalogued or whose s3_key/doc_type changed since
+    (catalogued_hash differs from the hash of those inputs). Returns how many were written; 0 means
+    everything is current.
+    """
+    where, params = _scope(company_id, user_id)
+    with pg_connection() as conn:
+        if not conn:
+            return 0
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"SELECT DISTINCT s3_key, doc_type, {_INPUTS_HASH_SQL} FROM documents "
+                    f"WHERE catalogued_hash IS DISTINCT FROM {_INPUTS_HASH_SQL}{where} LIMIT %s",
+                    (*params, batch_size)
+                )
+                rows = [(s3_key, doc_type, inputs_hash, *catalogue_entry(s3_key, doc_type))
+                        for s3_key, doc_type, inputs_hash in cur.fetchall()]
+                if rows:
+                    execute_values(
+                        cur,
+                        "UPDATE documents d SET category = v.category, doc_date = v.doc_date, display_label = v.label, "
+                        "catalogued_hash = v.inputs_hash "
+                        "FROM (VALUES %s) AS v (s3_key, doc_type, inputs_hash, category, doc_date, label) "
+                        "WHERE d.s3_key = v.s3_key AND d.doc_type IS NOT DISTINCT FROM v.doc_type "
+                        "AND d.catalogued_hash IS DISTINCT FROM v.inputs_hash",
+                        rows,
+                        template="(%s, %s, %s, %s, %s::date, %s)"
+                    )
+            conn.commit()
+            return len(rows)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Document catalogue sync failed: {e}")
+            return 0
+
+
+def reset_document_catalogue(company_id=None) -> int:
+    """Mark every entry stale so the next sync recomputes it (after changing the rules above)."""
+    where, params = _scope(company_id, None)
+    with pg_connection() as conn:
+        if not conn:
+            return 0
+        with conn.cursor() as cur:
+            cur.execute(f"UPDATE documents SET catalogued_hash = NULL WHERE catalogued_hash IS NOT NULL{where}", params)
+            count = cur.rowcount
+        conn.commit()
+        return count
+
+
+def get_category_counts(company_id, user_id) -> dict[str, int]:
+    """{category: document count} for the user's own documents; uncatalogued rows are catalogued first."""
+    for attempt in range(2):
+        with pg_connection() as conn:
+            if not conn:
+                return {}
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT category, count(*) FROM documents WHERE company_id = %s AND user_id = %s GROUP BY category",
+                        (company_id, user_id)
+                    )
+                    counts = dict(cur.fetchall())
+            except Exception as e:
+                logger.error(f"Error counting user documents: {e}")
+                return {}
+        if None not in counts or attempt:
+            counts.pop(None, None)
+            return counts
+        sync_document_catalogue(company_id, user_id)  # One bounded batch; the background syncer handles the rest
+
+
+def list_category(company_id, user_id, category: str) -> list[tuple[int, str, str]]:
+    """(doc_id, s3_key, display_label) of the user's documents in one category, newest first."""
+    for attempt in range(2):
+        with pg_connection() as conn:
+            if not conn:
+                return []
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT doc_id, s3_key, display_label, category FROM documents "
+                        "WHERE company_id = %s AND user_id = %s AND (category = %s OR category IS NULL) "
+                        "ORDER BY doc_date DESC NULLS LAST, s3_key",
+                        (company_id, user_id, category)
+                    )
+                    rows = cur.fetchall()
+            except Exception as e:
+                logger.error(f"Error listing {category} documents: {e}")
+                return []
+        if attempt or all(row[3] is not None for row in rows):
+            return [(doc_id, s3_key, label) for doc_id, s3_key, label, row_category in rows if row_category == category]
+        sync_document_catalogue(company_id, user_id)  # One bounded batch; the background syncer handles the rest
+
+
+def get_user_document(company_id, user_id, doc_id: int) -> str | None:
+    """s3_key of one document by its doc_id, only if it belongs to this user (unique index lookup)."""
+    with pg_connection() as conn:
+        if not conn:
+            return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT s3_key FROM documents WHERE doc_id = %s AND company_id = %s AND user_id = %s",
+                    (doc_id, company_id, user_id)
+                )
+                row = cur.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error fetching document {doc_id}: {e}")
+            return None
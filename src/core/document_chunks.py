@@ -0,0 +1,218 @@
+# src/core/document_chunks.py
+import json
+import re
+from dataclasses import dataclass
+from psycopg2.extras import execute_values
+from src.core.config import CHUNK_SIZE, SNIPPET_CHARS
+from src.core.db_pool import pg_connection
+from src.core.logger import logger
+
+# Numbered headings ("3.2 Annual Leave"), short ALL-CAPS lines, or short lines ending in a colon
+_HEADING_RE = re.compile(r"^(?:\d+(?:\.\d+)*\.?\s+[^\n.]{2,60}|[A-Z][A-Z0-9 &/,'()-]{2,80}|[^.!?\n]{3,80}:)$")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class Chunk:
+    index: int
+    section: str | None
+    start: int  # Character offsets into the document text
+    end: int
+    text: str
+
+
+def document_text(content) -> str:
+    """Plain text of a documents.content value (text, or JSON with the text under 'content')."""
+    if content is None:
+        return ''
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict) and isinstance(content.get('content'), str):
+        return content['content']
+    return json.dumps(content)
+
+
+def _blocks(text: str):
+    """(start, end, is_heading) per paragraph; a heading on a paragraph's first line is split off."""
+    pos = 0
+    for match in [*_PARAGRAPH_RE.finditer(text), None]:
+        start, end = pos, match.start() if match else len(text)
+        pos = match.end() if match else len(text)
+        while start < end and text[start].isspace():
+            start += 1
+        if start >= end:
+            continue
+        line_end = text.find('\n', start, end)
+        line_end = end if line_end == -1 else line_end
+        if _HEADING_RE.match(text[start:line_end].strip()):
+            yield start, line_end, True
+            start = line_end + 1
+            while start < end and text[start].isspace():
+                start += 1
+            if start >= end:
+                continue
+        yield start, end, False
+
+
+def chunk_document(text: str, chunk_size: int = CHUNK_SIZE) -> list[Chunk]:
+    """
+    Section-aware chunks of roughly chunk_size characters: paragraphs are packed together until the
+    next one would overflow, a heading always starts a new chunk, and only oversized paragraphs are
+    split (at sentence boundaries).
+    """
+    chunks = []
+    section = None
+    start = end = None
+    heading_only = False  # Current chunk holds just a heading so far; keep it with what follows
+
+    def close():
+        nonlocal start
+        if start is not None and not heading_only and text[start:end].strip():
+            chunks.append(Chunk(len(chunks), section, start, end, text[start:end].strip()))
+        start = None
+
+    for b_start, b_end, is_heading in _blocks(text):
+        if is_heading:
+            close()
+            section = text[b_start:b_end].strip().rstrip(':')
+            start, end, heading_only = b_start, b_end, True
+            continue
+        if start is not None and not heading_only and b_end - start > chunk_size:
+            close()
+        if b_end - b_start <= chunk_size:
+            if start is None:
+                start = b_start
+            end, heading_only = b_end, False
+            continue
+        # Oversized paragraph: pack its sentences
+        s_start = b_start
+        for sentence in _SENTENCE_RE.split(text[b_start:b_end]):
+            s_start = text.index(sentence, s_start) if sentence else s_start
+            s_end = s_start + len(sentence)
+            if start is not None and not heading_only and s_end - start > chunk_size:
+                close()
+            if start is None:
+                start = s_start
+            end, heading_only = s_end, False
+            s_start = s_end
+    close()
+    return chunks
+
+
+def _snippet(text: str) -> str:
+    return ' '.join(text.split())[:SNIPPET_CHARS]
+
+
+def store_document_chunks(cur, s3_key: str, content, content_md5: str) -> int:
+    """Replace one document's chunks and its precomputed snippet; returns the chunk count."""
+    text = document_text(content)
+    chunks = chunk_document(text)
+    cur.execute("DELETE FROM document_chunks WHERE s3_key = %s", (s3_key,))
+    if chunks:
+        execute_values(
+            cur,
+            "INSERT INTO document_chunks (s3_key, chunk_index, section, start_offset, end_offset, text) VALUES %s",
+            [(s3_key, c.index, c.section, c.start, c.end, c.text) for c in chunks]
+        )
+    # Only the row whose content was chunked: a second row with this s3_key but other content stays pending
+    cur.execute(
+        "UPDATE documents SET snippet = %s, chunked_hash = %s WHERE s3_key = %s AND content_md5 = %s",
+        (_snippet(text), content_md5, s3_key, content_md5)
+    )
+    return len(chunks)
+
+
+def sync_document_chunks(company_id=None, batch_size: int = 50) -> int:
+    """
+    (Re)chunk up to batch_size documents whose content changed since they were last chunked.
+    Returns how many were processed; 0 means everything is current.
+    """
+    where = "chunked_hash IS DISTINCT FROM content_md5"
+    params = []
+    if company_id is not None:
+        where += " AND company_id = %s"
+        params.append(company_id)
+    with pg_connection() as conn:
+        if not conn:
+            return 0
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"SELECT s3_key, content, content_md5 FROM documents WHERE {where} LIMIT %s",
+                    (*params, batch_size)
+                )
+                rows = cur.fetchall()
+                for s3_key, content, content_md5 in rows:
+                    count = store_document_chunks(cur, s3_key, content, content_md5)
+                    logger.info(f"Chunked {s3_key}: {count} chunks")
+            conn.commit()
+            return len(rows)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Chunk sync failed: {e}")
+            return 0
+
+
+def get_doc_snippets(company_id, user_id) -> list[dict]:
+    """
+    The user's visible documents with just what selection needs: key, precomputed snippet and content hash.
+    Documents not chunked yet fall back to a prefix computed in the database, never the full content.
+    """
+    with pg_connection() as conn:
+        if not conn:
+            return []
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT s3_key, coalesce(snippet, left(content::text, %s)), "
+                    "content_md5 "
+                    "FROM documents WHERE company_id = %s AND (user_id IS NULL OR user_id = %s)",
+                    (SNIPPET_CHARS, company_id, user_id)
+                )
+                return [{'s3_key': row[0], 'snippet': row[1] or '', 'content_hash': row[2]} for row in cur.fetchall()]
+        except Exception as e:
+            logger.error(f"Error fetching document snippets: {e}")
+            return []
+
+
+def get_doc_chunks(s3_keys: list[str]) -> dict[str, list[Chunk]]:
+    """
+    All stored chunks of each document, in order. Documents not chunked yet are chunked on the fly
+    from their content (and picked up by the next sync).
+    """
+    grouped = {}
+    with pg_connection() as conn:
+        if not conn:
+            return grouped
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT s3_key, chunk_index, section, start_offset, end_offset, text FROM document_chunks "
+                    "WHERE s3_key = ANY(%s) ORDER BY s3_key, chunk_index",
+                    (list(s3_keys),)
+                )
+                for s3_key, *fields in cur.fetchall():
+                    grouped.setdefault(s3_key, []).append(Chunk(*fields))
+                missing = [key for key in s3_keys if key not in grouped]
+                if missing:
+                    cur.execute("SELECT s3_key, content FROM documents WHERE s3_key = ANY(%s)", (missing,))
+                    for s3_key, content in cur.fetchall():
+                        grouped[s3_key] = chunk_document(document_text(content))
+        except Exception as e:
+            logger.error(f"Error fetching document chunks: {e}")
+    return grouped
+
+
+def join_passages(chunks: list[Chunk]) -> str:
+    """Chunks in document order with their section heading wherever the section changes; gaps are marked."""
+    parts = []
+    last = None
+    for chunk in chunks:
+        if last is not None and chunk.index != last.index + 1:
+            parts.append('[...]')
+        if chunk.section and (last is None or chunk.section != last.section) and not chunk.text.startswith(chunk.section):
+            parts.append(f"[{chunk.section}]")
+        last = chunk
+        parts.append(chunk.text)
+    return '\n\n'.join(parts)
@@ -0,0 +1,80 @@
+# src/core/document_sync.py
+import os
+import threading
+from src.core.config import DOCUMENT_SYNC_INTERVAL, DOCUMENT_SYNC_MAX_BATCHES
+from src.core.document_catalogue import sync_document_catalogue
+from src.core.document_chunks import sync_document_chunks
+from src.core.logger import logger
+
+
+class DocumentSyncer:
+    """
+    Background thread that chunks and catalogues documents added or edited outside the app.
+    Runs every `interval` seconds, or sooner when woken (e.g. by the lexical index spotting a change);
+    each pass is capped at `max_batches` batches per step so it can never spin.
+    """
+
+    def __init__(self, interval: int, max_batches: int):
+        self.interval = interval
+        self.max_batches = max_batches
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._metrics = {'passes': 0, 'chunked': 0, 'catalogued': 0, 'capped': 0, 'failures': 0}
+        threading.Thread(target=self._run, name="document-sync", daemon=True).start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                with self._lock:
+                    self._metrics['failures'] += 1
+                logger.error(f"Document sync failed: {e}")
+
+    def run_once(self) -> tuple[int, int]:
+        """(documents chunked, documents catalogued) in this pass."""
+        chunked, capped_chunks = self._drain(sync_document_chunks)
+        catalogued, capped_catalogue = self._drain(sync_document_catalogue)
+        with self._lock:
+            self._metrics['passes'] += 1
+            self._metrics['chunked'] += chunked
+            self._metrics['catalogued'] += catalogued
+            self._metrics['capped'] += capped_chunks + capped_catalogue
+        if capped_chunks or capped_catalogue:
+            logger.warning(f"Document sync hit its {self.max_batches}-batch cap; continuing next pass")
+        return chunked, catalogued
+
+    def _drain(self, step) -> tuple[int, bool]:
+        total = 0
+        for _ in range(self.max_batches):
+            done = step()
+            if not done:
+                return total, False
+            total += done
+        return total, True
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self._metrics)
+
+
+_syncer = None
+_syncer_pid = None
+_syncer_lock = threading.Lock()
+
+
+def get_document_syncer() -> DocumentSyncer:
+    """Started at app startup and lazily in each gunicorn worker."""
+    global _syncer, _syncer_pid
+    pid = os.getpid()
+    if _syncer is None or _syncer_pid != pid:
+        with _syncer_lock:
+            if _syncer is None or _syncer_pid != pid:
+                _syncer = DocumentSyncer(DOCUMENT_SYNC_INTERVAL, DOCUMENT_SYNC_MAX_BATCHES)
+                _syncer_pid = pid
+    return _syncer
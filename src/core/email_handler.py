@@ -2,11 +2,11 @@
 import smtplib
 from email.mime.text import MIMEText
 from src.core.config import EMAIL_HOST, EMAIL_PORT, EMAIL_USER, EMAIL_PASSWORD, EMAIL_FEEDBACK_TO, EMAIL_HR_TO
-from src.core.db_handler import get_user_info
+from src.core.user_context import UserContext
 from src.core.logger import logger
-def send_feedback_email(sender_id: str, helpful: bool, query: str, answer: str, comment: str = None) -> bool:
-    company_id, role, person_name, _ = get_user_info(sender_id)
-    person_name = person_name or "Unknown User"
+def send_feedback_email(ctx: UserContext, helpful: bool, query: str, answer: str, comment: str = None) -> bool:
+    sender_id, company_id, role = ctx.sender_id, ctx.company_id, ctx.role
+    person_name = ctx.name or "Unknown User"
     status = "Helpful" if helpful else "Not Helpful"
     subject = f"Feedback: {status} - Query: {query[:50]}..." if len(
         query) > 50 else f"Feedback: {status} - Query: {query}"
@@ -34,9 +34,9 @@ def send_feedback_email(sender_id: str, helpful: bool, query: str, answer: str,
     except Exception as e:
         logger.error(f"Error sending feedback email: {e}")
         return False
-def send_hr_email(sender_id: str, query: str, urgency: str = "Standard") -> bool:
-    company_id, role, person_name, _ = get_user_info(sender_id)
-    person_name = person_name or "Unknown User"
+def send_hr_email(ctx: UserContext, query: str, urgency: str = "Standard") -> bool:
+    sender_id, company_id, role = ctx.sender_id, ctx.company_id, ctx.role
+    person_name = ctx.name or "Unknown User"
     subject = f"HR Query from {person_name} ({sender_id}) - Urgency: {urgency}"
     body = f"User: {person_name} ({sender_id})\nRole: {role}\nCompany: {company_id}\nUrgency: {urgency}\n\nQuery: {query}"
     try:
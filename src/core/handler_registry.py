@@ -0,0 +1,96 @@
+# src/core/handler_registry.py
+import os
+import sys
+import importlib
+import inspect
+import threading
+from src.core.base_handler import BaseHandler
+from src.core.logger import logger
+
+HANDLERS_PACKAGE = 'src.handlers'
+HANDLERS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'handlers')
+
+
+def discover_handlers(reload: bool = False) -> list[BaseHandler]:
+    handlers = []
+    if os.path.exists(HANDLERS_DIR):
+        for filename in sorted(os.listdir(HANDLERS_DIR)):
+            if filename.endswith('.py') and not filename.startswith('__'):
+                module_name = f'{HANDLERS_PACKAGE}.{filename[:-3]}'
+                if reload and module_name in sys.modules:
+                    module = importlib.reload(sys.modules[module_name])
+                else:
+                    module = importlib.import_module(module_name)
+                for name, obj in inspect.getmembers(module):
+                    # Only classes defined in this module, so imported handlers aren't registered twice
+                    if inspect.isclass(obj) and issubclass(obj, BaseHandler) and obj != BaseHandler \
+                            and obj.__module__ == module.__name__:
+                        handlers.append(obj())
+    handlers.sort(key=lambda h: h.priority, reverse=True)  # Higher priority first
+    return handlers
+
+
+class HandlerRegistry:
+    """
+    Handler chain (priority order) plus an index from the reply ids / text intents
+    handlers declare to the handler that owns them, for direct routing.
+    """
+
+    def __init__(self, handlers: list[BaseHandler]):
+        self.handlers = handlers
+        self._by_id = {}
+        self._by_prefix = {}
+        self._by_intent = {}
+        for handler in handlers:
+            for reply_id in handler.reply_ids:
+                self._register(self._by_id, reply_id, handler)
+            for prefix in handler.reply_prefixes:
+                self._register(self._by_prefix, prefix, handler)
+            for intent in handler.text_intents:
+                self._register(self._by_intent, intent.lower().strip(), handler)
+        self._prefix_lengths = sorted({len(p) for p in self._by_prefix}, reverse=True)
+
+    @staticmethod
+    def _register(index: dict, key: str, handler: BaseHandler):
+        owner = index.get(key)
+        if owner is not None and owner is not handler:
+            # Keep the higher-priority owner, mirroring what the chain would do
+            logger.warning(f"Dispatch key '{key}' claimed by {type(owner).__name__} and {type(handler).__name__}")
+            return
+        index[key] = handler
+
+    def handler_for_reply(self, reply_id: str) -> BaseHandler | None:
+        handler = self._by_id.get(reply_id)
+        if handler is not None:
+            return handler
+        for length in self._prefix_lengths:  # Longest prefix wins
+            handler = self._by_prefix.get(reply_id[:length])
+            if handler is not None:
+                return handler
+        return None
+
+    def handler_for_text(self, text: str) -> BaseHandler | None:
+        return self._by_intent.get(text.lower().strip())
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> HandlerRegistry:
+    """Built once per process; call reload_handlers() to pick up code changes in development."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = HandlerRegistry(discover_handlers())
+                logger.info(f"Loaded handlers: {[type(h).__name__ for h in _registry.handlers]}")
+    return _registry
+
+
+def reload_handlers() -> HandlerRegistry:
+    global _registry
+    with _registry_lock:
+        _registry = HandlerRegistry(discover_handlers(reload=True))
+        logger.info(f"Reloaded handlers: {[type(h).__name__ for h in _registry.handlers]}")
+    return _registry
@@ -0,0 +1,209 @@
+# src/core/lexical_index.py
+import math
+import re
+import threading
+import time
+from collections import Counter
+from src.core.config import LEXICAL_REFRESH_INTERVAL
+from src.core.db_pool import pg_connection
+from src.core.document_chunks import document_text
+from src.core.document_sync import get_document_syncer
+from src.core.logger import logger
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+TITLE_BOOST = 3  # Title terms count as this many occurrences in the body
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it me my of on or our the this to "
+    "what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _title_terms(s3_key: str) -> list[str]:
+    return tokenize(s3_key.split('/')[-1].replace('.pdf', '').replace('_', ' ')) * TITLE_BOOST
+
+
+def document_terms(s3_key: str, content) -> Counter:
+    return Counter(tokenize(document_text(content)) + _title_terms(s3_key))
+
+
+class CompanyIndex:
+    """BM25 inverted index over one company's documents, keyed by s3_key."""
+
+    def __init__(self):
+        self.fingerprints = {}  # s3_key -> md5 of content, to spot changed rows
+        self.lengths = {}  # s3_key -> token count
+        self.doc_terms = {}  # s3_key -> distinct terms, so removal only touches its own postings
+        self.postings = {}  # term -> {s3_key: term frequency}
+        self.shared = frozenset()  # s3_keys of company-wide documents (user_id IS NULL)
+        self.total_length = 0
+        self.version = 0  # Bumped on every change so derived structures (spelling index) know to rebuild
+        self.ready = False  # First build finished; until then searches return nothing
+        self.refreshed_at = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+
+    def add(self, s3_key: str, terms: Counter, fingerprint: str):
+        self.remove(s3_key)
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[s3_key] = tf
+        self.doc_terms[s3_key] = tuple(terms)
+        self.lengths[s3_key] = sum(terms.values())
+        self.total_length += self.lengths[s3_key]
+        self.fingerprints[s3_key] = fingerprint
+        self.version += 1
+
+    def remove(self, s3_key: str):
+        if s3_key not in self.fingerprints:
+            return
+        for term in self.doc_terms.pop(s3_key):
+            docs = self.postings[term]
+            del docs[s3_key]
+            if not docs:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(s3_key)
+        del self.fingerprints[s3_key]
+        self.version += 1
+
+    def search(self, query: str, allowed: set | None = None, limit: int = 10) -> list[tuple[str, float]]:
+        """(s3_key, score) best first; only keys in `allowed` when given (the user's visible documents)."""
+        n = len(self.lengths)
+        if not n:
+            return []
+        avgdl = self.total_length / n or 1
+        scores = Counter()
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for s3_key, tf in docs.items():
+                if allowed is not None and s3_key not in allowed:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[s3_key] / avgdl)
+                scores[s3_key] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores.most_common(limit)
+
+
+class LexicalIndex:
+    """
+    Per-company CompanyIndex cache. Refreshes run on a background thread: they compare the stored
+    content_md5 per row, fetch and tokenize only documents that were added or changed outside the
+    index lock, then apply them under it. Queries never wait for a refresh; until a company's first
+    build finishes, search() returns [] and callers fall back to AI selection.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._companies = {}
+        self._lock = threading.Lock()
+
+    def _company(self, company_id) -> CompanyIndex:
+        with self._lock:
+            return self._companies.setdefault(company_id, CompanyIndex())
+
+    def search(self, company_id, query: str, allowed: set | None = None, limit: int = 10) -> list[tuple[str, float]]:
+        index = self._company(company_id)
+        with index.lock:
+            self._maybe_refresh(company_id, index)
+            if not index.ready:
+                return []
+            return index.search(query, allowed, limit)
+
+    def version(self, company_id) -> int:
+        index = self._company(company_id)
+        with index.lock:
+            self._maybe_refresh(company_id, index)
+            return index.version
+
+    def vocabulary(self, company_id, known_version: int | None = None) -> tuple[int, dict | None]:
+        """
+        (index version, {term: document frequency over company-wide documents only}), so terms from one
+        user's private documents never surface to another. The dict is None if the version is still known_version.
+        """
+        index = self._company(company_id)
+        with index.lock:
+            self._maybe_refresh(company_id, index)
+            if index.version == known_version:
+                return index.version, None
+            frequencies = {}
+            for term, docs in index.postings.items():
+                shared = sum(1 for s3_key in docs if s3_key in index.shared)
+                if shared:
+                    frequencies[term] = shared
+            return index.version, frequencies
+
+    def _maybe_refresh(self, company_id, index: CompanyIndex):
+        """Start a background refresh if the index is due one; call with index.lock held."""
+        if index.refreshing or time.monotonic() - index.refreshed_at < self.refresh_interval:
+            return
+        index.refreshing = True
+        threading.Thread(
+            target=self._refresh_in_background, args=(company_id, index),
+            name=f"lexical-refresh-{company_id}", daemon=True
+        ).start()
+
+    def _refresh_in_background(self, company_id, index: CompanyIndex):
+        try:
+            self._refresh(company_id, index)
+        except Exception as e:
+            logger.error(f"Lexical index refresh failed for company {company_id}: {e}")
+        finally:
+            with index.lock:
+                index.refreshing = False
+
+    def _refresh(self, company_id, index: CompanyIndex):
+        with index.lock:
+            known = dict(index.fingerprints)
+        with pg_connection() as conn:
+            if not conn:
+                return  # Keep serving the last good index
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT s3_key, content_md5, user_id IS NULL FROM documents WHERE company_id = %s",
+                        (company_id,)
+                    )
+                    listing = cur.fetchall()
+                    current = {s3_key: fp for s3_key, fp, _ in listing}
+                    shared = frozenset(s3_key for s3_key, _, is_shared in listing if is_shared)
+                    changed = [key for key, fp in current.items() if known.get(key) != fp]
+                    rows = []
+                    if changed:
+                        cur.execute(
+                            "SELECT s3_key, content, content_md5 FROM documents "
+                            "WHERE company_id = %s AND s3_key = ANY(%s)",
+                            (company_id, changed)
+                        )
+                        rows = cur.fetchall()
+            except Exception as e:
+                logger.error(f"Lexical index refresh failed for company {company_id}: {e}")
+                return
+        tokenized = [(s3_key, document_terms(s3_key, content or ''), fingerprint) for s3_key, content, fingerprint in rows]
+        with index.lock:
+            for s3_key in set(index.fingerprints) - set(current):
+                index.remove(s3_key)
+            for s3_key, terms, fingerprint in tokenized:
+                index.add(s3_key, terms, fingerprint)
+            if shared != index.shared:
+                index.shared = shared
+                index.version += 1
+            index.ready = True
+            index.refreshed_at = time.monotonic()
+        if changed:
+            logger.info(f"Lexical index for company {company_id}: {len(rows)} documents (re)indexed, {len(current)} total")
+            # Chunks and catalogue for the changed documents are brought up to date off the request path
+            get_document_syncer().wake()
+
+
+_index = LexicalIndex(LEXICAL_REFRESH_INTERVAL)
+
+
+def get_lexical_index() -> LexicalIndex:
+    return _index
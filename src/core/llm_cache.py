@@ -0,0 +1,163 @@
+# src/core/llm_cache.py
+import hashlib
+import json
+import threading
+import time
+from psycopg2.extras import Json
+from src.core.config import (
+    STATE_BACKEND, REDIS_KEY_PREFIX, LLM_CACHE_ENABLED, LLM_CACHE_SIZE, LLM_CACHE_TTL, DEDUP_PRUNE_INTERVAL
+)
+from src.core.db_pool import pg_connection
+from src.core.state_store import get_state_store
+from src.core.ttl_cache import TTLCache
+from src.core.logger import logger
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+def cache_key(kind: str, *parts) -> str:
+    """Content address for an LLM result: the call kind plus everything that determines its output."""
+    return f"{kind}:" + hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class PostgresCacheTier:
+    """Shared tier in the llm_cache table; expired rows are skipped on read and pruned periodically."""
+
+    def __init__(self):
+        self._last_prune = 0.0
+        self._prune_lock = threading.Lock()
+
+    def get(self, key: str):
+        with pg_connection() as conn:
+            if not conn:
+                return None
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT value FROM llm_cache WHERE cache_key = %s AND expires_at > CURRENT_TIMESTAMP", (key,)
+                )
+                row = cur.fetchone()
+            conn.commit()
+            return row[0] if row else None
+
+    def set(self, key: str, value, ttl: int):
+        with pg_connection() as conn:
+            if not conn:
+                return
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO llm_cache (cache_key, value, expires_at) "
+                    "VALUES (%s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 second') "
+                    "ON CONFLICT (cache_key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at",
+                    (key, Json(value), ttl)
+                )
+                self._maybe_prune(cur)
+            conn.commit()
+
+    def _maybe_prune(self, cur):
+        now = time.monotonic()
+        with self._prune_lock:
+            if now - self._last_prune < DEDUP_PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+        cur.execute("DELETE FROM llm_cache WHERE expires_at <= CURRENT_TIMESTAMP")
+
+
+class RedisCacheTier:
+    """Shared tier as {prefix}llm:{key} strings with a TTL; Redis handles eviction."""
+
+    def __init__(self, client, prefix: str = REDIS_KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str):
+        raw = self.client.get(f"{self.prefix}llm:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value, ttl: int):
+        self.client.set(f"{self.prefix}llm:{key}", json.dumps(value), ex=ttl)
+
+
+class LLMCache:
+    """
+    Two-tier cache for LLM results: a per-process LRU in front of a tier shared by all workers.
+    Only successful results are stored, so failures are retried on the next request.
+    """
+
+    def __init__(self, shared, maxsize: int, ttl: int):
+        self.shared = shared
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {'memory_hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0, 'shared_errors': 0}
+
+    def get(self, key: str):
+        value = self._memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                logger.warning(f"LLM cache read failed: {e}")
+                self._count('shared_errors')
+            if value is not None:
+                self._memory.set(key, value)
+                self._count('shared_hits')
+                return value
+        self._count('misses')
+        return None
+
+    def set(self, key: str, value):
+        self._memory.set(key, value)
+        self._count('stores')
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, self.ttl)
+            except Exception as e:
+                logger.warning(f"LLM cache write failed: {e}")
+                self._count('shared_errors')
+
+    def cached(self, key: str, compute):
+        """Return the cached value for key, or compute() and cache it unless it is None."""
+        if not LLM_CACHE_ENABLED:
+            return compute()
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def _count(self, event: str):
+        with self._metrics_lock:
+            self._metrics[event] += 1
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        return {**m, 'memory': self._memory.stats()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """Shared tier follows STATE_BACKEND: the Redis state client, or the llm_cache table."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if STATE_BACKEND == 'redis':
+                    shared = RedisCacheTier(get_state_store().client)
+                else:
+                    shared = PostgresCacheTier()
+                _cache = LLMCache(shared, LLM_CACHE_SIZE, LLM_CACHE_TTL)
+    return _cache
+
+
+def get_llm_cache_metrics() -> dict:
+    return get_llm_cache().metrics()
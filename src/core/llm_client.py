@@ -0,0 +1,260 @@
+# src/core/llm_client.py
+import json
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from src.core.config import (
+    GROK_API_URL, GROK_API_KEY, GROK_MODEL, LLM_TIMEOUT, LLM_MAX_TRIES, LLM_POOL_SIZE,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET
+)
+from src.core.streaming import iter_sse_events
+from src.core.logger import logger
+
+
+class LLMError(Exception):
+    pass
+
+
+class CircuitOpen(LLMError):
+    """The provider has been failing; calls are refused until the breaker's reset timeout passes."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. Once `reset_timeout` seconds have passed,
+    one trial call is let through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half_open' if time.monotonic() - self._opened_at >= self.reset_timeout else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self):
+        """A trial call ended without telling us anything about the provider (e.g. our deadline ran out)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"LLM circuit opened after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class DeadlineExceeded(LLMError):
+    pass
+
+
+class RequestRejected(LLMError):
+    """4xx other than 429: our request is at fault, not the provider, so the breaker ignores it."""
+
+
+class _Retryable(LLMError):
+    pass
+
+
+class LLMClient:
+    """
+    Chat-completions client for Grok (any OpenAI-compatible base_url, e.g. a local stub server in tests).
+    One pooled keep-alive session; each call gets a timeout capped by its deadline, jittered exponential
+    backoff on timeouts/429/5xx, a shared circuit breaker, and per-kind token and latency accounting.
+    """
+
+    def __init__(self, base_url: str, api_key: str, model: str, timeout: float = 30, max_tries: int = 3,
+                 pool_size: int = 10, breaker: CircuitBreaker | None = None,
+                 backoff_base: float = 0.5, backoff_cap: float = 8.0):
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.model = model
+        self.timeout = timeout
+        self.max_tries = max(1, max_tries)
+        self.breaker = breaker or CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+        self._metrics_lock = threading.Lock()
+        self._metrics = {}
+
+    def available(self) -> bool:
+        """False while the breaker is open; callers can go straight to their degraded path."""
+        return self.breaker.state != 'open'
+
+    def complete(self, prompt: str, kind: str = 'chat', deadline: float | None = None) -> str | None:
+        """Completion text, or None if the call failed, ran out of time or the circuit is open."""
+        try:
+            response = self._post({"model": self.model, "messages": [{"role": "user", "content": prompt}]},
+                                  kind, deadline)
+            body = response.json()
+            text = body['choices'][0]['message']['content'].strip()
+        except LLMError as e:
+            logger.warning(f"LLM {kind} call failed: {e}")
+            return None
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            logger.error(f"LLM {kind} returned an unexpected body: {e}")
+            self._record(kind, 'failures')
+            return None
+        self._record_usage(kind, body.get('usage'))
+        return text
+
+    def stream(self, prompt: str, kind: str = 'chat', deadline: float | None = None):
+        """
+        Yield completion text deltas as they arrive. Connecting is retried like complete(); once text has
+        started flowing, a failure or running past the deadline raises LLMError so the caller can decide
+        what to do with the partial answer.
+        """
+        payload = {"model": self.model, "messages": [{"role": "user", "content": prompt}], "stream": True}
+        response = self._post(payload, kind, deadline, stream=True)
+        try:
+            with response:
+                for event in iter_sse_events(response):
+                    if deadline is not None and time.monotonic() >= deadline:
+                        self._record(kind, 'deadline_exceeded')
+                        raise DeadlineExceeded("deadline exceeded while streaming")
+                    if event.get('usage'):
+                        self._record_usage(kind, event['usage'])
+                    choices = event.get('choices') or [{}]
+                    delta = (choices[0].get('delta') or {}).get('content')
+                    if delta:
+                        yield delta
+        except requests.RequestException as e:
+            self._record(kind, 'failures')
+            raise LLMError(f"stream interrupted: {e}") from e
+
+    def _post(self, payload: dict, kind: str, deadline: float | None, stream: bool = False) -> requests.Response:
+        if not self.breaker.allow():
+            self._record(kind, 'short_circuits')
+            raise CircuitOpen("circuit open")
+        started = time.monotonic()
+        try:
+            for attempt in range(self.max_tries):
+                timeout = self.timeout if deadline is None else min(self.timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    self._record(kind, 'deadline_exceeded')
+                    raise DeadlineExceeded("deadline exceeded")
+                try:
+                    response = self._attempt(payload, timeout, stream)
+                    self.breaker.record_success()
+                    return response
+                except _Retryable as e:
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                    last_try = attempt + 1 == self.max_tries
+                    if last_try or (deadline is not None and time.monotonic() + delay >= deadline):
+                        raise LLMError(str(e)) from e
+                    self._record(kind, 'retries')
+                    time.sleep(delay)
+        except DeadlineExceeded:
+            self.breaker.release()
+            self._record(kind, 'failures')
+            raise
+        except RequestRejected:
+            self.breaker.record_success()  # The provider answered, so it is up
+            self._record(kind, 'failures')
+            raise
+        except LLMError:
+            self.breaker.record_failure()
+            self._record(kind, 'failures')
+            raise
+        finally:
+            self._record_latency(kind, time.monotonic() - started)
+
+    def _attempt(self, payload: dict, timeout: float, stream: bool) -> requests.Response:
+        try:
+            response = self.session.post(self.url, data=json.dumps(payload), timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _Retryable(f"{type(e).__name__}: {e}") from e
+        if response.status_code == 200:
+            return response
+        detail = f"HTTP {response.status_code}: {response.text[:200]}"
+        response.close()
+        if response.status_code == 429 or response.status_code >= 500:
+            raise _Retryable(detail)
+        raise RequestRejected(detail)
+
+    def _stats(self, kind: str) -> dict:
+        return self._metrics.setdefault(kind, {
+            'calls': 0, 'failures': 0, 'retries': 0, 'short_circuits': 0, 'deadline_exceeded': 0,
+            'latency_total': 0.0, 'latency_max': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0,
+        })
+
+    def _record(self, kind: str, event: str):
+        with self._metrics_lock:
+            self._stats(kind)[event] += 1
+
+    def _record_latency(self, kind: str, elapsed: float):
+        with self._metrics_lock:
+            stats = self._stats(kind)
+            stats['calls'] += 1
+            stats['latency_total'] += elapsed
+            stats['latency_max'] = max(stats['latency_max'], elapsed)
+
+    def _record_usage(self, kind: str, usage: dict | None):
+        if not usage:
+            return
+        with self._metrics_lock:
+            stats = self._stats(kind)
+            stats['prompt_tokens'] += usage.get('prompt_tokens') or 0
+            stats['completion_tokens'] += usage.get('completion_tokens') or 0
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            kinds = {kind: dict(stats) for kind, stats in self._metrics.items()}
+        for stats in kinds.values():
+            stats['latency_avg'] = stats['latency_total'] / (stats['calls'] or 1)
+        return {'circuit': self.breaker.state, 'calls': kinds}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(
+                    GROK_API_URL, GROK_API_KEY, GROK_MODEL,
+                    timeout=LLM_TIMEOUT,
+                    max_tries=LLM_MAX_TRIES,
+                    pool_size=LLM_POOL_SIZE,
+                    breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+                )
+    return _client
+
+
+def get_llm_metrics() -> dict:
+    return get_llm_client().metrics()
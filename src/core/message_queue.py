@@ -0,0 +1,150 @@
+# src/core/message_queue.py
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from src.core.logger import logger
+
+
+class SqliteJournal:
+    """
+    Optional on-disk copy of queued jobs so a crash or deploy doesn't drop accepted webhooks.
+    Rows are deleted once processed; rows owned by a dead process are replayed on startup, including
+    the job that was in flight when it died (WorkerPool's on_replay lets its claims be taken again).
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, shard_key TEXT, payload TEXT, enqueued_at REAL, owner_pid INTEGER)"
+        )
+        self._lock = threading.Lock()
+
+    def add(self, shard_key: str, payload: dict, enqueued_at: float) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO jobs (shard_key, payload, enqueued_at, owner_pid) VALUES (?, ?, ?, ?)",
+                (shard_key, json.dumps(payload), enqueued_at, os.getpid())
+            )
+            return cur.lastrowid
+
+    def done(self, job_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def take_orphans(self) -> list[tuple]:
+        """Adopt jobs left behind by processes that are no longer running, oldest first."""
+        pid = os.getpid()
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT owner_pid FROM jobs WHERE owner_pid != ?", (pid,)).fetchall()
+            dead = [owner for (owner,) in rows if not _pid_alive(owner)]
+            for owner in dead:
+                self._conn.execute("UPDATE jobs SET owner_pid = ? WHERE owner_pid = ?", (pid, owner))
+            return self._conn.execute(
+                "SELECT id, shard_key, payload, enqueued_at FROM jobs WHERE owner_pid = ? ORDER BY id", (pid,)
+            ).fetchall()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+class WorkerPool:
+    """
+    Runs `handler(payload)` on background threads.
+    Jobs with the same shard key (the sender's number) always go to the same worker,
+    so one user's messages are handled in arrival order while different users run in parallel.
+    on_replay(payload) runs for each journaled job adopted from a dead process before it is queued again.
+    """
+
+    def __init__(self, handler, workers: int, max_depth: int, journal_path: str = "", on_replay=None):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self._queues = [queue.Queue(maxsize=max_depth) for _ in range(self.workers)]
+        self._journal = SqliteJournal(journal_path) if journal_path else None
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'enqueued': 0,
+            'processed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'queue_wait_total': 0.0,
+            'queue_wait_max': 0.0,
+            'processing_time_total': 0.0,
+        }
+        for i in range(self.workers):
+            threading.Thread(target=self._run, args=(self._queues[i],), name=f"webhook-worker-{i}", daemon=True).start()
+        if self._journal:
+            for job_id, shard_key, payload, enqueued_at in self._journal.take_orphans():
+                logger.info(f"Replaying journaled webhook job {job_id}")
+                payload = json.loads(payload)
+                if on_replay is not None:
+                    on_replay(payload)
+                self._shard(shard_key).put((job_id, payload, enqueued_at))
+
+    def shard_index(self, shard_key: str) -> int:
+        return zlib.crc32(shard_key.encode()) % self.workers
+
+    def _shard(self, shard_key: str) -> queue.Queue:
+        return self._queues[self.shard_index(shard_key)]
+
+    def submit(self, payload: dict, shard_key: str, timeout: float = 0) -> bool:
+        """Queue a payload, waiting up to `timeout` seconds for room; False if that worker's queue stayed full."""
+        enqueued_at = time.time()
+        job_id = self._journal.add(shard_key, payload, enqueued_at) if self._journal else None
+        try:
+            self._shard(shard_key).put((job_id, payload, enqueued_at), timeout=timeout)
+        except queue.Full:
+            if job_id is not None:
+                self._journal.done(job_id)
+            self._count('rejected')
+            return False
+        self._count('enqueued')
+        return True
+
+    def _run(self, jobs: queue.Queue):
+        while True:
+            job_id, payload, enqueued_at = jobs.get()
+            started = time.time()
+            wait = started - enqueued_at
+            try:
+                self.handler(payload)
+                self._count('processed')
+            except Exception as e:
+                logger.error(f"Webhook job failed: {e}")
+                self._count('failed')
+            finally:
+                if job_id is not None:
+                    self._journal.done(job_id)
+                with self._metrics_lock:
+                    self._metrics['queue_wait_total'] += wait
+                    self._metrics['queue_wait_max'] = max(self._metrics['queue_wait_max'], wait)
+                    self._metrics['processing_time_total'] += time.time() - started
+                jobs.task_done()
+
+    def _count(self, event: str):
+        with self._metrics_lock:
+            self._metrics[event] += 1
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        done = (m['processed'] + m['failed']) or 1
+        return {
+            **m,
+            'workers': self.workers,
+            'depth': sum(q.qsize() for q in self._queues),
+            'queue_wait_avg': m['queue_wait_total'] / done,
+            'processing_time_avg': m['processing_time_total'] / done,
+        }
@@ -0,0 +1,217 @@
+# src/core/object_manifest.py
+import os
+import threading
+import time
+from botocore.exceptions import ClientError
+from psycopg2.extras import execute_values
+from src.core.config import (
+    S3_BUCKET_NAME, MANIFEST_RECONCILE, MANIFEST_RECONCILE_INTERVAL, MANIFEST_MAX_AGE
+)
+from src.core.db_pool import pg_connection
+from src.core.s3_handler import get_s3_client
+from src.core.logger import logger
+
+_RECONCILE_LOCK_ID = 0x70510  # pg advisory lock: one reconciler across all workers and instances
+
+_metrics_lock = threading.Lock()
+_metrics = {'manifest_hits': 0, 'head_checks': 0, 'head_errors': 0, 'reconciles': 0, 'reconcile_skipped': 0,
+            'reconcile_failures': 0, 'last_objects': 0, 'last_missing': 0, 'last_changed': 0, 'last_duration': 0.0}
+
+
+def _count(event: str, n: int = 1):
+    with _metrics_lock:
+        _metrics[event] += n
+
+
+def get_manifest_entries(s3_keys: list[str]) -> dict[str, dict]:
+    """
+    {s3_key: {'exists', 'size', 'etag'}} for keys verified within MANIFEST_MAX_AGE, directly or by the last full
+    reconcile (which only rewrites rows that changed); stale or unknown keys are left out.
+    """
+    with pg_connection() as conn:
+        if not conn:
+            return {}
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT DISTINCT ON (s3_key) s3_key, s3_exists, s3_size, s3_etag FROM documents "
+                    "WHERE s3_key = ANY(%s) AND s3_verified_at IS NOT NULL "
+                    "AND greatest(s3_verified_at, (SELECT reconciled_at FROM manifest_state)) "
+                    "> CURRENT_TIMESTAMP - %s * INTERVAL '1 second' "
+                    "ORDER BY s3_key, s3_verified_at DESC",
+                    (list(s3_keys), MANIFEST_MAX_AGE)
+                )
+                return {key: {'exists': exists, 'size': size, 'etag': etag} for key, exists, size, etag in cur.fetchall()}
+        except Exception as e:
+            logger.error(f"Error reading object manifest: {e}")
+            return {}
+
+
+def record_object(s3_key: str, exists: bool, size: int | None = None, etag: str | None = None):
+    """Write-through after a head_object, so the next send of this key trusts the manifest."""
+    with pg_connection() as conn:
+        if not conn:
+            return
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE documents SET s3_exists = %s, s3_size = %s, s3_etag = %s, s3_verified_at = CURRENT_TIMESTAMP "
+                    "WHERE s3_key = %s",
+                    (exists, size, etag, s3_key)
+                )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error recording object manifest for {s3_key}: {e}")
+
+
+def object_exists(s3_key: str) -> bool | None:
+    """
+    True straight from the manifest when the object was verified recently; otherwise (including recorded misses,
+    in case the file was uploaded since) head_object decides and is recorded. None if S3 could not be checked.
+    """
+    entry = get_manifest_entries([s3_key]).get(s3_key)
+    if entry is not None and entry['exists']:
+        _count('manifest_hits')
+        return True
+    return verify_object(s3_key)
+
+
+def verify_object(s3_key: str) -> bool | None:
+    """head_object, recorded in the manifest. True/False, or None if S3 could not be checked."""
+    _count('head_checks')
+    client = get_s3_client()
+    if not client:
+        return None
+    try:
+        head = client.head_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            record_object(s3_key, False)
+            return False
+        logger.error(f"Error checking PDF {s3_key}: {e}")
+        _count('head_errors')
+        return None
+    record_object(s3_key, True, head.get('ContentLength'), head.get('ETag', '').strip('"') or None)
+    return True
+
+
+class ManifestReconciler:
+    """
+    Background thread that lists the bucket every `interval` seconds and writes size, ETag and existence for
+    documents rows whose recorded state differs, then stamps manifest_state. The listing happens outside any
+    transaction; the short write transaction holds a pg advisory lock, and workers skip the round when
+    another one reconciled recently, so with several gunicorn workers normally only one lists the bucket.
+    """
+
+    def __init__(self, bucket: str, interval: int):
+        self.bucket = bucket
+        self.interval = interval
+        threading.Thread(target=self._run, name="manifest-reconciler", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                _count('reconcile_failures')
+                logger.error(f"Object manifest reconcile failed: {e}")
+            time.sleep(self.interval)
+
+    def _list_objects(self) -> dict[str, tuple[int, str]]:
+        client = get_s3_client()
+        if not client:
+            raise RuntimeError("No S3 client")
+        objects = {}
+        for page in client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket):
+            for obj in page.get('Contents', []):
+                objects[obj['Key']] = (obj['Size'], obj['ETag'].strip('"'))
+        return objects
+
+    def _recently_reconciled(self, cur) -> bool:
+        cur.execute(
+            "SELECT EXISTS (SELECT 1 FROM manifest_state "
+            "WHERE reconciled_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 second')",
+            (self.interval / 2,)
+        )
+        return cur.fetchone()[0]
+
+    def reconcile(self) -> bool:
+        """One listing pass; False if another worker reconciled recently or holds the lock."""
+        started = time.monotonic()
+        with pg_connection() as conn:
+            if not conn:
+                return False
+            with conn.cursor() as cur:
+                skip = self._recently_reconciled(cur)
+            conn.rollback()
+        if skip:
+            _count('reconcile_skipped')
+            return False
+        objects = self._list_objects()  # Slow for big buckets; no transaction or lock is held meanwhile
+        with pg_connection() as conn:
+            if not conn:
+                return False
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (_RECONCILE_LOCK_ID,))
+                    if not cur.fetchone()[0] or self._recently_reconciled(cur):
+                        conn.rollback()
+                        _count('reconcile_skipped')
+                        return False
+                    cur.execute("SELECT DISTINCT s3_key FROM documents WHERE s3_key IS NOT NULL")
+                    keys = [row[0] for row in cur.fetchall()]
+                    rows = [(key, key in objects, *objects.get(key, (None, None))) for key in keys]
+                    changed = execute_values(
+                        cur,
+                        "UPDATE documents d SET s3_exists = v.present, s3_size = v.size, s3_etag = v.etag, "
+                        "s3_verified_at = CURRENT_TIMESTAMP "
+                        "FROM (VALUES %s) AS v (s3_key, present, size, etag) WHERE d.s3_key = v.s3_key "
+                        "AND (d.s3_exists, d.s3_size, d.s3_etag) IS DISTINCT FROM (v.present, v.size, v.etag) "
+                        "RETURNING 1",
+                        rows,
+                        template="(%s, %s, %s::bigint, %s)",
+                        page_size=500,
+                        fetch=True
+                    )
+                    cur.execute(
+                        "INSERT INTO manifest_state (reconciled_at) VALUES (CURRENT_TIMESTAMP) "
+                        "ON CONFLICT (id) DO UPDATE SET reconciled_at = EXCLUDED.reconciled_at"
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        missing = sum(1 for _, exists, _, _ in rows if not exists)
+        with _metrics_lock:
+            _metrics['reconciles'] += 1
+            _metrics['last_objects'] = len(rows)
+            _metrics['last_missing'] = missing
+            _metrics['last_changed'] = len(changed)
+            _metrics['last_duration'] = time.monotonic() - started
+        logger.info(f"Object manifest reconciled: {len(rows)} documents, {len(changed)} changed, {missing} missing from S3")
+        return True
+
+
+_reconciler = None
+_reconciler_pid = None
+_reconciler_lock = threading.Lock()
+
+
+def get_manifest_reconciler() -> ManifestReconciler | None:
+    """Started at app startup, and again in each forked gunicorn worker; None when MANIFEST_RECONCILE is off."""
+    global _reconciler, _reconciler_pid
+    if not MANIFEST_RECONCILE:
+        return None
+    pid = os.getpid()
+    if _reconciler is None or _reconciler_pid != pid:
+        with _reconciler_lock:
+            if _reconciler is None or _reconciler_pid != pid:
+                _reconciler = ManifestReconciler(S3_BUCKET_NAME, MANIFEST_RECONCILE_INTERVAL)
+                _reconciler_pid = pid
+    return _reconciler
+
+
+def get_manifest_metrics() -> dict:
+    with _metrics_lock:
+        return dict(_metrics)
@@ -0,0 +1,172 @@
+# src/core/outbound.py
+import queue
+import threading
+import time
+from collections import deque
+from src.core.logger import logger
+
+
+class TokenBucket:
+    """Blocking rate limiter: `rate` sends per second on average, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class OutboundDispatcher:
+    """
+    Sends WhatsApp payloads on background threads via `send(payload) -> message id | None`.
+    Each recipient has a FIFO queue and at most one message in flight: the next one is released when
+    a status webhook (sent/delivered/read/failed) for the previous message arrives, or after
+    `status_timeout` seconds. The Cloud API doesn't promise per-recipient order for accepted messages,
+    so a PDF and the text after it could otherwise swap. Statuses that land on another gunicorn worker
+    are published through the state store; `shared_statuses(message_ids) -> ids with a status` is
+    polled every `poll_interval` seconds for messages still waiting. Different recipients are sent in
+    parallel, all sharing one token bucket for the Cloud API throughput limit.
+    """
+
+    def __init__(self, send, workers: int, rate: float, burst: float, status_timeout: float,
+                 shared_statuses=None, poll_interval: float = 0.25):
+        self.send = send
+        self.status_timeout = status_timeout
+        self.shared_statuses = shared_statuses
+        self.poll_interval = poll_interval
+        self._bucket = TokenBucket(rate, burst)
+        self._lock = threading.Lock()
+        self._pending = {}  # recipient -> deque of (payload, on_failure, submitted_at)
+        self._busy = set()  # recipients with a message queued for a worker, in flight or awaiting its status
+        self._awaiting = {}  # message id -> (recipient, release deadline)
+        self._ready = queue.Queue()  # recipients whose next message may be sent now
+        self._metrics = {
+            'submitted': 0,
+            'sent': 0,
+            'failed': 0,
+            'released_by_status': 0,
+            'released_by_shared_status': 0,
+            'released_by_timeout': 0,
+            'send_wait_total': 0.0,
+        }
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._run, name=f"outbound-sender-{i}", daemon=True).start()
+        threading.Thread(target=self._expire, name="outbound-expiry", daemon=True).start()
+
+    def submit(self, payload: dict, on_failure=None):
+        """Queue a payload behind anything already pending for the same recipient."""
+        recipient = payload['to']
+        with self._lock:
+            self._pending.setdefault(recipient, deque()).append((payload, on_failure, time.monotonic()))
+            self._metrics['submitted'] += 1
+            if recipient not in self._busy:
+                self._busy.add(recipient)
+                self._ready.put(recipient)
+
+    def on_statuses(self, statuses: list[dict]) -> list[dict]:
+        """Release recipients waiting on these statuses; returns the statuses this process wasn't waiting for."""
+        released = []
+        others = []
+        with self._lock:
+            for status in statuses:
+                entry = self._awaiting.pop(status.get('id'), None)
+                if entry is None:
+                    others.append(status)
+                else:
+                    released.append(entry[0])
+            self._metrics['released_by_status'] += len(released)
+        for recipient in released:
+            self._release(recipient)
+        return others
+
+    def _run(self):
+        while True:
+            recipient = self._ready.get()
+            with self._lock:
+                payload, on_failure, submitted_at = self._pending[recipient].popleft()
+            self._bucket.acquire()
+            try:
+                message_id = self.send(payload)
+            except Exception as e:
+                logger.error(f"Outbound send to {recipient} failed: {e}")
+                message_id = None
+            with self._lock:
+                self._metrics['send_wait_total'] += time.monotonic() - submitted_at
+                self._metrics['sent' if message_id is not None else 'failed'] += 1
+                if message_id:
+                    self._awaiting[message_id] = (recipient, time.monotonic() + self.status_timeout)
+            if message_id is None and on_failure is not None:
+                try:
+                    on_failure()
+                except Exception as e:
+                    logger.error(f"Outbound failure callback for {recipient} failed: {e}")
+            if not message_id:
+                self._release(recipient)
+
+    def _release(self, recipient: str):
+        with self._lock:
+            if self._pending.get(recipient):
+                self._ready.put(recipient)
+            else:
+                self._pending.pop(recipient, None)
+                self._busy.discard(recipient)
+
+    def _expire(self):
+        while True:
+            time.sleep(self.poll_interval)
+            now = time.monotonic()
+            with self._lock:
+                expired = [(mid, r) for mid, (r, deadline) in self._awaiting.items() if deadline <= now]
+                for message_id, _ in expired:
+                    del self._awaiting[message_id]
+                self._metrics['released_by_timeout'] += len(expired)
+                waiting = list(self._awaiting)
+            for _, recipient in expired:
+                self._release(recipient)
+            if waiting and self.shared_statuses is not None:
+                self._release_shared(waiting)
+
+    def _release_shared(self, message_ids: list[str]):
+        """Release messages whose status webhook was handled by another worker."""
+        try:
+            seen = self.shared_statuses(message_ids)
+        except Exception as e:
+            logger.error(f"Outbound status lookup failed: {e}")
+            return
+        released = []
+        with self._lock:
+            for message_id in seen:
+                entry = self._awaiting.pop(message_id, None)
+                if entry is not None:
+                    released.append(entry[0])
+            self._metrics['released_by_shared_status'] += len(released)
+        for recipient in released:
+            self._release(recipient)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._metrics)
+            queued = sum(len(q) for q in self._pending.values())
+            awaiting = len(self._awaiting)
+            recipients = len(self._busy)
+        done = (m['sent'] + m['failed']) or 1
+        return {
+            **m,
+            'queued': queued,
+            'awaiting_status': awaiting,
+            'active_recipients': recipients,
+            'send_wait_avg': m['send_wait_total'] / done,
+        }
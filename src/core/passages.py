@@ -0,0 +1,71 @@
+# src/core/passages.py
+import math
+from collections import Counter
+from src.core.config import SUMMARY_TOKEN_BUDGET, CHARS_PER_TOKEN
+from src.core.document_chunks import Chunk, get_doc_chunks, join_passages
+from src.core.lexical_index import tokenize, BM25_K1, BM25_B
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def score_chunks(query: str, chunks: list[Chunk]) -> list[float]:
+    """
+    BM25 of each chunk against the query, with the chunks of one document as the corpus. A section
+    heading counts once, towards the section's first chunk, so it doesn't lift every chunk under it.
+    """
+    terms = []
+    for i, c in enumerate(chunks):
+        heading = c.section if c.section and (i == 0 or chunks[i - 1].section != c.section) else ''
+        terms.append(Counter(tokenize(f"{heading} {c.text}")))
+    lengths = [sum(t.values()) for t in terms]
+    n = len(chunks)
+    avgdl = sum(lengths) / n if n else 1
+    scores = [0.0] * n
+    for term in set(tokenize(query)):
+        df = sum(1 for t in terms if term in t)
+        if not df:
+            continue
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for i, t in enumerate(terms):
+            tf = t.get(term)
+            if tf:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / (avgdl or 1))
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores
+
+
+def select_passages(query: str, chunks: list[Chunk], token_budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Best-scoring chunks that fit the token budget, put back in document order; chunks sharing no query
+    term are left out. With no query term in any chunk this degrades to the opening of the document,
+    like the old fixed prefix.
+    """
+    if not chunks:
+        return ''
+    scores = score_chunks(query, chunks)
+    if any(scores):
+        order = sorted((i for i in range(len(chunks)) if scores[i] > 0), key=lambda i: (-scores[i], i))
+    else:
+        order = range(len(chunks))
+    picked = []
+    used = 0
+    for i in order:
+        cost = estimate_tokens(chunks[i].text)
+        if used + cost > token_budget:
+            if picked:
+                continue  # A smaller, lower-ranked chunk may still fit
+            # Even the best chunk is over budget: keep as much of it as fits
+            text = chunks[i].text[:int(token_budget * CHARS_PER_TOKEN)]
+            picked.append(Chunk(chunks[i].index, chunks[i].section, chunks[i].start, chunks[i].end, text))
+            break
+        picked.append(chunks[i])
+        used += cost
+    picked.sort(key=lambda c: c.index)
+    return join_passages(picked)
+
+
+def get_relevant_passages(s3_keys: list[str], query: str, token_budget: int = SUMMARY_TOKEN_BUDGET) -> dict[str, str]:
+    """{s3_key: prompt-ready passages relevant to query} for the given documents."""
+    return {key: select_passages(query, chunks, token_budget) for key, chunks in get_doc_chunks(s3_keys).items()}
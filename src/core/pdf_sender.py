@@ -1,51 +1,109 @@
 # src/core/pdf_sender.py
-import time
-
-from src.core.config import S3_BUCKET_NAME
-from src.core.s3_handler import get_pdf_url, get_s3_client
+from concurrent.futures import ThreadPoolExecutor
+from src.core.config import BULK_SEND_CONCURRENCY, OUTBOUND_ASYNC
+from src.core.object_manifest import get_manifest_entries, object_exists, verify_object
+from src.core.s3_handler import get_pdf_url
 from src.core.whatsapp_handler import send_whatsapp_pdf, send_whatsapp_text
 from src.core.logger import logger
-from botocore.exceptions import ClientError
 
 def send_pdf(sender_id: str, company_id: str, pdf_s3_key: str, caption: str = "") -> bool:
     """
     Immutable function to send a PDF based on S3 key.
-    - Checks existence via head_object
+    - Checks existence via the object manifest (head_object only when the manifest entry is stale)
     - Generates presigned URL with attachment disposition
     - Sends "Sending [name]..." text
-    - Sends PDF with caption
-    - Delays 2s for sequencing
-    - Returns True if sent, False otherwise (sends error text)
+    - Sends PDF with caption (the outbound dispatcher keeps it behind the notice)
+    - Returns True if queued, False otherwise (sends error text; also sent if WhatsApp later rejects the PDF)
     """
     filename = pdf_s3_key.split('/')[-1]
     nice_name = filename.replace('.pdf', '').replace('_', ' ').capitalize()
-    client = get_s3_client()
-    if not client:
-        send_whatsapp_text(sender_id, "Error: Unable to connect to storage.")
-        return False
     # Existence check
-    try:
-        client.head_object(Bucket=S3_BUCKET_NAME, Key=pdf_s3_key)
-    except ClientError as e:
-        if e.response['Error']['Code'] == '404':
-            logger.warning(f"PDF not found: {pdf_s3_key}")
-            send_whatsapp_text(sender_id, f"{nice_name} PDF not available.")
-            return False
-        else:
-            logger.error(f"Error checking PDF: {e}")
-            send_whatsapp_text(sender_id, "Error checking file availability.")
-            return False
+    exists = object_exists(pdf_s3_key)
+    if exists is None:
+        send_whatsapp_text(sender_id, "Error checking file availability.")
+        return False
+    if not exists:
+        logger.warning(f"PDF not found: {pdf_s3_key}")
+        send_whatsapp_text(sender_id, f"{nice_name} PDF not available.")
+        return False
     url = get_pdf_url(pdf_s3_key)
     if not url:
         send_whatsapp_text(sender_id, f"Error generating link for {nice_name}.")
         return False
     send_whatsapp_text(sender_id, f"Sending {nice_name}...")
-    success = send_whatsapp_pdf(sender_id, url, filename, caption=caption)
+
+    def on_failure():
+        logger.error(f"Failed to send PDF {pdf_s3_key} to {sender_id}")
+        send_whatsapp_text(sender_id, f"Error sending {nice_name}. Try again.")
+
+    success = send_whatsapp_pdf(sender_id, url, filename, caption=caption, on_failure=on_failure)
     if success:
         logger.info(f"Sent PDF {pdf_s3_key} to {sender_id}")
-        time.sleep(2)  # Delay for sequencing
-        return True
+    return success
+
+
+_bulk_pool = ThreadPoolExecutor(max_workers=BULK_SEND_CONCURRENCY, thread_name_prefix="bulk-send")
+
+
+def _nice_name(s3_key: str) -> str:
+    return s3_key.split('/')[-1].replace('.pdf', '').replace('_', ' ').capitalize()
+
+
+def _prepare(s3_key: str, verified: bool) -> tuple[str, str | None]:
+    """('ready', url), ('missing', None) or ('error', None)."""
+    if not verified:
+        exists = verify_object(s3_key)
+        if exists is None:
+            return 'error', None
+        if not exists:
+            return 'missing', None
+    url = get_pdf_url(s3_key)
+    return ('ready', url) if url else ('error', None)
+
+
+def send_pdfs(sender_id: str, company_id: str, s3_keys: list[str], caption: str = "") -> tuple[dict[str, str], str]:
+    """
+    Bulk send_pdf for several files of one request.
+    - One manifest query; head_object and presigning run in parallel for the rest
+    - One "Sending N files..." notice instead of one per file
+    - Documents are queued in the given order (the outbound dispatcher keeps that order per recipient);
+      with OUTBOUND_ASYNC off they are posted concurrently
+    - One summary text with every file's outcome; with OUTBOUND_ASYNC the documents are only queued at
+      that point, so it says so rather than claiming they were sent
+    Returns ({s3_key: 'sent' | 'missing' | 'error'}, summary text), 'sent' meaning queued in async mode.
+    A PDF WhatsApp rejects after queueing still gets its own error text, as with send_pdf.
+    """
+    verified = {key for key, entry in get_manifest_entries(s3_keys).items() if entry['exists']}
+    prepared = list(_bulk_pool.map(lambda key: _prepare(key, key in verified), s3_keys))
+    outcomes = {key: status for key, (status, _) in zip(s3_keys, prepared)}
+    ready = [(key, url) for key, (status, url) in zip(s3_keys, prepared) if status == 'ready']
+    if ready:
+        send_whatsapp_text(sender_id, f"Sending {len(ready)} file{'s' if len(ready) != 1 else ''}...")
+
+    def send(s3_key, url):
+        def on_failure():
+            logger.error(f"Failed to send PDF {s3_key} to {sender_id}")
+            send_whatsapp_text(sender_id, f"Error sending {_nice_name(s3_key)}. Try again.")
+        return send_whatsapp_pdf(sender_id, url, s3_key.split('/')[-1], caption=caption, on_failure=on_failure)
+
+    if OUTBOUND_ASYNC:
+        results = [send(key, url) for key, url in ready]  # Only queues; ordering is kept by the dispatcher
     else:
-        logger.error(f"Failed to send PDF {pdf_s3_key} to {sender_id}")
-        send_whatsapp_text(sender_id, f"Error sending {nice_name}. Try again.")
-        return False
\ No newline at end of file
+        results = list(_bulk_pool.map(lambda item: send(*item), ready))
+    for (key, _), success in zip(ready, results):
+        outcomes[key] = 'sent' if success else 'error'
+
+    sent = [key for key, status in outcomes.items() if status == 'sent']
+    if OUTBOUND_ASYNC:
+        summary = f"Queued {len(sent)} of {len(s3_keys)} files; you'll get a message if any of them fails to send."
+    else:
+        summary = f"Sent {len(sent)} of {len(s3_keys)} files."
+    missing = [_nice_name(key) for key, status in outcomes.items() if status == 'missing']
+    failed = [_nice_name(key) for key, status in outcomes.items() if status == 'error']
+    if missing:
+        summary += f"\nNot available: {', '.join(missing)}"
+    if failed:
+        summary += f"\nCould not send: {', '.join(failed)}"
+    send_whatsapp_text(sender_id, summary)
+    logger.info(f"Bulk send to {sender_id}: {len(sent)}/{len(s3_keys)} {'queued' if OUTBOUND_ASYNC else 'sent'}, {len(missing)} missing, {len(failed)} failed")
+    return outcomes, summary
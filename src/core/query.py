@@ -1,31 +1,30 @@
 # src/core/query.py
 import json
-import requests
 import re
-import time
 import difflib
-from src.core.config import GROK_API_KEY, GROK_MODEL
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from src.core.config import (
+    GROK_MODEL, LEXICAL_TOP_N, LEXICAL_DECISIVE_RATIO, SUMMARY_CONCURRENCY,
+    LLM_CACHE_ENABLED, LLM_STREAMING, STREAM_FLUSH_CHARS, QUERY_DEADLINE_SECONDS, SUMMARY_TOKEN_BUDGET,
+    SEMANTIC_SEARCH, INTERPRET_BUDGET_SECONDS, SELECT_BUDGET_SECONDS, SUMMARY_MIN_SECONDS
+)
+from src.core.lexical_index import get_lexical_index
+from src.core.llm_client import LLMError, get_llm_client
+from src.core.llm_cache import get_llm_cache, cache_key, normalize_query
+from src.core.spell import get_spell_checker
+from src.core.streaming import OrderedEmitter, ParagraphChunker, split_text
 from src.core.whatsapp_handler import send_whatsapp_text
-from src.core.db_handler import get_user_id, get_pg_conn
+from src.core.document_chunks import get_doc_snippets
+from src.core.passages import get_relevant_passages
+from src.core.query_budget import QueryBudget
+from src.core.s3_handler import get_pdf_url
+from src.core.semantic_index import get_semantic_index
+from src.core.user_context import UserContext
 
-def get_all_docs(company_id, sender_id):
-    user_id = get_user_id(sender_id)
-    conn = get_pg_conn()
-    if not conn:
-        return []
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT s3_key, content FROM documents WHERE company_id = %s AND (user_id IS NULL OR user_id = %s)",
-                (company_id, user_id)
-            )
-            rows = cur.fetchall()
-            return [{'s3_key': row[0], 'content': row[1]} for row in rows]
-    except Exception as e:
-        print(f"Error fetching docs: {str(e)}")
-        return []
-    finally:
-        conn.close()
+def get_all_docs(ctx: UserContext):
+    """The user's documents as {'s3_key', 'snippet', 'content_hash'}; full text is fetched per chunk when summarising."""
+    return get_doc_snippets(ctx.company_id, ctx.user_id)
 
 def get_clean_title(filepath: str) -> str:
     filename = filepath.split('/')[-1].replace('.pdf', '').replace('_', ' ').replace('-', ' ').strip().lower()
@@ -43,98 +42,216 @@ def get_clean_title(filepath: str) -> str:
         filename = re.sub(r'\d{4}\.\d{1,2}(?:\.\d{1,2})?', date_str, filename)
     return filename.capitalize()
 
-def interpret_query(query, sender_id, company_id, retries=3, backoff=2):
+def _stage(budget, name, seconds=None):
+    return budget.stage(name, seconds) if budget else nullcontext(None)
+
+def _degrade(budget, path, reason):
+    if budget:
+        budget.degrade(path, reason)
+    else:
+        print(f"Query degraded to {path}: {reason}")
+
+def interpret_query(query, sender_id, company_id, budget: QueryBudget | None = None):
+    # Check spelling against the company's own vocabulary first; the LLM only sees words it can't place
+    corrected, confident = get_spell_checker().correct(company_id, query)
+    if not confident:
+        key = cache_key('interpret', GROK_MODEL, normalize_query(query))
+        with _stage(budget, 'interpret', INTERPRET_BUDGET_SECONDS) as deadline:
+            corrected = get_llm_cache().cached(key, lambda: _interpret_with_llm(query, deadline))
+    if corrected is None:
+        _degrade(budget, 'original_query', "interpretation unavailable")
+        return query
+    if normalize_query(corrected) != normalize_query(query):  # Cached per normalised query, so ignore case/spacing
+        msg = f"Interpreted '{query}' as '{corrected}' for better results. If incorrect, rerun with exact spelling."
+        send_whatsapp_text(sender_id, msg)
+        return corrected
+    return query  # No message if unchanged
+
+def _interpret_with_llm(query, deadline):
     prompt = f"Query: '{query}'\nIf this seems misspelled or unclear, suggest a corrected version (e.g., 'code of condct' -> 'code of conduct'). Consider common HR/pharma terms like 'payslip', 'leave policy', 'patient marketing'. If no correction needed, output the original query. Output ONLY the query (corrected or original)."
-    headers = {"Authorization": f"Bearer {GROK_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": GROK_MODEL, "messages": [{"role": "user", "content": prompt}]}
-    for attempt in range(retries):
-        try:
-            response = requests.post("https://api.x.ai/v1/chat/completions", headers=headers, json=payload, timeout=30)
-            if response.status_code == 200:
-                corrected = response.json()['choices'][0]['message']['content'].strip()
-                if corrected != query:
-                    msg = f"Interpreted '{query}' as '{corrected}' for better results. If incorrect, rerun with exact spelling."
-                    send_whatsapp_text(sender_id, msg)
-                    return corrected
-                else:
-                    return query  # No message if unchanged
-        except requests.Timeout:
-            print(f"Timeout on attempt {attempt + 1}. Retrying after {backoff} seconds...")
-            time.sleep(backoff)
-            backoff *= 2
-        except Exception as e:
-            print(f"Interpretation failed on attempt {attempt + 1}: {e}")
-            time.sleep(backoff)
-    print("All retries failed. Using original query.")
-    return query
-
-def ai_select_docs(query, docs, sender_id, company_id, max_select=3):
+    return get_llm_client().complete(prompt, kind='interpret', deadline=deadline)
+
+def lexical_candidates(query, docs, company_id):
+    """
+    Pre-rank the user's documents with the company's BM25 index.
+    Returns (candidate docs for the LLM, best first when ranked; decisive s3_key or None; ranked?).
+    """
+    ranked = get_lexical_index().search(company_id, query, {d['s3_key'] for d in docs}, LEXICAL_TOP_N)
+    if not ranked:
+        return docs, None, False  # No term overlap (synonyms, typos): let the LLM see everything as before
+    if len(ranked) == 1 or ranked[0][1] >= LEXICAL_DECISIVE_RATIO * ranked[1][1]:
+        decisive = ranked[0][0]
+    else:
+        decisive = None
+    by_key = {d['s3_key']: d for d in docs}
+    return [by_key[key] for key, _ in ranked], decisive, True
+
+def semantic_select_docs(query, docs, company_id, max_select=3):
+    """Cosine top-k over the company's local embeddings; [] if there is no index or nothing is close enough."""
+    ranked = get_semantic_index().search(company_id, query, {d['s3_key'] for d in docs}, max_select)
+    if ranked:
+        print(f"Semantic selection: {ranked}")
+    return [key for key, _ in ranked]
+
+def ai_select_docs(query, docs, sender_id, company_id, max_select=3, budget: QueryBudget | None = None):
+    docs, decisive, ranked = lexical_candidates(query, docs, company_id)
+    if decisive:
+        print(f"Lexical match decisive, skipping AI selection: {decisive}")
+        return [decisive]
     send_whatsapp_text(sender_id, "Filtering relevant files with AI...")
+    # Keyed on the candidate set's contents, so any document change invalidates the selection
+    doc_set = sorted((d['s3_key'], d['content_hash']) for d in docs)
+    key = cache_key('select', GROK_MODEL, normalize_query(query), max_select, doc_set)
+    with _stage(budget, 'select', SELECT_BUDGET_SECONDS) as deadline:
+        selected = get_llm_cache().cached(key, lambda: _select_with_llm(query, docs, max_select, deadline))
+    if selected is None and ranked:
+        _degrade(budget, 'local_ranking', "AI selection unavailable")
+        return [d['s3_key'] for d in docs[:max_select]]
+    if selected is None:
+        _degrade(budget, 'no_selection', "AI selection unavailable and no lexical match")
+    return selected or []  # Empty if fails
+
+def _select_with_llm(query, docs, max_select, deadline):
     doc_entries = []
     for d in docs:
-        snippet = json.dumps(d['content'])[:200]
-        doc_entries.append(f"Path: {d['s3_key']}\nTitle: {get_clean_title(d['s3_key'])}\nSnippet: {snippet}")
+        doc_entries.append(f"Path: {d['s3_key']}\nTitle: {get_clean_title(d['s3_key'])}\nSnippet: {d['snippet']}")
     doc_str = "\n\n".join(doc_entries)
     prompt = f"Query: '{query}'\nDocuments:\n{doc_str}\n\nSelect up to {max_select} most relevant documents (must directly relate; e.g., for 'leave policy', prioritize 'benefits guide' or 'employee handbook' over unrelated SOPs). Output ONLY a JSON array of selected paths (full keys), prioritized by relevance."
-    headers = {"Authorization": f"Bearer {GROK_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": GROK_MODEL, "messages": [{"role": "user", "content": prompt}]}
+    answer = get_llm_client().complete(prompt, kind='select', deadline=deadline)
+    if answer is None:
+        return None
     try:
-        response = requests.post("https://api.x.ai/v1/chat/completions", headers=headers, json=payload, timeout=30)
-        if response.status_code == 200:
-            selected = json.loads(response.json()['choices'][0]['message']['content'].strip())
-            print(f"AI selected docs: {selected}")
-            return [f for f in selected if any(d['s3_key'] == f for d in docs)]  # Validate
+        selected = json.loads(answer)
+        print(f"AI selected docs: {selected}")
+        return [f for f in selected if any(d['s3_key'] == f for d in docs)]  # Validate
     except Exception as e:
         print(f"AI selection failed: {e}")
-    return []  # Empty if fails
-
-def summarize_docs(matching_files, query, docs, sender_id, company_id):
-    send_whatsapp_text(sender_id, "Generating summaries...")
-    summaries = []
-    for f in matching_files:
-        content = next((d['content'] for d in docs if d['s3_key'] == f), None)
-        if not content:
-            continue
-        title = get_clean_title(f)
-        prompt = f"Document Name: {title}\nContent: {json.dumps(content)[:4000]}...\nQuery: {query}\nOutput Markdown: Start with **{title}** - Relevance: High/Medium/Low. 1-sentence summary. Bullet key details, including relevant sections/subsections where info is found (extract quotes/snippets from those sections if huge doc). Numbered insights. Clean, mobile-friendly, emojis optional. No hashes like # or ### in text."
-        headers = {"Authorization": f"Bearer {GROK_API_KEY}", "Content-Type": "application/json"}
-        payload = {"model": GROK_MODEL, "messages": [{"role": "user", "content": prompt}]}
-        try:
-            response = requests.post("https://api.x.ai/v1/chat/completions", headers=headers, json=payload, timeout=30)
-            if response.status_code == 200:
-                summary = response.json()['choices'][0]['message']['content'].strip()
-                # Remove any hashes
-                summary = re.sub(r'#+\s*', '', summary)
-                # Parse relevance
-                relevance_match = re.search(r'Relevance:\s*(\w+)', summary, re.I)
-                relevance = relevance_match.group(1).capitalize() if relevance_match else 'Unknown'
-                summaries.append((summary, relevance, f))
-            else:
-                summary = f"**{title}** - Error: Summary failed."
-                summaries.append((summary, 'Unknown', f))
-        except Exception as e:
-            summary = f"**{title}** - Error: {str(e)}"
-            summaries.append((summary, 'Unknown', f))
+    return None
+
+_summary_pool = ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY, thread_name_prefix="summarize")
+
+def _document_link(f, title):
+    """Degraded answer for one file: its title and a download link instead of a summary."""
+    url = get_pdf_url(f)
+    return f"**{title}** - Summary unavailable right now." + (f"\nOpen the document: {url}" if url else "")
+
+def _summarize_doc(f, content, doc_hash, query, emit, deadline, use_llm=True, budget=None):
+    """
+    Summarise one file and send it through emit: streamed paragraph by paragraph when LLM_STREAMING is on.
+    Cached summaries are always used; otherwise, without use_llm or when the call fails, a link is sent instead.
+    """
+    title = get_clean_title(f)
+    key = cache_key('summary', GROK_MODEL, normalize_query(query), f, doc_hash, SUMMARY_TOKEN_BUDGET)
+    result = get_llm_cache().get(key) if LLM_CACHE_ENABLED else None
+    if result is not None:
+        for piece in split_text(result[0]):
+            emit(piece)
+        return result[0], result[1], f
+    if not use_llm:
+        result = None
+    elif LLM_STREAMING:
+        result = _stream_summary(title, content, query, emit, deadline)
+    else:
+        result = _summarize_with_llm(title, content, query, deadline)
+        for piece in split_text(result[0]) if result else []:
+            emit(piece)
+    if result is None:
+        if use_llm:
+            _degrade(budget, 'summary_link', f"summary failed for {f}")
+        summary = _document_link(f, title)
+        emit(summary)
+        return summary, 'Unknown', f
+    if LLM_CACHE_ENABLED:
+        get_llm_cache().set(key, result)
+    return result[0], result[1], f
+
+def _summary_prompt(title, content, query):
+    return f"Document Name: {title}\nContent (most relevant passages): {content}\nQuery: {query}\nOutput Markdown: Start with **{title}** - Relevance: High/Medium/Low. 1-sentence summary. Bullet key details, including relevant sections/subsections where info is found (extract quotes/snippets from those sections if huge doc). Numbered insights. Clean, mobile-friendly, emojis optional. No hashes like # or ### in text."
+
+def _strip_hashes(text):
+    return re.sub(r'#+\s*', '', text)
+
+def _parse_relevance(summary):
+    relevance_match = re.search(r'Relevance:\s*(\w+)', summary, re.I)
+    return relevance_match.group(1).capitalize() if relevance_match else 'Unknown'
+
+def _summarize_with_llm(title, content, query, deadline):
+    summary = get_llm_client().complete(_summary_prompt(title, content, query), kind='summary', deadline=deadline)
+    if summary is None:
+        return None
+    # Remove any hashes
+    summary = _strip_hashes(summary)
+    return [summary, _parse_relevance(summary)]
+
+def _stream_summary(title, content, query, emit, deadline):
+    """Streamed completion; paragraphs are emitted as they arrive. Returns [summary, relevance] or None."""
+    chunker = ParagraphChunker(lambda text: emit(_strip_hashes(text)), STREAM_FLUSH_CHARS)
+    parts = []
+    try:
+        for delta in get_llm_client().stream(_summary_prompt(title, content, query), kind='summary', deadline=deadline):
+            parts.append(delta)
+            chunker.feed(delta)
+    except LLMError as e:
+        print(f"Summary stream failed for {title}: {e}")
+        chunker.close()  # Keep what the user already started reading; the caller adds an error note
+        return None
+    chunker.close()
+    summary = _strip_hashes(''.join(parts).strip())
+    return [summary, _parse_relevance(summary)] if summary else None
+
+def _summarize_in_order(emitter, index, f, content, doc_hash, query, deadline, use_llm, budget):
+    try:
+        return _summarize_doc(f, content, doc_hash, query, lambda text: emitter.emit(index, text), deadline, use_llm, budget)
+    finally:
+        emitter.finish(index)
+
+def summarize_docs(matching_files, query, docs, sender_id, company_id, budget: QueryBudget | None = None):
+    """
+    Summarise the selected files concurrently (capped by SUMMARY_CONCURRENCY). The best-ranked file streams
+    to the user live; later files are held until every better-ranked one has been sent, so the AI's order is kept.
+    With less than SUMMARY_MIN_SECONDS of the budget left (or the LLM circuit open), uncached files get links.
+    Returns (summary, s3_key) pairs sorted High > Medium > Low > Unknown; they have already been sent.
+    """
+    use_llm = budget is None or budget.remaining() >= SUMMARY_MIN_SECONDS
+    if not use_llm:
+        _degrade(budget, 'document_links', f"{budget.remaining():.1f}s left for summaries")
+    elif not get_llm_client().available():
+        use_llm = False
+        _degrade(budget, 'document_links', "LLM circuit open")
+    send_whatsapp_text(sender_id, "Generating summaries..." if use_llm else "Finding your documents...")
+    hashes = {d['s3_key']: d['content_hash'] for d in docs}
+    contents = get_relevant_passages(matching_files, query)  # Best-matching chunks within SUMMARY_TOKEN_BUDGET
+    files = [f for f in matching_files if contents.get(f)]
+    emitter = OrderedEmitter(lambda text: send_whatsapp_text(sender_id, text), len(files))
+    with _stage(budget, 'summarize') as deadline:
+        futures = [_summary_pool.submit(_summarize_in_order, emitter, i, f, contents[f], hashes.get(f), query, deadline, use_llm, budget) for i, f in enumerate(files)]
+        summaries = [future.result() for future in futures]
     # Sort by relevance: High > Medium > Low > Unknown
     relevance_order = {'High': 0, 'Medium': 1, 'Low': 2, 'Unknown': 3}
     summaries.sort(key=lambda x: relevance_order.get(x[1], 3))
     # Extract sorted summaries and files
     return [(summary, f) for summary, _, f in summaries]
 
-def process_query(company_id, sender_id, query):
+def process_query(ctx: UserContext, query):
+    sender_id, company_id = ctx.sender_id, ctx.company_id
     send_whatsapp_text(sender_id, "ProQuery: AI driven efficiency. Incoming 🚀")
+    budget = QueryBudget(QUERY_DEADLINE_SECONDS)
     try:
-        interpreted_query = interpret_query(query, sender_id, company_id)
-        docs = get_all_docs(company_id, sender_id)
+        interpreted_query = interpret_query(query, sender_id, company_id, budget)
+        docs = get_all_docs(ctx)
         if not docs:
             return None, "No documents available."
-        matching_files = ai_select_docs(interpreted_query, docs, sender_id, company_id)
+        matching_files = semantic_select_docs(interpreted_query, docs, company_id) if SEMANTIC_SEARCH else []
+        if not matching_files:
+            matching_files = ai_select_docs(interpreted_query, docs, sender_id, company_id, budget=budget)
         if not matching_files:
             return None, "No matching documents found. Check your Benefits Guide or Employee Handbook in Documents menu."
-        summaries = summarize_docs(matching_files, interpreted_query, docs, sender_id, company_id)
+        summaries = summarize_docs(matching_files, interpreted_query, docs, sender_id, company_id, budget)
         if not summaries:
             return None, "Nothing related for your search query. Check your Benefits Guide or Employee Handbook in Documents menu."
-        return summaries, None  # Return list of (summary, s3_key) tuples or error message
+        return summaries, None  # (summary, s3_key) tuples, already sent to the user, or error message
     except Exception as e:
         print(f"Query processing failed: {e}")
-        return None, "ProQuery down try again later and let me know via email (info@proquery.live)"
\ No newline at end of file
+        return None, "ProQuery down try again later and let me know via email (info@proquery.live)"
+    finally:
+        budget.finish()
\ No newline at end of file
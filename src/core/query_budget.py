@@ -0,0 +1,65 @@
+# src/core/query_budget.py
+import threading
+import time
+from contextlib import contextmanager
+from src.core.logger import logger
+
+_metrics_lock = threading.Lock()
+_metrics = {'queries': 0, 'degraded_queries': 0, 'over_budget': 0, 'latency_total': 0.0, 'latency_max': 0.0,
+            'stages': {}, 'degraded': {}}
+
+
+class QueryBudget:
+    """
+    End-to-end latency budget for one query. Each stage runs against its own slice, capped by what is
+    left overall; when a stage is skipped or overruns, the caller takes a degradation path and records it
+    with degrade(), so per-stage timings and path counts on /metrics show where budgets need tuning.
+    """
+
+    def __init__(self, total: float):
+        self.total = total
+        self.started = time.monotonic()
+        self.deadline = self.started + total
+        self.degraded = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    @contextmanager
+    def stage(self, name: str, seconds: float | None = None):
+        """Yields the stage's deadline (its slice, or whatever is left when seconds is None) and times the stage."""
+        started = time.monotonic()
+        try:
+            yield self.deadline if seconds is None else min(started + seconds, self.deadline)
+        finally:
+            elapsed = time.monotonic() - started
+            with _metrics_lock:
+                stats = _metrics['stages'].setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+                stats['count'] += 1
+                stats['total'] += elapsed
+                stats['max'] = max(stats['max'], elapsed)
+
+    def degrade(self, path: str, reason: str):
+        self.degraded.append(path)
+        logger.warning(f"Query degraded to {path} after {time.monotonic() - self.started:.1f}s: {reason}")
+        with _metrics_lock:
+            _metrics['degraded'][path] = _metrics['degraded'].get(path, 0) + 1
+
+    def finish(self):
+        elapsed = time.monotonic() - self.started
+        with _metrics_lock:
+            _metrics['queries'] += 1
+            _metrics['degraded_queries'] += bool(self.degraded)
+            _metrics['over_budget'] += elapsed > self.total
+            _metrics['latency_total'] += elapsed
+            _metrics['latency_max'] = max(_metrics['latency_max'], elapsed)
+
+
+def get_query_metrics() -> dict:
+    with _metrics_lock:
+        m = {**_metrics, 'stages': {name: dict(stats) for name, stats in _metrics['stages'].items()},
+             'degraded': dict(_metrics['degraded'])}
+    m['latency_avg'] = m['latency_total'] / (m['queries'] or 1)
+    for stats in m['stages'].values():
+        stats['avg'] = stats['total'] / (stats['count'] or 1)
+    return m
@@ -1,23 +1,55 @@
 # src/core/s3_handler.py
+import os
+import threading
 import boto3
-from src.core.config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, S3_BUCKET_NAME
+from botocore.config import Config
+from src.core.config import (
+    AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, S3_BUCKET_NAME, S3_POOL_SIZE, S3_CONNECT_TIMEOUT,
+    S3_READ_TIMEOUT, S3_MAX_ATTEMPTS, PRESIGNED_URL_EXPIRES, PRESIGNED_URL_MARGIN, PRESIGNED_URL_CACHE_SIZE
+)
+from src.core.ttl_cache import TTLCache
 from src.core.logger import logger
 
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+# A cached link is handed out for at most EXPIRES - MARGIN seconds, so WhatsApp always has MARGIN left to fetch it
+_url_cache = TTLCache(maxsize=PRESIGNED_URL_CACHE_SIZE, ttl=max(0, PRESIGNED_URL_EXPIRES - PRESIGNED_URL_MARGIN))
+
+
 def get_s3_client():
-    try:
-        client = boto3.client(
-            's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION,
-            endpoint_url=f"https://s3.{AWS_REGION}.amazonaws.com"
-        )
-        return client
-    except Exception as e:
-        logger.error(f"Error creating S3 client: {e}")
-        return None
+    """One client per worker process (boto3 clients are thread-safe; their connection pools don't survive fork)."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                try:
+                    _client = boto3.client(
+                        's3',
+                        aws_access_key_id=AWS_ACCESS_KEY_ID,
+                        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                        region_name=AWS_REGION,
+                        endpoint_url=f"https://s3.{AWS_REGION}.amazonaws.com",
+                        config=Config(
+                            max_pool_connections=S3_POOL_SIZE,
+                            connect_timeout=S3_CONNECT_TIMEOUT,
+                            read_timeout=S3_READ_TIMEOUT,
+                            retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'}
+                        )
+                    )
+                    _client_pid = pid
+                except Exception as e:
+                    logger.error(f"Error creating S3 client: {e}")
+                    return None
+    return _client
+
 
 def get_pdf_url(pdf_filename: str) -> str | None:
+    url = _url_cache.get(pdf_filename)
+    if url is not None:
+        return url
     client = get_s3_client()
     if not client:
         return None
@@ -30,10 +62,15 @@ def get_pdf_url(pdf_filename: str) -> str | None:
                 'ResponseContentType': 'application/pdf',
                 'ResponseContentDisposition': f'attachment; filename="{pdf_filename.split("/")[-1]}"'
             },
-            ExpiresIn=3600  # 1 hour
+            ExpiresIn=PRESIGNED_URL_EXPIRES
         )
         logger.info(f"Generated S3 presigned URL for {pdf_filename}")
+        _url_cache.set(pdf_filename, url)
         return url
     except Exception as e:
         logger.error(f"Error generating presigned URL: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def get_s3_metrics() -> dict:
+    return {'presigned_urls': _url_cache.stats()}
@@ -0,0 +1,217 @@
+# src/core/semantic_index.py
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from src.core.config import (
+    SEMANTIC_INDEX_DIR, SEMANTIC_DIMENSIONS, SEMANTIC_MAX_TERMS, SEMANTIC_MIN_SCORE
+)
+from src.core.db_pool import pg_connection
+from src.core.lexical_index import tokenize
+from src.core.logger import logger
+
+try:
+    import numpy as np
+except ImportError:  # Optional: without numpy semantic search reports itself unavailable
+    np = None
+
+
+def _company_dir(base_dir: str, company_id) -> str:
+    return os.path.join(base_dir, re.sub(r'[^A-Za-z0-9_-]', '_', str(company_id)))
+
+
+def _title(s3_key: str) -> str:
+    return s3_key.split('/')[-1].replace('.pdf', '').replace('_', ' ').replace('-', ' ')
+
+
+def _weights(tokens: list[str]) -> Counter:
+    """Sublinear term frequency, so one long repeated section doesn't dominate a chunk."""
+    return Counter({term: 1 + math.log(tf) for term, tf in Counter(tokens).items()})
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _truncated_svd(matrix, k: int, oversample: int = 10, iterations: int = 4, seed: int = 0):
+    """Randomized SVD (Halko et al.): the top-k right singular vectors as a (terms x k) matrix."""
+    rng = np.random.default_rng(seed)
+    k = min(k, *matrix.shape)
+    sketch = matrix @ rng.standard_normal((matrix.shape[1], k + oversample)).astype(np.float32)
+    for _ in range(iterations):  # Power iterations sharpen the spectrum of text matrices
+        sketch, _ = np.linalg.qr(matrix @ (matrix.T @ sketch))
+    basis, _ = np.linalg.qr(sketch)
+    _, _, vt = np.linalg.svd(basis.T @ matrix, full_matrices=False)
+    return vt[:k].T
+
+
+def build_company_index(company_id, base_dir: str = SEMANTIC_INDEX_DIR, dimensions: int = SEMANTIC_DIMENSIONS,
+                        max_terms: int = SEMANTIC_MAX_TERMS) -> int:
+    """
+    Offline step: TF-IDF over the company's document chunks (with each document's title), reduced to
+    `dimensions` with LSA so co-occurring terms ("time off", "leave") land close together. Writes a new
+    build directory and then points `current` at it, so running workers never see a half-written index.
+    Returns the number of chunk vectors written.
+    """
+    if np is None:
+        raise RuntimeError("numpy is required to build the semantic index")
+    with pg_connection() as conn:
+        if not conn:
+            raise RuntimeError("No database connection")
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT c.s3_key, c.section, c.text FROM document_chunks c "
+                "JOIN documents d ON d.s3_key = c.s3_key WHERE d.company_id = %s ORDER BY c.s3_key, c.chunk_index",
+                (company_id,)
+            )
+            rows = cur.fetchall()
+    if not rows:
+        return 0
+    keys = [row[0] for row in rows]
+    weights = [_weights(tokenize(f"{_title(key)} {section or ''} {text}")) for key, section, text in rows]
+    df = Counter(term for w in weights for term in w)
+    terms = [term for term, _ in df.most_common(max_terms)]
+    column = {term: j for j, term in enumerate(terms)}
+    idf = np.array([math.log((1 + len(rows)) / (1 + df[term])) + 1 for term in terms], dtype=np.float32)
+    tfidf = np.zeros((len(rows), len(terms)), dtype=np.float32)
+    for i, w in enumerate(weights):
+        for term, value in w.items():
+            j = column.get(term)
+            if j is not None:
+                tfidf[i, j] = value * idf[j]
+    tfidf = _normalize_rows(tfidf)
+    components = _truncated_svd(tfidf, dimensions).astype(np.float32)
+    vectors = _normalize_rows(tfidf @ components).astype(np.float32)
+
+    company_dir = _company_dir(base_dir, company_id)
+    build = str(int(time.time() * 1000))
+    build_dir = os.path.join(company_dir, build)
+    os.makedirs(build_dir, exist_ok=True)
+    np.save(os.path.join(build_dir, 'vectors.npy'), vectors)
+    np.save(os.path.join(build_dir, 'components.npy'), components)
+    np.save(os.path.join(build_dir, 'idf.npy'), idf)
+    with open(os.path.join(build_dir, 'meta.json'), 'w') as f:
+        json.dump({'terms': terms, 'keys': keys}, f)
+    tmp = os.path.join(company_dir, 'current.tmp')
+    with open(tmp, 'w') as f:
+        f.write(build)
+    os.replace(tmp, os.path.join(company_dir, 'current'))
+    builds = sorted(b for b in os.listdir(company_dir) if b.isdigit())
+    for old in builds[:-2]:  # Keep the previous build for workers still reading it
+        shutil.rmtree(os.path.join(company_dir, old), ignore_errors=True)
+    logger.info(f"Semantic index for company {company_id}: {len(rows)} chunks, {len(terms)} terms, {components.shape[1]} dims")
+    return len(rows)
+
+
+class CompanySemanticIndex:
+    """One loaded build: chunk vectors memory-mapped read-only, so every worker shares the page cache."""
+
+    def __init__(self, build_dir: str):
+        self.vectors = np.load(os.path.join(build_dir, 'vectors.npy'), mmap_mode='r')
+        self.components = np.load(os.path.join(build_dir, 'components.npy'))
+        self.idf = np.load(os.path.join(build_dir, 'idf.npy'))
+        with open(os.path.join(build_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        self.column = {term: j for j, term in enumerate(meta['terms'])}
+        keys = meta['keys']
+        # Chunks of one document are contiguous: group starts drive the per-document max
+        self.doc_keys = [key for i, key in enumerate(keys) if i == 0 or keys[i - 1] != key]
+        self.starts = np.array([i for i, key in enumerate(keys) if i == 0 or keys[i - 1] != key])
+
+    def embed(self, text: str):
+        query = np.zeros(len(self.column), dtype=np.float32)
+        for term, value in _weights(tokenize(text)).items():
+            j = self.column.get(term)
+            if j is not None:
+                query[j] = value * self.idf[j]
+        vector = query @ self.components
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def search(self, query: str, allowed: set | None, limit: int, min_score: float) -> list[tuple[str, float]]:
+        vector = self.embed(query)
+        if vector is None or not len(self.starts):
+            return []
+        doc_scores = np.maximum.reduceat(self.vectors @ vector, self.starts)  # Best chunk per document
+        order = np.argsort(-doc_scores)
+        results = []
+        for i in order:
+            if doc_scores[i] < min_score or len(results) == limit:
+                break
+            if allowed is None or self.doc_keys[i] in allowed:
+                results.append((self.doc_keys[i], float(doc_scores[i])))
+        return results
+
+
+class SemanticIndex:
+    """Loads each company's current build on first use and again whenever `current` is repointed."""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self._companies = {}  # company_id -> (build, CompanySemanticIndex)
+        self._lock = threading.Lock()
+        self._metrics = {'searches': 0, 'matches': 0, 'unavailable': 0, 'latency_total': 0.0, 'latency_max': 0.0}
+
+    def available(self) -> bool:
+        return np is not None
+
+    def _company(self, company_id) -> CompanySemanticIndex | None:
+        company_dir = _company_dir(self.base_dir, company_id)
+        try:
+            with open(os.path.join(company_dir, 'current')) as f:
+                build = f.read().strip()
+        except OSError:
+            return None
+        with self._lock:
+            loaded = self._companies.get(company_id)
+            if loaded and loaded[0] == build:
+                return loaded[1]
+        index = CompanySemanticIndex(os.path.join(company_dir, build))
+        with self._lock:
+            self._companies[company_id] = (build, index)
+        return index
+
+    def search(self, company_id, query: str, allowed: set | None = None, limit: int = 3,
+               min_score: float = SEMANTIC_MIN_SCORE) -> list[tuple[str, float]]:
+        """(s3_key, cosine) best first; [] when numpy or the company's index is missing."""
+        started = time.monotonic()
+        index = None
+        if self.available():
+            try:
+                index = self._company(company_id)
+            except Exception as e:
+                logger.error(f"Semantic index for company {company_id} failed to load: {e}")
+        if index is None:
+            self._count('unavailable')
+            return []
+        results = index.search(query, allowed, limit, min_score)
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._metrics['searches'] += 1
+            self._metrics['matches'] += bool(results)
+            self._metrics['latency_total'] += elapsed
+            self._metrics['latency_max'] = max(self._metrics['latency_max'], elapsed)
+        return results
+
+    def _count(self, event: str):
+        with self._lock:
+            self._metrics[event] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._metrics)
+        m['latency_avg'] = m['latency_total'] / (m['searches'] or 1)
+        return m
+
+
+_index = SemanticIndex(SEMANTIC_INDEX_DIR)
+
+
+def get_semantic_index() -> SemanticIndex:
+    return _index
@@ -0,0 +1,83 @@
+# src/core/session.py
+import threading
+
+
+class Session:
+    """
+    In-memory copy of a user's sessions.data for the message being processed.
+    Behaves like a dict so handlers can do state['context'] = ... / del state['context'];
+    changes are tracked per top-level key and written back once by save_session().
+    """
+
+    def __init__(self, user_id: int, data: dict | None = None, version: int = 0):
+        self.user_id = user_id
+        self.version = version
+        self._data = dict(data or {})
+        self._changed = set()
+        self._deleted = set()
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._changed.add(key)
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        del self._data[key]
+        self._deleted.add(key)
+        self._changed.discard(key)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def pop(self, key, default=None):
+        if key in self._data:
+            value = self._data[key]
+            del self[key]
+            return value
+        return default
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._changed or self._deleted)
+
+    @property
+    def data(self) -> dict:
+        return dict(self._data)
+
+    def patch(self) -> tuple[dict, list]:
+        """Top-level keys to set and keys to remove since load."""
+        return {k: self._data[k] for k in self._changed}, sorted(self._deleted)
+
+    def rebase(self, fresh_data: dict, fresh_version: int):
+        """Re-apply our key-level changes on top of a newer copy written by someone else."""
+        merged = dict(fresh_data or {})
+        for key in self._changed:
+            merged[key] = self._data[key]
+        for key in self._deleted:
+            merged.pop(key, None)
+        self._data = merged
+        self.version = fresh_version
+
+    def mark_clean(self):
+        self._changed.clear()
+        self._deleted.clear()
+
+
+_metrics = {'loads': 0, 'flushes': 0, 'conflicts': 0, 'flush_failures': 0}
+_metrics_lock = threading.Lock()
+
+
+def count(event: str, n: int = 1):
+    with _metrics_lock:
+        _metrics[event] = _metrics.get(event, 0) + n
+
+
+def get_session_metrics() -> dict:
+    with _metrics_lock:
+        return dict(_metrics)
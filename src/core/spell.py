@@ -0,0 +1,185 @@
+# src/core/spell.py
+import re
+import threading
+from src.core.lexical_index import get_lexical_index, STOPWORDS
+from src.core.logger import logger
+
+# Domain terms from the interpret_query prompt plus common HR vocabulary, always known
+HR_TERMS = (
+    "payslip leave policy patient marketing code conduct benefits guide employee handbook salary overtime "
+    "pension medical sick annual maternity paternity disciplinary grievance training sop contract resignation "
+    "probation bonus allowance tax holiday absence expenses procedure"
+).split()
+
+# Everyday words in questions that should never be "corrected" into document terms
+QUERY_WORDS = frozenset(
+    "please need want find show send get give tell know about any have has there much many long days "
+    "hi hello thanks thank help latest new current".split()
+)
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Optimal string alignment distance (Levenshtein plus adjacent transpositions)."""
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class BKTree:
+    """Burkhard-Keller tree over a vocabulary for edit-distance lookups."""
+
+    def __init__(self, words):
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            d = edit_distance(word, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int, max_visits: int) -> tuple[list[tuple[int, str]], bool]:
+        """((distance, term) matches, True if the search finished within max_visits nodes)."""
+        found = []
+        stack = [self.root] if self.root else []
+        visits = 0
+        while stack:
+            if visits >= max_visits:
+                return found, False
+            visits += 1
+            term, children = stack.pop()
+            d = edit_distance(word, term)
+            if d <= max_distance:
+                found.append((d, term))
+            for child_distance, child in children.items():
+                if d - max_distance <= child_distance <= d + max_distance:
+                    stack.append(child)
+        return found, True
+
+
+class CompanyVocabulary:
+    def __init__(self, version: int, frequencies: dict):
+        self.version = version
+        self.frequencies = dict(frequencies)
+        for term in HR_TERMS:
+            self.frequencies.setdefault(term, 1)
+        self.tree = BKTree(t for t in self.frequencies if len(t) >= 3 and not t.isdigit())
+
+
+class SpellChecker:
+    """
+    Local query correction against each company's vocabulary (title and content terms of company-wide
+    documents from the lexical index, plus HR_TERMS). correct() reports whether it is confident; callers
+    ask the LLM otherwise. Trees are rebuilt in a background thread while the previous one keeps serving.
+    """
+
+    DOMINANCE = 3  # A candidate wins over others at the same distance only if it is this many times more frequent
+    LONG_WORD = 8  # Only words this long are matched at distance 2; shorter ones collide too easily
+    MAX_VISITS = 2000  # BK-tree nodes per word before giving up and deferring to the LLM
+
+    def __init__(self):
+        self._companies = {}
+        self._building = set()
+        self._lock = threading.Lock()
+        self._metrics = {'known': 0, 'corrected': 0, 'unsure': 0, 'no_vocabulary': 0, 'search_capped': 0, 'rebuilds': 0}
+
+    def _vocabulary(self, company_id) -> CompanyVocabulary | None:
+        """The company's current tree (None until the first build finishes); starts a rebuild if it is stale."""
+        version = get_lexical_index().version(company_id)
+        with self._lock:
+            current = self._companies.get(company_id)
+            if (current is None or current.version != version) and company_id not in self._building:
+                self._building.add(company_id)
+                threading.Thread(
+                    target=self._build, args=(company_id, current.version if current else None),
+                    name=f"spell-build-{company_id}", daemon=True
+                ).start()
+        return current
+
+    def _build(self, company_id, known_version):
+        try:
+            version, frequencies = get_lexical_index().vocabulary(company_id, known_version)
+            if frequencies is not None:
+                vocab = CompanyVocabulary(version, frequencies)
+                logger.info(f"Spelling index for company {company_id}: {len(vocab.frequencies)} terms")
+                with self._lock:
+                    self._companies[company_id] = vocab
+                    self._metrics['rebuilds'] += 1
+        except Exception as e:
+            logger.error(f"Spelling index build failed for company {company_id}: {e}")
+        finally:
+            with self._lock:
+                self._building.discard(company_id)
+
+    def correct(self, company_id, query: str) -> tuple[str, bool]:
+        """(query with confident corrections applied, True if every word is known or confidently fixed)."""
+        vocab = self._vocabulary(company_id)
+        if vocab is None:
+            with self._lock:
+                self._metrics['no_vocabulary'] += 1
+            return query, False
+        corrections = {}
+        confident = True
+        for word in {w.lower() for w in _WORD_RE.findall(query)}:
+            if len(word) < 3 or word.isdigit() or word in STOPWORDS or word in QUERY_WORDS or word in vocab.frequencies:
+                continue
+            best = self._best(vocab, word)
+            if best is None:
+                confident = False
+            else:
+                corrections[word] = best
+        with self._lock:
+            self._metrics['unsure' if not confident else 'corrected' if corrections else 'known'] += 1
+        corrected = _WORD_RE.sub(lambda m: corrections.get(m.group(0).lower(), m.group(0)), query)
+        return corrected, confident
+
+    def _best(self, vocab: CompanyVocabulary, word: str) -> str | None:
+        """A lone distance-1 match, or a clear frequency winner at the nearest distance; None when unsure."""
+        max_distance = 2 if len(word) >= self.LONG_WORD else 1
+        candidates, complete = vocab.tree.search(word, max_distance, self.MAX_VISITS)
+        if not complete:
+            with self._lock:
+                self._metrics['search_capped'] += 1
+            return None  # A closer match may be in the part of the tree we didn't visit
+        if not candidates:
+            return None
+        nearest = min(d for d, _ in candidates)
+        ranked = sorted(((vocab.frequencies[t], t) for d, t in candidates if d == nearest), reverse=True)
+        if nearest == 1 and len(ranked) == 1:
+            return ranked[0][1]
+        # Otherwise ambiguous (e.g. two equally common words one edit away) unless one clearly dominates;
+        # a lone distance-2 match has to be that common on its own
+        runner_up = ranked[1][0] if len(ranked) > 1 else 1
+        if ranked[0][0] < self.DOMINANCE * runner_up:
+            return None
+        return ranked[0][1]
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self._metrics)
+
+
+_checker = SpellChecker()
+
+
+def get_spell_checker() -> SpellChecker:
+    return _checker
@@ -0,0 +1,513 @@
+# src/core/state_store.py
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+import redis
+from psycopg2.extras import Json
+from src.core.config import (
+    STATE_BACKEND, REDIS_URL, REDIS_KEY_PREFIX, SESSION_TTL_SECONDS, DEDUP_TTL_SECONDS,
+    DEDUP_PRUNE_INTERVAL, DEDUP_CACHE_SIZE, DEDUP_CACHE_TTL, SESSION_JSONB_PATCH, SESSION_FLUSH_RETRIES,
+    OUTBOUND_STATUS_TTL
+)
+from src.core.db_pool import pg_connection
+from src.core.session import Session, count as count_session
+from src.core.ttl_cache import TTLCache
+from src.core.user_context import UserContext
+from src.core.logger import logger
+
+RATE_LIMIT_TTL_SECONDS = 60  # Cooldown is 5s; keep the timestamp a little longer
+
+_recent_messages = TTLCache(maxsize=DEDUP_CACHE_SIZE, ttl=DEDUP_CACHE_TTL)
+_dedup_metrics = {'claimed': 0, 'duplicates': 0, 'front_cache_hits': 0}
+_dedup_metrics_lock = threading.Lock()
+
+
+def _count_dedup(event: str):
+    with _dedup_metrics_lock:
+        _dedup_metrics[event] += 1
+
+
+class StateStore(ABC):
+    """
+    Per-user bot state that is touched on every message: the session dict,
+    processed-message claims and the rate-limit timestamp; plus outbound delivery statuses,
+    shared so a status webhook handled by one worker releases the sender waiting in another.
+    """
+
+    @abstractmethod
+    def load_session(self, ctx: UserContext) -> Session:
+        pass
+
+    @abstractmethod
+    def write_session(self, session: Session) -> str:
+        """Persist session changes if the stored version still matches. Returns 'ok', 'conflict' or 'error'."""
+        pass
+
+    @abstractmethod
+    def _claim_messages(self, items: list[tuple[UserContext, str]]) -> set[str]:
+        """Atomically record each message id; returns the ids this caller was first to record."""
+        pass
+
+    @abstractmethod
+    def complete_messages(self, message_ids: list[str]):
+        """Mark claimed messages as fully handled, so release_messages leaves them alone."""
+        pass
+
+    @abstractmethod
+    def _release_messages(self, message_ids: list[str]) -> set[str]:
+        """Drop claims that were never completed; returns the ids released."""
+        pass
+
+    @abstractmethod
+    def get_last_response_time(self, ctx: UserContext) -> datetime | None:
+        pass
+
+    @abstractmethod
+    def set_last_response_time(self, ctx: UserContext, when: datetime):
+        pass
+
+    @abstractmethod
+    def publish_statuses(self, statuses: dict[str, str]):
+        """Record {outbound message id: status} for OUTBOUND_STATUS_TTL; the first status per id is kept."""
+        pass
+
+    @abstractmethod
+    def statuses_seen(self, message_ids: list[str]) -> set[str]:
+        """The ids (from message_ids) that have a published status."""
+        pass
+
+    def load_sessions(self, contexts: list[UserContext]):
+        """Set ctx.session for several users; backends override this with a single round trip."""
+        for ctx in contexts:
+            ctx.session = self.load_session(ctx)
+
+    def claim_message(self, ctx: UserContext, message_id: str) -> bool:
+        """True if this process should handle message_id, False if it was already claimed."""
+        return message_id in self.claim_messages([(ctx, message_id)])
+
+    def claim_messages(self, items: list[tuple[UserContext, str]]) -> set[str]:
+        """
+        Ids (from items) this process should handle.
+        Meta retries usually land within seconds, so a local LRU answers most duplicates
+        without a round trip; the backend claim stays the source of truth across workers.
+        """
+        to_claim = []
+        for ctx, message_id in items:
+            if message_id in _recent_messages:
+                _count_dedup('front_cache_hits')
+            else:
+                to_claim.append((ctx, message_id))
+        if not to_claim:
+            return set()
+        claimed = self._claim_messages(to_claim)
+        for _, message_id in to_claim:
+            _recent_messages.set(message_id, True)
+            _count_dedup('claimed' if message_id in claimed else 'duplicates')
+        return claimed
+
+    def release_messages(self, message_ids: list[str]) -> set[str]:
+        """
+        Let messages claimed by a process that died mid-job be claimed again when its journaled job is replayed.
+        Only call this for jobs whose owner is gone: a live worker's in-progress claims look the same.
+        """
+        released = self._release_messages(message_ids)
+        for message_id in message_ids:
+            _recent_messages.pop(message_id)
+        return released
+
+    def save_session(self, ctx: UserContext) -> bool:
+        """Flush the message's session changes (no-op if nothing changed), rebasing on version conflicts."""
+        session = ctx.session
+        if session is None or not session.dirty:
+            return True
+        for attempt in range(SESSION_FLUSH_RETRIES + 1):
+            result = self.write_session(session)
+            if result == 'ok':
+                session.mark_clean()
+                count_session('flushes')
+                return True
+            if result == 'error':
+                break
+            # Someone else wrote the session since we loaded it: re-apply our keys on their version
+            count_session('conflicts')
+            logger.warning(f"Session for {ctx.sender_id} changed concurrently (version {session.version}), rebasing")
+            fresh = self.load_session(ctx)
+            session.rebase(fresh.data, fresh.version)
+        count_session('flush_failures')
+        return False
+
+
+class PostgresStateStore(StateStore):
+    """State in the sessions (JSONB) and processed_messages tables."""
+
+    def __init__(self):
+        self._last_prune = 0.0
+        self._prune_lock = threading.Lock()
+
+    def load_session(self, ctx: UserContext) -> Session:
+        count_session('loads')
+        with pg_connection() as conn:
+            if not conn:
+                return Session(ctx.user_id)
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT data, version FROM sessions WHERE user_id = %s", (ctx.user_id,))
+                    row = cur.fetchone()
+                    if row:
+                        return Session(ctx.user_id, row[0] or {}, row[1])
+                    else:
+                        cur.execute(
+                            "INSERT INTO sessions (user_id, state, data, version) VALUES (%s, %s, %s, 0)",
+                            (ctx.user_id, 'active', Json({}))
+                        )
+                        conn.commit()
+                        return Session(ctx.user_id)
+            except Exception as e:
+                logger.error(f"Get bot_state failed for {ctx.sender_id}: {e}")
+                return Session(ctx.user_id)
+
+    def write_session(self, session: Session) -> str:
+        with pg_connection() as conn:
+            if not conn:
+                return 'error'
+            try:
+                with conn.cursor() as cur:
+                    if SESSION_JSONB_PATCH:
+                        # Only touch the top-level keys this message changed
+                        to_set, to_delete = session.patch()
+                        cur.execute(
+                            "UPDATE sessions SET data = (COALESCE(data, '{}'::jsonb) - %s::text[]) || %s::jsonb, "
+                            "version = version + 1, last_updated = CURRENT_TIMESTAMP "
+                            "WHERE user_id = %s AND version = %s",
+                            (to_delete, Json(to_set), session.user_id, session.version)
+                        )
+                    else:
+                        cur.execute(
+                            "UPDATE sessions SET data = %s, version = version + 1, last_updated = CURRENT_TIMESTAMP "
+                            "WHERE user_id = %s AND version = %s",
+                            (Json(session.data), session.user_id, session.version)
+                        )
+                    updated = cur.rowcount
+                    conn.commit()
+                if not updated:
+                    return 'conflict'
+                session.version += 1
+                return 'ok'
+            except Exception as e:
+                logger.error(f"Update bot_state failed for user {session.user_id}: {e}")
+                return 'error'
+
+    def load_sessions(self, contexts: list[UserContext]):
+        count_session('loads', len(contexts))
+        by_user = {ctx.user_id: ctx for ctx in contexts}
+        rows = {}
+        with pg_connection() as conn:
+            if conn:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(
+                            "SELECT user_id, data, version FROM sessions WHERE user_id = ANY(%s)", (list(by_user),)
+                        )
+                        rows = {row[0]: row for row in cur.fetchall()}
+                        missing = [user_id for user_id in by_user if user_id not in rows]
+                        if missing:
+                            cur.execute(
+                                "INSERT INTO sessions (user_id, state, data, version) "
+                                "SELECT u, 'active', '{}'::jsonb, 0 FROM unnest(%s::integer[]) AS u",
+                                (missing,)
+                            )
+                            conn.commit()
+                except Exception as e:
+                    logger.error(f"Get bot_state failed for {len(by_user)} users: {e}")
+        for user_id, ctx in by_user.items():
+            row = rows.get(user_id)
+            ctx.session = Session(user_id, row[1] or {}, row[2]) if row else Session(user_id)
+
+    def _claim_messages(self, items: list[tuple[UserContext, str]]) -> set[str]:
+        message_ids = [message_id for _, message_id in items]
+        with pg_connection() as conn:
+            if not conn:
+                return set(message_ids)  # Fail open, as before: better a rare duplicate than a dropped message
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "INSERT INTO processed_messages (message_id, user_id) "
+                        "SELECT * FROM unnest(%s::text[], %s::integer[]) "
+                        "ON CONFLICT (message_id) DO NOTHING RETURNING message_id",
+                        (message_ids, [ctx.user_id for ctx, _ in items])
+                    )
+                    claimed = {row[0] for row in cur.fetchall()}
+                    self._maybe_prune(cur)
+                    conn.commit()
+                return claimed
+            except Exception as e:
+                logger.error(f"Error claiming messages {message_ids}: {e}")
+                return set(message_ids)
+
+    def complete_messages(self, message_ids: list[str]):
+        with pg_connection() as conn:
+            if not conn:
+                return
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE processed_messages SET completed_at = CURRENT_TIMESTAMP WHERE message_id = ANY(%s)",
+                        (list(message_ids),)
+                    )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error completing messages {message_ids}: {e}")
+
+    def _release_messages(self, message_ids: list[str]) -> set[str]:
+        with pg_connection() as conn:
+            if not conn:
+                return set()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "DELETE FROM processed_messages WHERE message_id = ANY(%s) AND completed_at IS NULL "
+                        "RETURNING message_id",
+                        (list(message_ids),)
+                    )
+                    released = {row[0] for row in cur.fetchall()}
+                conn.commit()
+                return released
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error releasing messages {message_ids}: {e}")
+                return set()
+
+    def _maybe_prune(self, cur):
+        """Drop expired dedup rows and outbound statuses at most once per DEDUP_PRUNE_INTERVAL per process."""
+        now = time.monotonic()
+        with self._prune_lock:
+            if now - self._last_prune < DEDUP_PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+        cur.execute(
+            "DELETE FROM processed_messages WHERE processed_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'",
+            (DEDUP_TTL_SECONDS,)
+        )
+        if cur.rowcount:
+            logger.info(f"Pruned {cur.rowcount} processed message ids")
+        cur.execute(
+            "DELETE FROM outbound_statuses WHERE recorded_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'",
+            (OUTBOUND_STATUS_TTL,)
+        )
+
+    def publish_statuses(self, statuses: dict[str, str]):
+        with pg_connection() as conn:
+            if not conn:
+                return  # Waiting senders fall back to their timeout
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "INSERT INTO outbound_statuses (message_id, status) "
+                        "SELECT * FROM unnest(%s::text[], %s::text[]) ON CONFLICT (message_id) DO NOTHING",
+                        (list(statuses), list(statuses.values()))
+                    )
+                    self._maybe_prune(cur)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error publishing statuses {list(statuses)}: {e}")
+
+    def statuses_seen(self, message_ids: list[str]) -> set[str]:
+        with pg_connection() as conn:
+            if not conn:
+                return set()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT message_id FROM outbound_statuses WHERE message_id = ANY(%s)", (list(message_ids),)
+                    )
+                    return {row[0] for row in cur.fetchall()}
+            except Exception as e:
+                logger.error(f"Error reading statuses: {e}")
+                return set()
+
+    def _session(self, ctx: UserContext) -> Session:
+        if ctx.session is None:
+            ctx.session = self.load_session(ctx)
+        return ctx.session
+
+    def get_last_response_time(self, ctx: UserContext) -> datetime | None:
+        ts = self._session(ctx).get('last_response_time')
+        return datetime.fromisoformat(ts) if ts else None
+
+    def set_last_response_time(self, ctx: UserContext, when: datetime):
+        self._session(ctx)['last_response_time'] = when.isoformat()
+        self.save_session(ctx)  # Publish now so concurrent messages see the cooldown
+
+
+class RedisStateStore(StateStore):
+    """
+    State in Redis:
+    - session: hash {prefix}session:{user_id}, one JSON-encoded field per top-level key plus __version
+    - dedup: {prefix}msg:{message_id} claimed with SET NX and a TTL, set to 'done' once handled
+    - rate limit: {prefix}last_response:{user_id} with a short TTL
+    - outbound statuses: {prefix}status:{message_id} set with NX and OUTBOUND_STATUS_TTL
+    """
+    VERSION_FIELD = '__version'
+    COMPLETED = 'done'
+
+    def __init__(self, client, prefix: str = REDIS_KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def _session_key(self, user_id: int) -> str:
+        return f"{self.prefix}session:{user_id}"
+
+    def _message_key(self, message_id: str) -> str:
+        return f"{self.prefix}msg:{message_id}"
+
+    def _last_response_key(self, user_id: int) -> str:
+        return f"{self.prefix}last_response:{user_id}"
+
+    def _status_key(self, message_id: str) -> str:
+        return f"{self.prefix}status:{message_id}"
+
+    def load_session(self, ctx: UserContext) -> Session:
+        count_session('loads')
+        try:
+            raw = self.client.hgetall(self._session_key(ctx.user_id))
+        except Exception as e:
+            logger.error(f"Get bot_state failed for {ctx.sender_id}: {e}")
+            return Session(ctx.user_id)
+        return self._to_session(ctx.user_id, raw)
+
+    def _to_session(self, user_id: int, raw: dict) -> Session:
+        raw = dict(raw)
+        version = int(raw.pop(self.VERSION_FIELD, 0))
+        data = {field: json.loads(value) for field, value in raw.items()}
+        return Session(user_id, data, version)
+
+    def write_session(self, session: Session) -> str:
+        key = self._session_key(session.user_id)
+        to_set, to_delete = session.patch()
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.watch(key)
+                if int(pipe.hget(key, self.VERSION_FIELD) or 0) != session.version:
+                    pipe.unwatch()
+                    return 'conflict'
+                pipe.multi()
+                if to_set:
+                    pipe.hset(key, mapping={field: json.dumps(value) for field, value in to_set.items()})
+                if to_delete:
+                    pipe.hdel(key, *to_delete)
+                pipe.hincrby(key, self.VERSION_FIELD, 1)
+                pipe.expire(key, SESSION_TTL_SECONDS)
+                pipe.execute()
+            session.version += 1
+            return 'ok'
+        except redis.WatchError:
+            return 'conflict'
+        except Exception as e:
+            logger.error(f"Update bot_state failed for user {session.user_id}: {e}")
+            return 'error'
+
+    def load_sessions(self, contexts: list[UserContext]):
+        count_session('loads', len(contexts))
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for ctx in contexts:
+                    pipe.hgetall(self._session_key(ctx.user_id))
+                results = pipe.execute()
+        except Exception as e:
+            logger.error(f"Get bot_state failed for {len(contexts)} users: {e}")
+            results = [{} for _ in contexts]
+        for ctx, raw in zip(contexts, results):
+            ctx.session = self._to_session(ctx.user_id, raw)
+
+    def _claim_messages(self, items: list[tuple[UserContext, str]]) -> set[str]:
+        message_ids = [message_id for _, message_id in items]
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for ctx, message_id in items:
+                    pipe.set(self._message_key(message_id), ctx.user_id, nx=True, ex=DEDUP_TTL_SECONDS)
+                results = pipe.execute()
+            return {message_id for message_id, ok in zip(message_ids, results) if ok}
+        except Exception as e:
+            logger.error(f"Error claiming messages {message_ids}: {e}")
+            return set(message_ids)
+
+    def complete_messages(self, message_ids: list[str]):
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for message_id in message_ids:
+                    pipe.set(self._message_key(message_id), self.COMPLETED, xx=True, keepttl=True)
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Error completing messages {message_ids}: {e}")
+
+    def _release_messages(self, message_ids: list[str]) -> set[str]:
+        keys = [self._message_key(message_id) for message_id in message_ids]
+        try:
+            values = self.client.mget(keys)
+            released = {mid for mid, value in zip(message_ids, values) if value is not None and value != self.COMPLETED}
+            if released:
+                self.client.delete(*(self._message_key(message_id) for message_id in released))
+            return released
+        except Exception as e:
+            logger.error(f"Error releasing messages {message_ids}: {e}")
+            return set()
+
+    def get_last_response_time(self, ctx: UserContext) -> datetime | None:
+        try:
+            ts = self.client.get(self._last_response_key(ctx.user_id))
+        except Exception as e:
+            logger.error(f"Error reading last response time for {ctx.sender_id}: {e}")
+            return None
+        return datetime.fromisoformat(ts) if ts else None
+
+    def set_last_response_time(self, ctx: UserContext, when: datetime):
+        try:
+            self.client.set(self._last_response_key(ctx.user_id), when.isoformat(), ex=RATE_LIMIT_TTL_SECONDS)
+        except Exception as e:
+            logger.error(f"Error updating last response time for {ctx.sender_id}: {e}")
+
+    def publish_statuses(self, statuses: dict[str, str]):
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for message_id, status in statuses.items():
+                    pipe.set(self._status_key(message_id), status, nx=True, ex=OUTBOUND_STATUS_TTL)
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Error publishing statuses {list(statuses)}: {e}")
+
+    def statuses_seen(self, message_ids: list[str]) -> set[str]:
+        try:
+            values = self.client.mget([self._status_key(message_id) for message_id in message_ids])
+        except Exception as e:
+            logger.error(f"Error reading statuses: {e}")
+            return set()
+        return {message_id for message_id, value in zip(message_ids, values) if value is not None}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """Backend chosen by STATE_BACKEND ('postgres' default, or 'redis')."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if STATE_BACKEND == 'redis':
+                    client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+                    _store = RedisStateStore(client)
+                    logger.info("Using Redis state backend")
+                else:
+                    _store = PostgresStateStore()
+    return _store
+
+
+def get_dedup_metrics() -> dict:
+    with _dedup_metrics_lock:
+        counts = dict(_dedup_metrics)
+    return {**counts, 'front_cache': _recent_messages.stats()}
@@ -0,0 +1,100 @@
+# src/core/streaming.py
+import json
+import threading
+
+WHATSAPP_TEXT_LIMIT = 4096
+
+
+def iter_sse_events(response):
+    """Decoded JSON events from an OpenAI-style chat completion stream (server-sent events)."""
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            return
+        try:
+            yield json.loads(data)
+        except ValueError:
+            continue
+
+
+def split_text(text: str, limit: int = WHATSAPP_TEXT_LIMIT) -> list[str]:
+    """Split at paragraph, line or word boundaries so no piece exceeds the WhatsApp text limit."""
+    pieces = []
+    while len(text) > limit:
+        cut = max(text.rfind('\n\n', 0, limit), text.rfind('\n', 0, limit), text.rfind(' ', 0, limit))
+        if cut <= 0:
+            cut = limit
+        pieces.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text.strip():
+        pieces.append(text.strip())
+    return pieces
+
+
+class ParagraphChunker:
+    """
+    Buffers streamed text and hands complete paragraphs to `flush` once at least `min_chars`
+    have accumulated, so users get readable messages rather than one per token.
+    """
+
+    def __init__(self, flush, min_chars: int, limit: int = WHATSAPP_TEXT_LIMIT):
+        self.flush = flush
+        self.min_chars = min_chars
+        self.limit = limit
+        self._buffer = ''
+
+    def feed(self, text: str):
+        self._buffer += text
+        if len(self._buffer) < self.min_chars:
+            return
+        cut = self._buffer.rfind('\n\n')
+        if cut >= self.min_chars:
+            ready, self._buffer = self._buffer[:cut], self._buffer[cut + 2:]
+            for piece in split_text(ready, self.limit):
+                self.flush(piece)
+        elif len(self._buffer) >= self.limit:
+            # One huge paragraph: send full-size pieces and keep the tail to grow with the stream
+            # split_text strips the tail; keep its trailing whitespace so the next token isn't glued on
+            raw = self._buffer
+            *ready, tail = split_text(raw, self.limit) or ['']
+            self._buffer = tail + raw[len(raw.rstrip()):]
+            for piece in ready:
+                self.flush(piece)
+
+    def close(self):
+        for piece in split_text(self._buffer, self.limit):
+            self.flush(piece)
+        self._buffer = ''
+
+
+class OrderedEmitter:
+    """
+    Lets several concurrent producers send to one user in a fixed order: producer 0 sends live,
+    later producers' pieces are held until every earlier producer has finished.
+    """
+
+    def __init__(self, send, count: int):
+        self.send = send
+        self._held = [[] for _ in range(count)]
+        self._done = [False] * count
+        self._head = 0
+        self._lock = threading.Lock()
+
+    def emit(self, index: int, text: str):
+        with self._lock:
+            if index == self._head:
+                self.send(text)
+            else:
+                self._held[index].append(text)
+
+    def finish(self, index: int):
+        with self._lock:
+            self._done[index] = True
+            while self._head < len(self._done) and self._done[self._head]:
+                self._head += 1
+                if self._head < len(self._held):
+                    for text in self._held[self._head]:
+                        self.send(text)
+                    self._held[self._head] = []
@@ -0,0 +1,18 @@
+# src/core/user_context.py
+from dataclasses import dataclass
+from src.core.session import Session
+
+
+@dataclass
+class UserContext:
+    """
+    Everything we know about the sender of the message being processed.
+    Resolved once per webhook message (one users-table query) and passed to handlers
+    and db helpers instead of re-looking up the phone number each time.
+    """
+    sender_id: str
+    user_id: int
+    company_id: str
+    role: str | None = None
+    name: str | None = None
+    session: Session | None = None  # Loaded lazily by get_bot_state, flushed by save_session
@@ -1,8 +1,20 @@
 # src/core/whatsapp_handler.py
-import requests
 import json
-from src.core.config import WHATSAPP_API_URL, WHATSAPP_AUTH_TOKEN, BOT_PHONE_NUMBER
+import os
+import random
+import threading
+import time
+import backoff
+import requests
+from requests.adapters import HTTPAdapter
+from src.core.config import (
+    WHATSAPP_API_URL, WHATSAPP_AUTH_TOKEN, BOT_PHONE_NUMBER, WHATSAPP_CONNECT_TIMEOUT,
+    WHATSAPP_READ_TIMEOUT, WHATSAPP_MAX_TRIES, WHATSAPP_POOL_SIZE, OUTBOUND_ASYNC, OUTBOUND_WORKERS,
+    OUTBOUND_RATE, OUTBOUND_BURST, OUTBOUND_STATUS_TIMEOUT, OUTBOUND_STATUS_POLL
+)
 from src.core.logger import logger
+from src.core.outbound import OutboundDispatcher
+from src.core.state_store import get_state_store
 
 def send_whatsapp_text(recipient: str, text: str) -> bool:
     payload = {
@@ -46,7 +58,7 @@ def send_whatsapp_list(recipient: str, header: str, body: str, footer: str, sect
     }
     return _send_whatsapp(payload)
 
-def send_whatsapp_pdf(recipient: str, pdf_url: str, filename: str, caption: str = "") -> bool:
+def send_whatsapp_pdf(recipient: str, pdf_url: str, filename: str, caption: str = "", on_failure=None) -> bool:
     payload = {
         "messaging_product": "whatsapp",
         "recipient_type": "individual",
@@ -58,21 +70,191 @@ def send_whatsapp_pdf(recipient: str, pdf_url: str, filename: str, caption: str
             "filename": filename
         }
     }
-    return _send_whatsapp(payload)
+    return _send_whatsapp(payload, on_failure)
 
-def _send_whatsapp(payload: dict) -> bool:
-    headers = {
-        "Authorization": f"Bearer {WHATSAPP_AUTH_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    try:
-        response = requests.post(WHATSAPP_API_URL, headers=headers, data=json.dumps(payload))
-        if response.status_code == 200:
-            logger.info(f"WhatsApp message sent to {payload['to']}: {payload}")
-            return True
-        else:
+class WhatsAppClient:
+    """
+    Shared Graph API client: one pooled keep-alive session for all sends, connect/read timeouts,
+    and backoff retries on 429/5xx (honouring Retry-After) or connection failures.
+    """
+
+    def __init__(self, url: str, token: str, connect_timeout: float, read_timeout: float,
+                 max_tries: int, pool_size: int):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        })
+        self._post = backoff.on_predicate(
+            _retry_after_or_expo,
+            predicate=self._should_retry,
+            max_tries=max_tries,
+            jitter=None,  # Jitter is applied inside the wait generator so Retry-After is never shortened
+            on_backoff=lambda details: self._count('retries'),
+        )(self._post_once)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {'calls': 0, 'errors': 0, 'retries': 0, 'latency_total': 0.0, 'latency_max': 0.0}
+
+    def _post_once(self, payload: dict) -> requests.Response | None:
+        try:
+            return self.session.post(self.url, data=json.dumps(payload), timeout=self.timeout)
+        except requests.ConnectionError as e:
+            # Connect failures / dropped keep-alive sockets are safe to retry
+            logger.warning(f"WhatsApp connection error: {e}")
+            return None
+        except requests.Timeout as e:
+            # A read timeout may mean Meta already accepted the message; don't risk sending it twice
+            logger.error(f"WhatsApp request timed out: {e}")
+            return _TIMED_OUT
+
+    @staticmethod
+    def _should_retry(response) -> bool:
+        return response is None or (response is not _TIMED_OUT and (response.status_code == 429 or response.status_code >= 500))
+
+    def send(self, payload: dict) -> str | None:
+        """POST one message; returns its WhatsApp message id ('' if the API omitted it), or None on failure."""
+        started = time.monotonic()
+        response = self._post(payload)
+        elapsed = time.monotonic() - started
+        ok = response is not None and response is not _TIMED_OUT and response.status_code == 200
+        with self._metrics_lock:
+            self._metrics['calls'] += 1
+            self._metrics['latency_total'] += elapsed
+            self._metrics['latency_max'] = max(self._metrics['latency_max'], elapsed)
+            if not ok:
+                self._metrics['errors'] += 1
+        if ok:
+            logger.info(f"WhatsApp message sent to {payload['to']} in {elapsed:.2f}s: {payload}")
+            try:
+                return response.json()['messages'][0]['id']
+            except (ValueError, KeyError, IndexError, TypeError):
+                return ''
+        if response is not None and response is not _TIMED_OUT:
             logger.error(f"Failed to send WhatsApp message: {response.text}")
-            return False
-    except Exception as e:
-        logger.error(f"Error sending WhatsApp message: {e}")
-        return False
\ No newline at end of file
+        else:
+            logger.error(f"Error sending WhatsApp message to {payload['to']}")
+        return None
+
+    def _count(self, event: str):
+        with self._metrics_lock:
+            self._metrics[event] += 1
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        return {**m, 'latency_avg': m['latency_total'] / (m['calls'] or 1)}
+
+
+_TIMED_OUT = object()
+
+
+def _retry_after_or_expo(factor: float = 0.5, max_value: float = 8.0):
+    """backoff wait generator: the server's Retry-After when given, else jittered exponential delay."""
+    attempt = 0
+    response = yield  # Primed by backoff with send(None); later sends carry the failed response
+    while True:
+        retry_after = _retry_after_seconds(response)
+        if retry_after is not None:
+            delay = min(retry_after, max_value * 4)
+        else:
+            delay = random.uniform(0, min(max_value, factor * 2 ** attempt))
+        attempt += 1
+        response = yield delay
+
+
+def _retry_after_seconds(response) -> float | None:
+    if response is None or response is _TIMED_OUT:
+        return None
+    value = response.headers.get('Retry-After')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_whatsapp_client() -> WhatsAppClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = WhatsAppClient(
+                    WHATSAPP_API_URL, WHATSAPP_AUTH_TOKEN,
+                    connect_timeout=WHATSAPP_CONNECT_TIMEOUT,
+                    read_timeout=WHATSAPP_READ_TIMEOUT,
+                    max_tries=WHATSAPP_MAX_TRIES,
+                    pool_size=WHATSAPP_POOL_SIZE
+                )
+    return _client
+
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_outbound_dispatcher() -> OutboundDispatcher:
+    """Sender threads for outbound messages, started lazily in each gunicorn worker."""
+    global _dispatcher, _dispatcher_pid
+    pid = os.getpid()
+    if _dispatcher is None or _dispatcher_pid != pid:
+        with _dispatcher_lock:
+            if _dispatcher is None or _dispatcher_pid != pid:
+                _dispatcher = OutboundDispatcher(
+                    get_whatsapp_client().send,
+                    workers=OUTBOUND_WORKERS,
+                    rate=OUTBOUND_RATE,
+                    burst=OUTBOUND_BURST,
+                    status_timeout=OUTBOUND_STATUS_TIMEOUT,
+                    shared_statuses=lambda message_ids: get_state_store().statuses_seen(message_ids),
+                    poll_interval=OUTBOUND_STATUS_POLL
+                )
+                _dispatcher_pid = pid
+    return _dispatcher
+
+
+def handle_message_statuses(statuses: list[dict]):
+    """
+    Delivery statuses from the webhook: each releases the recipient's next queued message. Ones this
+    worker's dispatcher isn't waiting for are published through the state store for the worker that is.
+    """
+    for status in statuses:
+        if status.get('status') == 'failed':
+            logger.error(f"WhatsApp reported delivery failure for {status.get('id')} to {status.get('recipient_id')}: {status.get('errors')}")
+    if not OUTBOUND_ASYNC:
+        return
+    if _dispatcher is not None and _dispatcher_pid == os.getpid():
+        statuses = _dispatcher.on_statuses(statuses)
+    # 'read' always follows 'sent'/'delivered', which already released the sender
+    published = {s['id']: s['status'] for s in statuses if s.get('id') and s.get('status') in ('sent', 'delivered', 'failed')}
+    if published:
+        get_state_store().publish_statuses(published)
+
+
+def get_whatsapp_metrics() -> dict:
+    metrics = get_whatsapp_client().metrics()
+    if OUTBOUND_ASYNC:
+        metrics['outbound'] = get_outbound_dispatcher().metrics()
+    return metrics
+
+
+def _send_whatsapp(payload: dict, on_failure=None) -> bool:
+    """
+    Queue the message behind earlier ones to the same recipient (True once queued), or send it
+    now when OUTBOUND_ASYNC is off. on_failure() runs if WhatsApp rejects the message.
+    """
+    if OUTBOUND_ASYNC:
+        get_outbound_dispatcher().submit(payload, on_failure)
+        return True
+    sent = get_whatsapp_client().send(payload) is not None
+    if not sent and on_failure is not None:
+        on_failure()
+    return sent
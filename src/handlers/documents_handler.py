@@ -1,196 +1,52 @@
 # src/handlers/documents_handler.py
 from src.core.base_handler import BaseHandler
+from src.core.user_context import UserContext
 from src.core.whatsapp_handler import send_whatsapp_list, send_whatsapp_pdf, send_whatsapp_text, send_whatsapp_buttons
 from src.core.s3_handler import get_pdf_url
-from src.core.db_handler import get_pg_conn, get_user_id, set_pending_feedback, get_bot_state, update_bot_state
+from src.core.db_handler import pg_connection, set_pending_feedback, get_bot_state
 from src.core.config import S3_BUCKET_NAME
+from src.core.document_catalogue import CATEGORIES, get_category_counts, get_user_document, list_category
 from src.core.logger import logger
-import re
-from datetime import datetime
 import time
-from src.core.pdf_sender import send_pdf  # Updated import
+from src.core.pdf_sender import send_pdf, send_pdfs
 
 
 class DocumentsHandler(BaseHandler):
     priority = 80
-
-    def _get_user_documents(self, sender_id: str, company_id: str):
-        user_id = get_user_id(sender_id)
-        conn = get_pg_conn()
-        if not conn:
-            return {}
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT s3_key, doc_type FROM documents WHERE company_id = %s AND user_id = %s",
-                    (company_id, user_id)
-                )
-                rows = cur.fetchall()
-                files = [row[0] for row in rows]
-                doc_types = [row[1] for row in rows]
-        except Exception as e:
-            logger.error(f"Error fetching user documents: {e}")
-            return {}
-        finally:
-            conn.close()
-        categorized = {
-            '📋 Job Description': [],
-            '💰 Payslips': [],
-            '📖 Employee Handbook': [],
-            '⭐ Performance Reviews': [],
-            '📌 Benefits Guide': [],
-            '⚠️ Warning Letters': [],
-            'Other': []
-        }
-        for i, file in enumerate(files):
-            doc_type_str = doc_types[i].lower() if doc_types[i] else ''
-            filename = file.split('/')[-1].lower()
-            if 'job_description' in doc_type_str or 'jobdescription' in filename:
-                categorized['📋 Job Description'].append(file)
-            elif 'payslip' in doc_type_str or 'payslip' in filename:
-                categorized['💰 Payslips'].append(file)
-            elif 'handbook' in doc_type_str or 'handbook' in filename:
-                categorized['📖 Employee Handbook'].append(file)
-            elif 'review' in doc_type_str or 'performance' in filename:
-                categorized['⭐ Performance Reviews'].append(file)
-            elif 'benefits' in doc_type_str or 'benefit' in filename:
-                categorized['📌 Benefits Guide'].append(file)
-            elif 'warning' in doc_type_str or 'warning' in filename:
-                categorized['⚠️ Warning Letters'].append(file)
-            else:
-                categorized['Other'].append(file)
-        return categorized
-
-    def _sort_files_by_date(self, files):
-        def extract_date(filename):
-            match = re.search(
-                r'(\bjan\b|\bfeb\b|\bmar\b|\bapr\b|\bmay\b|\bjun\b|\bjul\b|\baug\b|\bsep\b|\boct\b|\bnov\b|\bdec\b|january|february|march|april|may|june|july|august|september|october|november|december)[\s_-]*(\d{4})?',
-                filename.lower())
-            if match:
-                month_str = match.group(1)[:3]
-                year = match.group(2) or str(datetime.now().year)
-                month_map = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9,
-                             'oct': 10, 'nov': 11, 'dec': 12}
-                month = month_map.get(month_str, 1)
-                return datetime(int(year), month, 1)
-            return datetime.min
-
-        return sorted(files, key=lambda f: extract_date(f.split('/')[-1]), reverse=True)
-
-    def _get_nice_label(self, filename: str, category: str) -> str:
-        """
-        Generate a clean, short title (max ~24 chars) for WhatsApp list rows.
-        Prioritizes date extraction, then document type hints, then filename shortening.
-        """
-        base = filename.replace('.pdf', '').strip()
-
-        # Remove common prefix (e.g. employee name)
-        base = re.sub(r'^[A-Za-z\s]+_[A-Za-z\s]+_', '', base)  # e.g. Jake_Zondagh_...
-        base = base.replace('_', ' ').strip()
-
-        # 1. Payslips - try to extract month + year
-        if 'payslip' in category.lower() or 'payslip' in base.lower():
-            match = re.search(
-                r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|january|february|march|april|may|june|july|august|september|october|november|december)\s*[-/]?\s*(\d{4})?',
-                base.lower()
-            )
-            if match:
-                month_str = match.group(1)[:3].capitalize()
-                year = match.group(2) or str(datetime.now().year)
-                return f"{month_str} {year}"
-
-        # 2. Performance Reviews / Quarterly reviews
-        if 'review' in category.lower() or 'performance' in category.lower():
-            # Look for Q1/Q2/Q3/Q4 or numbers like 2025 Q2
-            match = re.search(r'(q[1-4]|quarter\s*[1-4])\s*[-/]?\s*(\d{4})?', base.lower())
-            if match:
-                quarter = match.group(1).upper().replace('QUARTER ', 'Q')
-                year = match.group(2) or str(datetime.now().year)
-                return f"{quarter} {year}"
-
-            # Fallback: look for year only
-            year_match = re.search(r'\b(20\d{2})\b', base)
-            if year_match:
-                return f"Review {year_match.group(1)}"
-
-        # 3. Warning Letters - try to extract number or date
-        if 'warning' in category.lower():
-            # Look for "Warning 1", "Warning Letter 2", etc.
-            num_match = re.search(r'(letter\s*)?(\d+|[IVXL]+)\b', base.lower())
-            if num_match:
-                num = num_match.group(2).upper()
-                return f"Warning {num}"
-
-            # Try date
-            date_match = re.search(r'(\d{4})[.-]?(\d{1,2})?[.-]?(\d{1,2})?', base)
-            if date_match:
-                year = date_match.group(1)
-                month = date_match.group(2)
-                if month:
-                    month_str = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'][
-                        int(month) - 1]
-                    return f"Warning {month_str} {year}"
-                return f"Warning {year}"
-
-        # 4. Job Description, Handbook, Benefits - usually static, just nice name
-        if 'job' in category.lower():
-            return "Job Description"
-        if 'handbook' in category.lower():
-            return "Employee Handbook"
-        if 'benefits' in category.lower():
-            return "Benefits Guide"
-
-        # 5. SOPs / Policies (company-wide) - try to keep main topic
-        if 'sop' in base.lower() or 'policy' in base.lower():
-            # Try to extract code like SOP-HR-001 or just main topic
-            code_match = re.search(r'(sop|policy)[-\s]*([a-zA-Z0-9-]+)', base.lower())
-            if code_match:
-                code = code_match.group(2).upper()
-                return f"SOP {code[:8]}"  # e.g. SOP HR-001
-
-            # Fallback: take first few words
-            words = base.split()
-            short = ' '.join(words[:3])
-            return short[:24].strip().title()
-
-        # 6. Generic fallback: smart truncation
-        # Remove employee name prefix if still present
-        base = re.sub(r'^[A-Za-z\s]+(?:\s+-\s*)?', '', base).strip()
-
-        # Take meaningful parts
-        parts = base.split()
-        if len(parts) >= 2:
-            # Try keeping first two words + last if looks like date/number
-            candidate = f"{parts[0]} {parts[1]}"
-            if len(candidate) <= 20 and (parts[-1].isdigit() or re.match(r'\d{4}', parts[-1])):
-                candidate += f" {parts[-1]}"
-            if len(candidate) <= 24:
-                return candidate.title()
-
-        # Ultimate fallback: just truncate with ellipsis if needed
-        title = base.title()[:21]
-        if len(base) > 21:
-            title += "…"
-        return title.strip()
-
-    def _send_documents_menu(self, sender_id: str, company_id: str):
-        categorized = self._get_user_documents(sender_id, company_id)
-        if not any(categorized.values()):
+    reply_ids = ('docs_btn', 'doc_policies')
+    reply_prefixes = ('doc_type_', 'doc_file_')
+    text_intents = ('docs', 'documents')
+
+    def _get_user_files(self, ctx: UserContext) -> list[str]:
+        with pg_connection() as conn:
+            if not conn:
+                return []
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT s3_key FROM documents WHERE company_id = %s AND user_id = %s",
+                        (ctx.company_id, ctx.user_id)
+                    )
+                    return [row[0] for row in cur.fetchall()]
+            except Exception as e:
+                logger.error(f"Error fetching user documents: {e}")
+                return []
+
+    def _send_documents_menu(self, ctx: UserContext):
+        counts = get_category_counts(ctx.company_id, ctx.user_id)
+        if not any(counts.values()):
             answer = "No documents found for you."
-            send_whatsapp_text(sender_id, answer)
-            set_pending_feedback(sender_id, company_id, {'query': "Requested documents", 'answer': answer})
-            self._send_feedback(sender_id, company_id)
+            send_whatsapp_text(ctx.sender_id, answer)
+            set_pending_feedback(ctx, {'query': "Requested documents", 'answer': answer})
+            self._send_feedback(ctx)
             return
         sections = [{"title": "Document Types", "rows": []}]
-        for category, files in categorized.items():
-            if files:
-                text_parts = ' '.join(word for word in category.split() if not re.match(r'^\W+$', word))
-                row_id_base = '_'.join(text_parts.lower().split())
-                row_id = f"doc_type_{row_id_base}"
+        for category, title in CATEGORIES.items():
+            if counts.get(category):
                 sections[0]["rows"].append({
-                    "id": row_id,
-                    "title": category,
-                    "description": f"{len(files)} available"
+                    "id": f"doc_type_{category}",
+                    "title": title,
+                    "description": f"{counts[category]} available"
                 })
         sections[0]["rows"].append({
             "id": "doc_policies",
@@ -198,38 +54,36 @@ class DocumentsHandler(BaseHandler):
             "description": "Query company policies"
         })
         success = send_whatsapp_list(
-            sender_id,
+            ctx.sender_id,
             header="📄 Documents",
             body="Select a document type:",
             footer="Back to menu? Type 'menu'",
             sections=sections
         )
         if success:
-            logger.info(f"Documents menu sent to {sender_id}")
+            logger.info(f"Documents menu sent to {ctx.sender_id}")
 
-    def _send_documents_by_type(self, sender_id: str, company_id: str, doc_type: str):
-        categorized = self._get_user_documents(sender_id, company_id)
-        files = self._sort_files_by_date(categorized.get(doc_type, []))
+    def _send_documents_by_type(self, ctx: UserContext, category: str):
+        doc_type = CATEGORIES.get(category, category)
+        files = list_category(ctx.company_id, ctx.user_id, category)  # Newest first
         if not files:
             answer = f"No {doc_type} found."
-            send_whatsapp_text(sender_id, answer)
-            set_pending_feedback(sender_id, company_id, {'query': f"Requested {doc_type}", 'answer': answer})
-            self._send_feedback(sender_id, company_id)
+            send_whatsapp_text(ctx.sender_id, answer)
+            set_pending_feedback(ctx, {'query': f"Requested {doc_type}", 'answer': answer})
+            self._send_feedback(ctx)
             return
         if len(files) == 1:
-            self._send_document(sender_id, company_id, files[0])
+            self._send_document(ctx, files[0][1])
             return
         sections = []
         chunk_size = 10
-        text_parts = ' '.join(word for word in doc_type.split() if not re.match(r'^\W+$', word))
-        short_type = text_parts
+        short_type = doc_type.split(' ', 1)[-1]  # Title without its emoji
         for i in range(0, len(files), chunk_size):
             chunk = files[i:i + chunk_size]
             section_title = f"{short_type} ({i + 1}-{i + len(chunk)})" if len(files) > chunk_size else short_type
             section = {"title": section_title, "rows": []}
-            for file in chunk:
-                row_id = f"doc_file_{file.split('/')[-1]}"
-                nice_label = self._get_nice_label(file.split('/')[-1], doc_type)
+            for doc_id, file, nice_label in chunk:
+                row_id = f"doc_file_{doc_id}"
                 section["rows"].append({
                     "id": row_id,
                     "title": nice_label,
@@ -237,104 +91,108 @@ class DocumentsHandler(BaseHandler):
                 })
             sections.append(section)
         success = send_whatsapp_list(
-            sender_id,
+            ctx.sender_id,
             header=doc_type,
             body="Select a file (latest first):",
             footer="Back? Type 'back'",
             sections=sections
         )
         if success:
-            logger.info(f"{doc_type} list sent to {sender_id}")
+            logger.info(f"{doc_type} list sent to {ctx.sender_id}")
 
-    def _send_document(self, sender_id: str, company_id: str, s3_key: str):
+    def _send_document(self, ctx: UserContext, s3_key: str):
         answer = f"Sent {s3_key.split('/')[-1]}"
-        send_pdf(sender_id, company_id, s3_key)  # Updated call
-        set_pending_feedback(sender_id, company_id, {'query': f"Requested {s3_key.split('/')[-1]}", 'answer': answer})
-        self._send_feedback(sender_id, company_id)
+        send_pdf(ctx.sender_id, ctx.company_id, s3_key)  # Updated call
+        set_pending_feedback(ctx, {'query': f"Requested {s3_key.split('/')[-1]}", 'answer': answer})
+        self._send_feedback(ctx)
 
-    def _send_feedback(self, sender_id: str, company_id: str):
+    def _send_feedback(self, ctx: UserContext):
         buttons = [
             {"type": "reply", "reply": {"id": "feedback_yes", "title": "Yes 👍"}},
             {"type": "reply", "reply": {"id": "feedback_no", "title": "No 👎"}},
             {"type": "reply", "reply": {"id": "main_menu_btn", "title": "Back to Menu ↩️"}}
         ]
         text = "Was this helpful?"
-        success = send_whatsapp_buttons(sender_id, text, buttons)
+        success = send_whatsapp_buttons(ctx.sender_id, text, buttons)
         if success:
-            logger.info(f"Feedback buttons sent to {sender_id}")
+            logger.info(f"Feedback buttons sent to {ctx.sender_id}")
 
-    def try_process_interactive(self, sender_id: str, company_id: str, interactive_data: dict) -> bool:
+    def try_process_interactive(self, ctx: UserContext, interactive_data: dict) -> bool:
         int_type = interactive_data.get('type')
         if int_type == 'button_reply':
             button_id = interactive_data['button_reply']['id']
             if button_id == 'docs_btn':
-                self._send_documents_menu(sender_id, company_id)
+                self._send_documents_menu(ctx)
                 return True
         elif int_type == 'list_reply':
             reply_id = interactive_data['list_reply']['id']
             if reply_id == 'doc_policies':
-                send_whatsapp_text(sender_id,
+                send_whatsapp_text(ctx.sender_id,
                                    "Search something like 'recruitment policy', 'Code of conduct', or 'IT security' for details!")
-                state = get_bot_state(sender_id, company_id)
+                state = get_bot_state(ctx)
                 state['context'] = 'sop_query'
-                update_bot_state(sender_id, company_id, state)
                 return True
             elif reply_id.startswith('doc_type_'):
-                doc_type_key = interactive_data['list_reply']['title']
-                self._send_documents_by_type(sender_id, company_id, doc_type_key)
+                category = reply_id[len('doc_type_'):]
+                if category not in CATEGORIES:  # Row ids from before the catalogue; match on the title
+                    title = interactive_data['list_reply']['title']
+                    category = next((key for key, t in CATEGORIES.items() if t == title), category)
+                self._send_documents_by_type(ctx, category)
                 return True
             elif reply_id.startswith('doc_file_'):
-                filename = reply_id[9:]
-                # Find full s3_key by filename
-                categorized = self._get_user_documents(sender_id, company_id)
-                all_files = [f for cats in categorized.values() for f in cats]
-                s3_key = next((f for f in all_files if f.split('/')[-1] == filename), None)
+                file_ref = reply_id[9:]
+                if file_ref.isdigit():
+                    s3_key = get_user_document(ctx.company_id, ctx.user_id, int(file_ref))
+                else:
+                    # Lists sent before doc_file_<doc_id>: find full s3_key by filename
+                    s3_key = next((f for f in self._get_user_files(ctx) if f.split('/')[-1] == file_ref), None)
                 if s3_key:
-                    self._send_document(sender_id, company_id, s3_key)
+                    self._send_document(ctx, s3_key)
+                else:
+                    logger.warning(f"Document {file_ref} not found for {ctx.sender_id}")
+                    send_whatsapp_text(ctx.sender_id, "That document is no longer available. Type 'docs' for your current list.")
                 return True
         return False
 
-    def try_process_text(self, sender_id: str, company_id: str, text: str) -> bool:
-        state = get_bot_state(sender_id, company_id)
+    def try_process_text(self, ctx: UserContext, text: str) -> bool:
+        state = get_bot_state(ctx)
         if state.get('context') == 'feedback_comment':
             return False
         lowered = text.lower().strip()
         if 'documents' in lowered or 'docs' in lowered:
-            self._send_documents_menu(sender_id, company_id)
+            self._send_documents_menu(ctx)
             return True
         category_map = {
-            'payslips': '💰 Payslips',
-            'benefits': '📌 Benefits Guide',
-            'handbook': '📖 Employee Handbook',
-            'reviews': '⭐ Performance Reviews',
-            'job description': '📋 Job Description',
-            'warnings': '⚠️ Warning Letters'
+            'payslips': 'payslips',
+            'benefits': 'benefits_guide',
+            'handbook': 'employee_handbook',
+            'reviews': 'performance_reviews',
+            'job description': 'job_description',
+            'warnings': 'warning_letters'
         }
         for key, cat in category_map.items():
             if key in lowered:
                 filter_term = lowered.replace(key, '').strip()
                 if filter_term:
-                    categorized = self._get_user_documents(sender_id, company_id)
-                    files = self._sort_files_by_date(categorized[cat])
-                    filtered = [f for f in files if filter_term.lower() in f.lower()]
+                    files = list_category(ctx.company_id, ctx.user_id, cat)  # Newest first
+                    filtered = [f for _, f, _ in files if filter_term.lower() in f.lower()]
                     if not filtered:
                         answer = f"No {key} found for {filter_term}."
-                        send_whatsapp_text(sender_id, answer)
-                        set_pending_feedback(sender_id, company_id, {'query': lowered, 'answer': answer})
-                        self._send_feedback(sender_id, company_id)
+                        send_whatsapp_text(ctx.sender_id, answer)
+                        set_pending_feedback(ctx, {'query': lowered, 'answer': answer})
+                        self._send_feedback(ctx)
+                        return True
+                    if len(filtered) == 1:
+                        self._send_document(ctx, filtered[0])
                         return True
-                    sent_count = 0
-                    sent_files = []
-                    for file in filtered:
-                        send_pdf(sender_id, company_id, file)  # Updated
-                        sent_count += 1
-                        sent_files.append(file.split('/')[-1])
-                    answer = f"Sent {sent_count} files: {', '.join(sent_files)}" if sent_count > 0 else "Error sending files."
-                    set_pending_feedback(sender_id, company_id, {'query': lowered, 'answer': answer})
-                    if sent_count > 0:
-                        self._send_feedback(sender_id, company_id)
+                    outcomes, summary = send_pdfs(ctx.sender_id, ctx.company_id, filtered)
+                    sent_files = [f.split('/')[-1] for f in filtered if outcomes[f] == 'sent']
+                    answer = f"Sent {len(sent_files)} files: {', '.join(sent_files)}" if sent_files else summary
+                    set_pending_feedback(ctx, {'query': lowered, 'answer': answer})
+                    if sent_files:
+                        self._send_feedback(ctx)
                     return True
                 else:
-                    self._send_documents_by_type(sender_id, company_id, cat)
+                    self._send_documents_by_type(ctx, cat)
                     return True
         return False
\ No newline at end of file
@@ -2,13 +2,17 @@
 import re
 import difflib
 from src.core.base_handler import BaseHandler
+from src.core.user_context import UserContext
 from src.core.whatsapp_handler import send_whatsapp_text, send_whatsapp_buttons
-from src.core.db_handler import update_bot_state, get_bot_state
+from src.core.db_handler import get_bot_state
 from src.core.logger import logger
 
 
 class MenuHandler(BaseHandler):
     priority = 100 # Highest priority - greets and main menu always take precedence
+    reply_ids = ('main_menu_btn', 'apps_btn', 'leave_btn', 'sop_btn', 'placeholder_btn')
+    text_intents = ('hi', 'hello', 'hey', 'hallo', 'greetings', 'good morning', 'good afternoon', 'good evening',
+                    'menu', 'main menu', 'home', 'start')
     def _is_greeting(self, text: str) -> bool:
         """Fuzzy match for common greetings and misspellings (case-insensitive)"""
         known_greetings = [
@@ -33,60 +37,60 @@ class MenuHandler(BaseHandler):
             if matches:
                 return True
         return False
-    def _send_main_menu(self, sender_id: str, company_id: str):
+    def _send_main_menu(self, ctx: UserContext):
         buttons = [
             {"type": "reply", "reply": {"id": "docs_btn", "title": "Documents 📄"}},
             {"type": "reply", "reply": {"id": "apps_btn", "title": "Tools 🛠️"}},
             {"type": "reply", "reply": {"id": "hr_btn", "title": " Talk to HR 🤝"}}
         ]
         text = "Main Menu (づ๑•ᴗ•๑)づ✨"
-        success = send_whatsapp_buttons(sender_id, text, buttons)
+        success = send_whatsapp_buttons(ctx.sender_id, text, buttons)
         if success:
-            logger.info(f"Main menu sent to {sender_id}")
+            logger.info(f"Main menu sent to {ctx.sender_id}")
         else:
-            logger.error(f"Failed to send main menu to {sender_id}")
-    def _send_apps_menu(self, sender_id: str, company_id: str):
+            logger.error(f"Failed to send main menu to {ctx.sender_id}")
+    def _send_apps_menu(self, ctx: UserContext):
         buttons = [
             {"type": "reply", "reply": {"id": "leave_btn", "title": "Take Leave 🌴"}},
             {"type": "reply", "reply": {"id": "sop_btn", "title": "Train SOP 🎓"}},
             {"type": "reply", "reply": {"id": "placeholder_btn", "title": "Coming Soon 🚀"}}
         ]
         text = "Tools"
-        success = send_whatsapp_buttons(sender_id, text, buttons)
+        success = send_whatsapp_buttons(ctx.sender_id, text, buttons)
         if success:
-            logger.info(f"Apps menu sent to {sender_id}")
+            logger.info(f"Apps menu sent to {ctx.sender_id}")
         else:
-            logger.error(f"Failed to send apps menu to {sender_id}")
-    def try_process_interactive(self, sender_id: str, company_id: str, interactive_data: dict) -> bool:
+            logger.error(f"Failed to send apps menu to {ctx.sender_id}")
+    def try_process_interactive(self, ctx: UserContext, interactive_data: dict) -> bool:
         if interactive_data.get('type') != 'button_reply':
             return False
         button_id = interactive_data['button_reply']['id']
         if button_id == "main_menu_btn":
-            self._send_main_menu(sender_id, company_id)
+            self._send_main_menu(ctx)
             return True
         if button_id == "apps_btn":
-            self._send_apps_menu(sender_id, company_id)
+            self._send_apps_menu(ctx)
             return True
         if button_id == "leave_btn":
-            send_whatsapp_text(sender_id, "Take Leave coming soon! 🌴")
+            send_whatsapp_text(ctx.sender_id, "Take Leave coming soon! 🌴")
             return True
         if button_id == "sop_btn":
-            send_whatsapp_text(sender_id, "Train SOP coming soon! 🎓")
+            send_whatsapp_text(ctx.sender_id, "Train SOP coming soon! 🎓")
             return True
         if button_id == "placeholder_btn":
-            send_whatsapp_text(sender_id, "More Apps coming soon!")
+            send_whatsapp_text(ctx.sender_id, "More Apps coming soon!")
             return True
         # We don't handle other buttons here yet - other handlers will
         return False
-    def try_process_text(self, sender_id: str, company_id: str, text: str) -> bool:
-        state = get_bot_state(sender_id, company_id)
+    def try_process_text(self, ctx: UserContext, text: str) -> bool:
+        state = get_bot_state(ctx)
         if state.get('context') == 'feedback_comment':
             return False
         if self._is_greeting(text):
-            self._send_main_menu(sender_id, company_id)
+            self._send_main_menu(ctx)
             return True
         # Optional: explicit "menu" command (already covered in fuzzy)
         if text.lower().strip() in ["menu", "main menu", "home"]:
-            self._send_main_menu(sender_id, company_id)
+            self._send_main_menu(ctx)
             return True
         return False
\ No newline at end of file
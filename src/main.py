@@ -1,10 +1,26 @@
 # src/main.py
-from flask import Flask, request, abort
-from src.core.config import VERIFY_TOKEN_META
-from src.webhook_handler import process_incoming_message
+from flask import Flask, request, abort, jsonify
+from src.core.config import VERIFY_TOKEN_META, WEBHOOK_ASYNC, SEMANTIC_SEARCH
+from src.webhook_handler import enqueue_incoming_message, get_worker_pool
+from src.core.db_pool import get_pool_metrics
+from src.core.document_sync import get_document_syncer
+from src.core.handler_registry import get_registry, reload_handlers
+from src.core.llm_cache import get_llm_cache_metrics
+from src.core.llm_client import get_llm_metrics
+from src.core.query_budget import get_query_metrics
+from src.core.object_manifest import get_manifest_metrics, get_manifest_reconciler
+from src.core.s3_handler import get_s3_metrics
+from src.core.semantic_index import get_semantic_index
+from src.core.session import get_session_metrics
+from src.core.spell import get_spell_checker
+from src.core.state_store import get_dedup_metrics
+from src.core.whatsapp_handler import get_whatsapp_metrics
 from src.core.logger import logger
 
 app = Flask(__name__)
+get_registry()  # Import and index handlers once, not per message
+get_document_syncer()  # Chunk/catalogue rows ingested outside the app, off the query path
+get_manifest_reconciler()  # Keep the S3 manifest current from the start, not from the first send
 
 @app.route('/webhook', methods=['GET', 'POST'])
 def webhook():
@@ -16,11 +32,40 @@ def webhook():
         else:
             abort(403)
     elif request.method == 'POST':
-        data = request.json
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('entry'), list):
+            logger.warning(f"Rejected malformed webhook: {request.data[:200]}")
+            abort(400)
         logger.info(f"Received webhook: {data}")
-        process_incoming_message(data)
+        if not enqueue_incoming_message(data):
+            return 'Busy', 503  # Worker queue full: Meta retries, and dedup drops whatever was already queued
         return 'OK', 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'db_pool': get_pool_metrics(),
+        'sessions': get_session_metrics(),
+        'dedup': get_dedup_metrics(),
+        'whatsapp': get_whatsapp_metrics(),
+        's3': {**get_s3_metrics(), 'manifest': get_manifest_metrics()},
+        'llm': get_llm_metrics(),
+        'llm_cache': get_llm_cache_metrics(),
+        'query_pipeline': get_query_metrics(),
+        'document_sync': get_document_syncer().metrics(),
+        'spelling': get_spell_checker().metrics(),
+        'semantic': get_semantic_index().metrics() if SEMANTIC_SEARCH else None,
+        'webhook_queue': get_worker_pool().metrics() if WEBHOOK_ASYNC else None,
+    }), 200
+
+@app.route('/reload-handlers', methods=['POST'])
+def reload_handlers_route():
+    # Development only: pick up edited handler modules without restarting
+    if not app.debug:
+        abort(404)
+    registry = reload_handlers()
+    return jsonify([type(h).__name__ for h in registry.handlers]), 200
+
 @app.route('/', methods=['GET'])
 def home():
     return "ProQuery HR Bot is running!", 200
@@ -1,94 +1,200 @@
 # src/webhook_handler.py
 import os
-import importlib
-import inspect
+import threading
 from datetime import datetime, timedelta
 from src.core.base_handler import BaseHandler
 from src.core.db_handler import (
-    validate_sender_id, is_message_processed, mark_message_processed,
-    get_last_response_time, update_last_response_time, get_user_info
+    validate_sender_id, claim_messages, complete_messages, release_messages, get_bot_state, load_sessions,
+    get_last_response_time, update_last_response_time, get_user_contexts, save_session
 )
-from src.core.whatsapp_handler import send_whatsapp_text
+from src.core.handler_registry import HandlerRegistry, get_registry
+from src.core.user_context import UserContext
+from src.core.whatsapp_handler import send_whatsapp_text, handle_message_statuses
 from src.core.logger import logger
-from src.core.config import BOT_PHONE_NUMBER
+from src.core.config import (
+    BOT_PHONE_NUMBER, WEBHOOK_ASYNC, WEBHOOK_WORKERS, WEBHOOK_QUEUE_MAX, WEBHOOK_QUEUE_PATH, WEBHOOK_ENQUEUE_TIMEOUT
+)
+from src.core.message_queue import WorkerPool
 from src.handlers.menu_handler import MenuHandler  # Added import
 
-def discover_handlers():
-    handlers_dir = os.path.join(os.path.dirname(__file__), 'handlers')
-    handlers = []
-    if os.path.exists(handlers_dir):
-        for filename in os.listdir(handlers_dir):
-            if filename.endswith('.py') and not filename.startswith('__'):
-                module_name = filename[:-3]
-                module = importlib.import_module(f'src.handlers.{module_name}')
-                for name, obj in inspect.getmembers(module):
-                    if inspect.isclass(obj) and issubclass(obj, BaseHandler) and obj != BaseHandler:
-                        handlers.append(obj())
-    handlers.sort(key=lambda h: h.priority, reverse=True)  # Higher priority first
-    return handlers
+_JOURNALED = WEBHOOK_ASYNC and bool(WEBHOOK_QUEUE_PATH)  # Completion is only tracked for journal replay
+
+def iter_change_values(data: dict):
+    """Every entry[].changes[].value in a webhook payload (Meta may batch several)."""
+    for entry in data.get('entry') or []:
+        for change in (entry.get('changes') or [] if isinstance(entry, dict) else []):
+            value = change.get('value') if isinstance(change, dict) else None
+            if isinstance(value, dict):
+                yield value
 
 def process_incoming_message(data: dict) -> bool:
-    # Extract relevant fields from WhatsApp webhook payload
-    try:
-        entry = data['entry'][0]
-        change = entry['changes'][0]
-        value = change['value']
-        if 'messages' not in value:
-            # Skip status updates (sent/delivered/read) silently
-            return True
-        message = value['messages'][0]
-        sender_id = message['from']
-        message_id = message['id']
-        msg_type = message['type']
-        timestamp = datetime.fromtimestamp(int(message['timestamp']))
-    except (KeyError, IndexError):
+    """
+    Handle every message in the payload; users, dedup claims and sessions are fetched in bulk up front.
+    Statuses are not looked at here: enqueue_incoming_message handles them once per webhook.
+    """
+    messages = [m for value in iter_change_values(data) for m in value.get('messages') or []]
+    if any(not isinstance(m, dict) or not {'from', 'id', 'type'} <= m.keys() for m in messages):
         logger.error("Invalid webhook payload structure")
         return False
-    # Ignore if from bot's number
-    if sender_id == BOT_PHONE_NUMBER:
-        logger.info(f"Ignoring message from bot: {message_id}")
+    if not messages:
         return True
-    # Validate sender_id
-    if not validate_sender_id(sender_id):
-        logger.warning(f"Invalid sender_id: {sender_id}")
-        return False
-    # Get user info
-    company_id, role, person_name, password_hash = get_user_info(sender_id)
-    if not company_id:
-        send_whatsapp_text(sender_id, "Unauthorized access. Please contact HR.")
-        return False
-    # Check duplicates
-    if is_message_processed(sender_id, message_id, company_id):
-        logger.info(f"Duplicate message ignored: {message_id}")
-        return True
-    mark_message_processed(sender_id, message_id, company_id)
+    ok = True
+    accepted = []
+    for message in messages:
+        sender_id, message_id = message['from'], message['id']
+        # Ignore if from bot's number
+        if sender_id == BOT_PHONE_NUMBER:
+            logger.info(f"Ignoring message from bot: {message_id}")
+            continue
+        # Validate sender_id
+        if not validate_sender_id(sender_id):
+            logger.warning(f"Invalid sender_id: {sender_id}")
+            ok = False
+            continue
+        accepted.append(message)
+    # Resolve every sender once; everything downstream reads from these contexts
+    contexts = get_user_contexts({m['from'] for m in accepted})
+    authorised = []
+    for message in accepted:
+        ctx = contexts.get(message['from'])
+        if not ctx or not ctx.company_id:
+            send_whatsapp_text(message['from'], "Unauthorized access. Please contact HR.")
+            ok = False
+            continue
+        authorised.append((ctx, message))
+    # Check duplicates for the whole batch in one claim
+    claimed = claim_messages([(ctx, message['id']) for ctx, message in authorised])
+    fresh = []
+    for ctx, message in authorised:
+        if message['id'] in claimed:
+            claimed.discard(message['id'])  # A repeated id within the batch is handled once
+            fresh.append((ctx, message))
+        else:
+            logger.info(f"Duplicate message ignored: {message['id']}")
+    load_sessions({ctx.user_id: ctx for ctx, _ in fresh}.values())
+    for ctx, message in fresh:
+        # Every message here is already claimed, so a failure must not cost the rest of the batch
+        try:
+            ok = _process_message(ctx, message) and ok
+        except Exception as e:
+            logger.error(f"Processing message {message['id']} from {ctx.sender_id} failed: {e}", exc_info=True)
+            ok = False
+        if _JOURNALED:
+            complete_messages([message['id']])  # A replay after a crash skips this one
+    return ok
+
+def handle_statuses(data: dict):
+    """Delivery statuses (sent/delivered/read/failed) pace the outbound queue for their recipient."""
+    statuses = [s for value in iter_change_values(data) for s in value.get('statuses') or [] if isinstance(s, dict)]
+    if statuses:
+        handle_message_statuses(statuses)
+
+def _process_message(ctx: UserContext, message: dict) -> bool:
+    msg_type = message['type']
     # Rate limit for text messages (5s cooldown to prevent ghosts from rapid retries)
     if msg_type == 'text':
-        last_time = get_last_response_time(sender_id, company_id)
+        last_time = get_last_response_time(ctx)
         if last_time and (datetime.now() - last_time) < timedelta(seconds=5):
-            logger.warning(f"Rate limit hit for {sender_id}")
+            logger.warning(f"Rate limit hit for {ctx.sender_id}")
             return False
-        update_last_response_time(sender_id, company_id)
-    # Discover and sort handlers
-    handlers = discover_handlers()
-    # Process based on type
+        update_last_response_time(ctx)
+    try:
+        return _dispatch(ctx, message, msg_type)
+    finally:
+        # Handlers only mutate ctx.session in memory; write it back once
+        save_session(ctx)
+
+def _dispatch(ctx: UserContext, message: dict, msg_type: str) -> bool:
+    registry = get_registry()
     handled = False
     if msg_type == 'interactive':
         interactive_data = message['interactive']  # button_reply or list_reply
-        for handler in handlers:
-            if handler.check_context(sender_id, company_id, msg_type, interactive_data):
-                if handler.try_process_interactive(sender_id, company_id, interactive_data):
-                    handled = True
-                    break
+        reply_id = interactive_data.get(interactive_data.get('type'), {}).get('id', '')
+        owner = registry.handler_for_reply(reply_id)
+        handled = _run_handlers(registry, owner, lambda h: h.check_context(ctx, msg_type, interactive_data)
+                                and h.try_process_interactive(ctx, interactive_data))
     elif msg_type == 'text':
         text = message['text']['body']
-        for handler in handlers:
-            if handler.check_context(sender_id, company_id, msg_type, text):
-                if handler.try_process_text(sender_id, company_id, text):
-                    handled = True
-                    break
+        # Inside a flow (feedback comment, HR query, ...) the chain decides; otherwise exact intents route directly
+        owner = registry.handler_for_text(text) if not get_bot_state(ctx).get('context') else None
+        handled = _run_handlers(registry, owner, lambda h: h.check_context(ctx, msg_type, text)
+                                and h.try_process_text(ctx, text))
     if not handled:
-        send_whatsapp_text(sender_id, "Couldn't interpret your message, perhaps have a look at the main menu below.")
+        send_whatsapp_text(ctx.sender_id, "Couldn't interpret your message, perhaps have a look at the main menu below.")
         mh = MenuHandler()
-        mh._send_main_menu(sender_id, company_id)
-    return handled
\ No newline at end of file
+        mh._send_main_menu(ctx)
+    return handled
+
+def _run_handlers(registry: HandlerRegistry, owner: BaseHandler | None, attempt) -> bool:
+    """Try the indexed owner first, then the rest of the chain in priority order."""
+    if owner is not None and attempt(owner):
+        return True
+    for handler in registry.handlers:
+        if handler is not owner and attempt(handler):
+            return True
+    return False
+
+_worker_pool = None
+_worker_pool_pid = None
+_worker_pool_lock = threading.Lock()
+
+def get_worker_pool() -> WorkerPool:
+    """Background workers for process_incoming_message, started lazily in each gunicorn worker."""
+    global _worker_pool, _worker_pool_pid
+    pid = os.getpid()
+    if _worker_pool is None or _worker_pool_pid != pid:
+        with _worker_pool_lock:
+            if _worker_pool is None or _worker_pool_pid != pid:
+                _worker_pool = WorkerPool(process_incoming_message, WEBHOOK_WORKERS, WEBHOOK_QUEUE_MAX, WEBHOOK_QUEUE_PATH,
+                                          on_replay=release_unfinished)
+                _worker_pool_pid = pid
+    return _worker_pool
+
+def release_unfinished(data: dict):
+    """Journal replay of a dead process's job: messages it claimed but never completed are handled again."""
+    message_ids = [m['id'] for value in iter_change_values(data) for m in value.get('messages') or []
+                   if isinstance(m, dict) and 'id' in m]
+    if message_ids:
+        released = release_messages(message_ids)
+        logger.info(f"Released {len(released)} of {len(message_ids)} claims for replay")
+
+def shard_key(data: dict) -> str:
+    """Sender number, so one user's messages are processed in order."""
+    for value in iter_change_values(data):
+        if value.get('messages'):
+            return value['messages'][0].get('from', '')
+    return ''
+
+def split_payload(data: dict, group_of) -> list[dict]:
+    """
+    Regroup a payload's messages by group_of(sender number), keeping arrival order, so each worker
+    gets one batch containing only the senders it owns. Statuses are left out (handled on receipt).
+    """
+    groups = {}
+    for value in iter_change_values(data):
+        for message in value.get('messages') or []:
+            group = group_of(message.get('from', '') if isinstance(message, dict) else '')
+            if group not in groups:
+                groups[group] = {'metadata': value.get('metadata'), 'messages': []}
+            groups[group]['messages'].append(message)
+    return [{'object': data.get('object'), 'entry': [{'changes': [{'field': 'messages', 'value': value}]}]}
+            for value in groups.values()]
+
+def enqueue_incoming_message(data: dict) -> bool:
+    """
+    Handle statuses, then hand the messages to background workers so Meta gets its 200 immediately.
+    False if a worker's queue stayed full for WEBHOOK_ENQUEUE_TIMEOUT: the caller answers 503 and Meta
+    retries the webhook (messages that did get queued are dropped as duplicates on the retry).
+    Processing inline instead would overtake the sender's queued messages.
+    """
+    handle_statuses(data)
+    if not WEBHOOK_ASYNC:
+        process_incoming_message(data)
+        return True
+    pool = get_worker_pool()
+    accepted = True
+    for payload in split_payload(data, pool.shard_index):
+        if not pool.submit(payload, shard_key(payload), WEBHOOK_ENQUEUE_TIMEOUT):
+            logger.warning(f"Webhook queue for {shard_key(payload)} full, asking Meta to retry")
+            accepted = False
+    return accepted
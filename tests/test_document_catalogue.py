@@ -0,0 +1,94 @@
+# tests/test_document_catalogue.py
+import sqlite3
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+
+from src.core import document_catalogue
+from src.core.document_catalogue import catalogue_entry, categorize, get_user_document, parse_doc_date
+
+
+class FakeCursor:
+    """psycopg2-style cursor over sqlite3: %s placeholders, usable as a context manager."""
+
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
+
+    def execute(self, sql, params=()):
+        self._cur.execute(sql.replace('%s', '?'), params)
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+
+class FakeConnection:
+    def __init__(self):
+        self._conn = sqlite3.connect(':memory:')
+        self._conn.execute("CREATE TABLE documents (doc_id INTEGER PRIMARY KEY, company_id TEXT, user_id TEXT, s3_key TEXT)")
+        self._conn.executemany(
+            "INSERT INTO documents VALUES (?, ?, ?, ?)",
+            [(1, 'acme', 'u1', 'acme/u1/payslip.pdf'), (2, 'acme', 'u2', 'acme/u2/payslip.pdf'),
+             (3, 'other', 'u1', 'other/u1/handbook.pdf')]
+        )
+
+    def cursor(self):
+        return FakeCursor(self._conn)
+
+
+@pytest.fixture
+def documents(monkeypatch):
+    conn = FakeConnection()
+
+    @contextmanager
+    def pg_connection():
+        yield conn
+    monkeypatch.setattr(document_catalogue, 'pg_connection', pg_connection)
+
+
+def test_get_user_document_returns_own_document(documents):
+    assert get_user_document('acme', 'u1', 1) == 'acme/u1/payslip.pdf'
+
+
+def test_get_user_document_rejects_another_users_doc_id(documents):
+    assert get_user_document('acme', 'u1', 2) is None
+
+
+def test_get_user_document_rejects_another_companys_doc_id(documents):
+    assert get_user_document('acme', 'u1', 3) is None
+    assert get_user_document('acme', 'u1', 999) is None
+
+
+def test_get_user_document_without_connection(monkeypatch):
+    @contextmanager
+    def pg_connection():
+        yield None
+    monkeypatch.setattr(document_catalogue, 'pg_connection', pg_connection)
+    assert get_user_document('acme', 'u1', 1) is None
+
+
+def test_categorize_uses_doc_type_then_filename():
+    assert categorize('acme/u1/anything.pdf', 'Payslip') == 'payslips'
+    assert categorize('acme/u1/Employee Handbook 2024.pdf', None) == 'employee_handbook'
+    assert categorize('acme/u1/notes.pdf', None) == 'other'
+
+
+def test_parse_doc_date():
+    assert parse_doc_date('payslip march 2024.pdf') == date(2024, 3, 1)
+    assert parse_doc_date('handbook.pdf') is None
+
+
+def test_catalogue_entry_combines_category_date_and_label():
+    category, doc_date, label = catalogue_entry('acme/u1/Payslip March 2024.pdf', None)
+    assert category == 'payslips'
+    assert doc_date == date(2024, 3, 1)
+    assert label and len(label) <= 24
@@ -0,0 +1,173 @@
+# tests/test_llm_client.py
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.core.llm_client import CircuitBreaker, DeadlineExceeded, LLMClient, LLMError
+
+
+class StubServer:
+    """
+    Local OpenAI-compatible endpoint. Each request takes the next scripted response:
+    (status, body) or ('stream', [text deltas], seconds between events).
+    """
+
+    def __init__(self):
+        self.responses = []
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.requests += 1
+                response = stub.responses.pop(0)
+                if response[0] == 'stream':
+                    _, deltas, gap = response
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Transfer-Encoding', 'chunked')  # Like the real API: one event per chunk
+                    self.end_headers()
+                    for delta in deltas:
+                        event = {'choices': [{'delta': {'content': delta}}]}
+                        self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+                        time.sleep(gap)
+                    self._chunk(b"data: [DONE]\n\n")
+                    self._chunk(b"")
+                    return
+                status, body = response
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def completion(text):
+    return {'choices': [{'message': {'content': text}}], 'usage': {'prompt_tokens': 3, 'completion_tokens': 2}}
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+def client(stub, **kwargs):
+    options = {'timeout': 5, 'max_tries': 3, 'backoff_base': 0.01, 'backoff_cap': 0.02}
+    options.update(kwargs)
+    return LLMClient(stub.url, 'key', 'grok-test', **options)
+
+
+@pytest.mark.parametrize('status', [503, 429])
+def test_retries_transient_errors(stub, status):
+    stub.responses = [(status, {'error': 'busy'}), (200, completion('hello'))]
+    llm = client(stub)
+    assert llm.complete('hi', kind='test') == 'hello'
+    assert stub.requests == 2
+    stats = llm.metrics()['calls']['test']
+    assert stats['retries'] == 1 and stats['failures'] == 0
+    assert stats['prompt_tokens'] == 3 and stats['completion_tokens'] == 2
+
+
+def test_gives_up_after_max_tries(stub):
+    stub.responses = [(500, {})] * 3
+    llm = client(stub)
+    assert llm.complete('hi', kind='test') is None
+    assert stub.requests == 3
+    assert llm.metrics()['calls']['test']['failures'] == 1
+
+
+def test_4xx_is_rejected_without_retry_or_tripping_the_breaker(stub):
+    stub.responses = [(400, {'error': 'bad request'})]
+    llm = client(stub, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    assert llm.complete('hi', kind='test') is None
+    assert stub.requests == 1
+    assert llm.breaker.state == 'closed'
+
+
+def test_4xx_raises_request_rejected_from_stream(stub):
+    stub.responses = [(401, {'error': 'unauthorised'})]
+    llm = client(stub)
+    with pytest.raises(LLMError, match='HTTP 401'):
+        list(llm.stream('hi'))
+
+
+def test_expired_deadline_makes_no_request(stub):
+    llm = client(stub)
+    assert llm.complete('hi', kind='test', deadline=time.monotonic() - 1) is None
+    assert stub.requests == 0
+    assert llm.metrics()['calls']['test']['deadline_exceeded'] == 1
+
+
+def test_deadline_caps_a_slow_response(stub):
+    stub.responses = [('stream', ['slow'], 2.0)]  # Headers arrive, the body doesn't within the deadline
+    llm = client(stub, max_tries=1)
+    started = time.monotonic()
+    with pytest.raises(LLMError):
+        list(llm.stream('hi', deadline=time.monotonic() + 0.3))
+    assert time.monotonic() - started < 1.5
+
+
+def test_stream_yields_deltas(stub):
+    stub.responses = [('stream', ['Hel', 'lo'], 0)]
+    assert ''.join(client(stub).stream('hi')) == 'Hello'
+
+
+def test_stream_stops_at_the_deadline(stub):
+    stub.responses = [('stream', ['a', 'b', 'c', 'd', 'e', 'f'], 0.2)]
+    llm = client(stub)
+    received = []
+    with pytest.raises(DeadlineExceeded):
+        for delta in llm.stream('hi', kind='summary', deadline=time.monotonic() + 0.5):
+            received.append(delta)
+    assert 0 < len(received) < 6  # Partial answer kept by the caller
+    assert llm.metrics()['calls']['summary']['deadline_exceeded'] == 1
+
+
+def test_breaker_opens_half_opens_and_closes(stub):
+    stub.responses = [(503, {}), (503, {}), (200, completion('back'))]
+    llm = client(stub, max_tries=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+    assert llm.complete('hi', kind='test') is None
+    assert llm.breaker.state == 'closed'
+    assert llm.complete('hi', kind='test') is None
+    assert llm.breaker.state == 'open' and not llm.available()
+    assert llm.complete('hi', kind='test') is None  # Short-circuited: never reaches the server
+    assert stub.requests == 2
+    assert llm.metrics()['calls']['test']['short_circuits'] == 1
+    time.sleep(0.25)
+    assert llm.breaker.state == 'half_open'
+    assert llm.complete('hi', kind='test') == 'back'
+    assert llm.breaker.state == 'closed'
+
+
+def test_failed_half_open_trial_reopens(stub):
+    stub.responses = [(503, {}), (503, {})]
+    llm = client(stub, max_tries=1, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.2))
+    assert llm.complete('hi') is None
+    time.sleep(0.25)
+    assert llm.breaker.state == 'half_open'
+    assert llm.complete('hi') is None
+    assert llm.breaker.state == 'open'
@@ -0,0 +1,85 @@
+# tests/test_outbound.py
+import itertools
+import threading
+import time
+
+import fakeredis
+
+from src.core.outbound import OutboundDispatcher
+from src.core.state_store import RedisStateStore
+
+
+class Recorder:
+    """Fake Cloud API send: records payloads and returns a fresh message id."""
+
+    def __init__(self):
+        self.sent = []
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def __call__(self, payload):
+        with self._lock:
+            message_id = f"wamid.{next(self._ids)}"
+            self.sent.append((payload['to'], payload['n'], message_id))
+            return message_id
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def dispatcher(send, **kwargs):
+    options = {'workers': 4, 'rate': 1000, 'burst': 100, 'status_timeout': 5, 'poll_interval': 0.02}
+    options.update(kwargs)
+    return OutboundDispatcher(send, **options)
+
+
+def test_next_message_waits_for_the_status_of_the_previous_one():
+    send = Recorder()
+    d = dispatcher(send)
+    d.submit({'to': 'a', 'n': 1})
+    d.submit({'to': 'a', 'n': 2})
+    d.submit({'to': 'b', 'n': 1})
+    wait_for(lambda: len(send.sent) == 2)
+    time.sleep(0.1)
+    assert sorted((to, n) for to, n, _ in send.sent) == [('a', 1), ('b', 1)]  # a's second message is held back
+    first = next(mid for to, n, mid in send.sent if to == 'a')
+    assert d.on_statuses([{'id': first, 'status': 'sent'}, {'id': 'other', 'status': 'read'}]) == [{'id': 'other', 'status': 'read'}]
+    wait_for(lambda: len(send.sent) == 3)
+    assert send.sent[-1][:2] == ('a', 2)
+    assert d.metrics()['released_by_status'] == 1
+
+
+def test_status_handled_by_another_worker_releases_through_the_store():
+    store = RedisStateStore(fakeredis.FakeRedis(decode_responses=True), prefix="test:")
+    send = Recorder()
+    d = dispatcher(send, shared_statuses=store.statuses_seen)
+    for n in range(5):
+        d.submit({'to': 'a', 'n': n})
+    for n in range(5):
+        wait_for(lambda: len(send.sent) == n + 1)
+        store.publish_statuses({send.sent[-1][2]: 'delivered'})  # Webhook landed on another worker
+    assert [n for _, n, _ in send.sent] == [0, 1, 2, 3, 4]
+    wait_for(lambda: d.metrics()['released_by_shared_status'] == 5)
+
+
+def test_missing_status_releases_after_the_timeout():
+    send = Recorder()
+    d = dispatcher(send, status_timeout=0.1)
+    d.submit({'to': 'a', 'n': 1})
+    d.submit({'to': 'a', 'n': 2})
+    wait_for(lambda: len(send.sent) == 2)
+    assert d.metrics()['released_by_timeout'] >= 1
+
+
+def test_rejected_send_releases_immediately_and_reports_failure():
+    failures = []
+    d = dispatcher(lambda payload: None if payload['n'] == 1 else 'wamid.x')
+    d.submit({'to': 'a', 'n': 1}, on_failure=lambda: failures.append(1))
+    d.submit({'to': 'a', 'n': 2})
+    wait_for(lambda: d.metrics()['sent'] == 1)
+    assert failures == [1]
+    assert d.metrics()['failed'] == 1
@@ -0,0 +1,51 @@
+# tests/test_passages.py
+from src.core.document_chunks import Chunk
+from src.core.passages import estimate_tokens, score_chunks, select_passages
+
+
+def chunk(index, section, text):
+    return Chunk(index, section, index * 100, index * 100 + len(text), text)
+
+
+def test_section_heading_counts_once_for_its_section():
+    chunks = [
+        chunk(0, 'Leave policy', 'annual days accrue monthly'),
+        chunk(1, 'Leave policy', 'carry over rules apply'),
+        chunk(2, 'Leave policy', 'apply through the portal'),
+    ]
+    scores = score_chunks('leave', chunks)
+    assert scores[0] > 0
+    assert scores[1] == 0 and scores[2] == 0
+
+
+def test_heading_counts_again_when_a_new_section_starts():
+    chunks = [chunk(0, 'Leave', 'annual days'), chunk(1, 'Pay', 'monthly salary'), chunk(2, 'Leave', 'sick days')]
+    scores = score_chunks('leave', chunks)
+    assert scores[0] > 0 and scores[1] == 0 and scores[2] > 0
+
+
+def test_zero_score_chunks_are_not_selected():
+    chunks = [chunk(0, None, 'overtime is paid at 1.5x'), chunk(1, None, 'parking rules'), chunk(2, None, 'dress code')]
+    passages = select_passages('overtime rate', chunks, token_budget=10_000)
+    assert 'overtime' in passages
+    assert 'parking' not in passages and 'dress' not in passages
+
+
+def test_no_matching_chunk_falls_back_to_the_document_opening():
+    chunks = [chunk(i, None, f'part {i} ' + 'x' * 40) for i in range(5)]
+    passages = select_passages('pension', chunks, token_budget=estimate_tokens('x' * 100))
+    assert 'part 0' in passages and 'part 4' not in passages
+
+
+def test_selected_chunks_fit_the_budget_and_keep_document_order():
+    chunks = [chunk(0, None, 'bonus ' * 5), chunk(1, None, 'bonus bonus ' + 'y' * 200), chunk(2, None, 'bonus paid in march')]
+    budget = estimate_tokens(chunks[0].text) + estimate_tokens(chunks[2].text)
+    passages = select_passages('bonus', chunks, token_budget=budget)
+    assert 'y' * 10 not in passages
+    assert passages.index('bonus bonus bonus') < passages.index('march')
+
+
+def test_best_chunk_over_budget_is_truncated():
+    chunks = [chunk(0, None, 'bonus ' + 'z' * 1000)]
+    passages = select_passages('bonus', chunks, token_budget=10)
+    assert 'bonus' in passages and len(passages) < 200
@@ -0,0 +1,165 @@
+# tests/test_redis_state_store.py
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+from src.core import state_store
+from src.core.state_store import RedisStateStore
+from src.core.user_context import UserContext
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def client(server):
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+@pytest.fixture
+def store(client):
+    return RedisStateStore(client, prefix="test:")
+
+
+@pytest.fixture(autouse=True)
+def clear_front_cache():
+    # claim_messages answers repeats from a process-wide LRU; each test starts without it
+    state_store._recent_messages.clear()
+
+
+def ctx(user_id=1):
+    return UserContext(sender_id=f"2782000000{user_id}", user_id=user_id, company_id="acme")
+
+
+def test_claim_messages_only_first_claim_wins(store, client):
+    assert store._claim_messages([(ctx(), "wamid.1"), (ctx(), "wamid.2")]) == {"wamid.1", "wamid.2"}
+    assert store._claim_messages([(ctx(), "wamid.1"), (ctx(), "wamid.3")]) == {"wamid.3"}
+    assert client.get("test:msg:wamid.1") == "1"
+    assert 0 < client.ttl("test:msg:wamid.1") <= state_store.DEDUP_TTL_SECONDS
+
+
+def test_claim_messages_across_workers(server):
+    # Two workers with their own clients share one Redis: a Meta retry to the other worker is a duplicate
+    first = RedisStateStore(fakeredis.FakeRedis(server=server, decode_responses=True), prefix="test:")
+    second = RedisStateStore(fakeredis.FakeRedis(server=server, decode_responses=True), prefix="test:")
+    assert first.claim_messages([(ctx(), "wamid.9")]) == {"wamid.9"}
+    state_store._recent_messages.clear()  # The retry lands on a worker that never saw it
+    assert second.claim_messages([(ctx(), "wamid.9")]) == set()
+
+
+def test_claim_message_front_cache(store):
+    assert store.claim_message(ctx(), "wamid.5") is True
+    assert store.claim_message(ctx(), "wamid.5") is False
+
+
+def test_new_session_round_trip(store):
+    session = store.load_session(ctx())
+    assert session.version == 0 and session.data == {}
+    session['context'] = 'hr_query'
+    session['pending'] = {'query': 'leave', 'n': 2}
+    assert store.write_session(session) == 'ok'
+    assert session.version == 1
+    loaded = store.load_session(ctx())
+    assert loaded.data == {'context': 'hr_query', 'pending': {'query': 'leave', 'n': 2}}
+    assert loaded.version == 1
+
+
+def test_write_session_deletes_keys(store):
+    session = store.load_session(ctx())
+    session['context'] = 'sop_query'
+    session['keep'] = True
+    store.write_session(session)
+    session.mark_clean()
+    del session['context']
+    assert store.write_session(session) == 'ok'
+    assert store.load_session(ctx()).data == {'keep': True}
+
+
+def test_write_session_stale_version_conflicts(store):
+    mine = store.load_session(ctx())
+    theirs = store.load_session(ctx())
+    theirs['a'] = 1
+    assert store.write_session(theirs) == 'ok'
+    mine['b'] = 2
+    assert store.write_session(mine) == 'conflict'
+    assert store.load_session(ctx()).data == {'a': 1}
+
+
+def test_write_session_watch_conflict(server, client):
+    """Another worker writes between WATCH and EXEC: MULTI is aborted and reported as a conflict."""
+    other = fakeredis.FakeRedis(server=server, decode_responses=True)
+
+    class RacingClient(fakeredis.FakeRedis):
+        def pipeline(self, *args, **kwargs):
+            pipe = super().pipeline(*args, **kwargs)
+            original_multi = pipe.multi
+
+            def multi():
+                other.hincrby("test:session:1", RedisStateStore.VERSION_FIELD, 1)
+                other.hset("test:session:1", "theirs", '"x"')
+                return original_multi()
+            pipe.multi = multi
+            return pipe
+
+    store = RedisStateStore(RacingClient(server=server, decode_responses=True), prefix="test:")
+    session = store.load_session(ctx())
+    session['mine'] = 'y'
+    assert store.write_session(session) == 'conflict'
+    assert session.version == 0
+    assert client.hget("test:session:1", "mine") is None
+
+
+def test_save_session_rebases_on_conflict(store):
+    c = ctx()
+    c.session = store.load_session(c)
+    other = store.load_session(ctx())
+    other['theirs'] = 'x'
+    store.write_session(other)
+    c.session['mine'] = 'y'
+    assert store.save_session(c) is True
+    assert not c.session.dirty
+    loaded = store.load_session(ctx())
+    assert loaded.data == {'theirs': 'x', 'mine': 'y'}
+    assert loaded.version == 2
+
+
+def test_load_sessions_one_round_trip(store):
+    for user_id in (1, 2):
+        session = store.load_session(ctx(user_id))
+        session['user'] = user_id
+        store.write_session(session)
+    contexts = [ctx(1), ctx(2), ctx(3)]
+    store.load_sessions(contexts)
+    assert [c.session.data for c in contexts] == [{'user': 1}, {'user': 2}, {}]
+    assert [c.session.version for c in contexts] == [1, 1, 0]
+
+
+def test_last_response_time(store, client):
+    assert store.get_last_response_time(ctx()) is None
+    when = datetime(2025, 11, 3, 9, 30, 15)
+    store.set_last_response_time(ctx(), when)
+    assert store.get_last_response_time(ctx()) == when
+    assert store.get_last_response_time(ctx(2)) is None
+    assert 0 < client.ttl("test:last_response:1") <= state_store.RATE_LIMIT_TTL_SECONDS
+
+
+def test_release_messages_only_drops_uncompleted_claims(store, client):
+    store.claim_messages([(ctx(), "wamid.20"), (ctx(), "wamid.21")])
+    store.complete_messages(["wamid.20"])
+    assert client.get("test:msg:wamid.20") == RedisStateStore.COMPLETED
+    assert client.ttl("test:msg:wamid.20") > 0  # Completing keeps the dedup TTL
+    assert store.release_messages(["wamid.20", "wamid.21"]) == {"wamid.21"}
+    # The replayed job can claim the unfinished message again; the finished one stays a duplicate
+    assert store.claim_messages([(ctx(), "wamid.20"), (ctx(), "wamid.21")]) == {"wamid.21"}
+
+
+def test_published_statuses_are_seen_by_other_workers(server, store):
+    other = RedisStateStore(fakeredis.FakeRedis(server=server, decode_responses=True), prefix="test:")
+    store.publish_statuses({"wamid.out1": "sent"})
+    store.publish_statuses({"wamid.out1": "delivered"})  # First status wins; later ones are no-ops
+    assert other.statuses_seen(["wamid.out1", "wamid.out2"]) == {"wamid.out1"}
+    assert other.client.get("test:status:wamid.out1") == "sent"
+    assert 0 < other.client.ttl("test:status:wamid.out1") <= state_store.OUTBOUND_STATUS_TTL
@@ -0,0 +1,97 @@
+# tests/test_spell.py
+import time
+
+import pytest
+
+from src.core import spell
+from src.core.spell import BKTree, CompanyVocabulary, SpellChecker, edit_distance
+
+
+@pytest.mark.parametrize('a, b, distance', [
+    ('payslip', 'payslip', 0),
+    ('kitten', 'sitting', 3),
+    ('paysilp', 'payslip', 1),  # Adjacent transposition counts once
+    ('ca', 'abc', 3),  # OSA, not full Damerau-Levenshtein (which gives 2)
+    ('', 'leave', 5),
+    ('bonus', '', 5),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b) == distance
+    assert edit_distance(b, a) == distance
+
+
+def test_bk_tree_search_matches_brute_force():
+    words = ['handbook', 'handbooks', 'hardback', 'payslip', 'payslips', 'pension', 'tension', 'mansion']
+    tree = BKTree(words)
+    for query in ['handbok', 'paysilp', 'pention', 'xyz']:
+        found, complete = tree.search(query, 2, max_visits=1000)
+        assert complete
+        assert sorted(found) == sorted((edit_distance(query, w), w) for w in words if edit_distance(query, w) <= 2)
+
+
+def test_bk_tree_search_stops_at_visit_budget():
+    tree = BKTree(['word%d' % i for i in range(200)])
+    found, complete = tree.search('word7', 2, max_visits=5)
+    assert not complete
+
+
+def vocabulary(**frequencies):
+    return CompanyVocabulary(1, frequencies)
+
+
+def test_lone_distance_one_match_is_confident():
+    assert SpellChecker()._best(vocabulary(grievance=1), 'grievence') == 'grievance'
+
+
+def test_tied_distance_one_matches_are_ambiguous():
+    vocab = vocabulary(mould=4, mount=4)
+    assert SpellChecker()._best(vocab, 'mouxt') == 'mount'  # 'mould' is 2 away
+    assert SpellChecker()._best(vocab, 'moul') == 'mould'
+    assert SpellChecker()._best(vocabulary(bored=4, bared=4), 'bxred') is None
+
+
+def test_clear_frequency_winner_breaks_a_tie():
+    assert SpellChecker()._best(vocabulary(bored=12, bared=4), 'bxred') == 'bored'
+    assert SpellChecker()._best(vocabulary(bored=11, bared=4), 'bxred') is None  # Under DOMINANCE x runner-up
+
+
+def test_distance_two_only_for_long_words():
+    vocab = vocabulary(workflow=5, rota=5)
+    assert SpellChecker()._best(vocab, 'wrkflw') is None  # 6 letters: distance 1 only
+    assert SpellChecker()._best(vocab, 'wirkflaw') == 'workflow'  # 8 letters, distance 2, common enough
+
+
+def test_rare_lone_distance_two_match_is_not_confident():
+    assert SpellChecker()._best(vocabulary(workflow=2), 'wirkflaw') is None
+
+
+def test_capped_search_defers_to_the_llm(monkeypatch):
+    checker = SpellChecker()
+    vocab = vocabulary(**{f'grievanc{i}': 1 for i in range(10)}, grievance=1)  # Match is deep in the tree
+    assert checker._best(vocab, 'grievence') == 'grievance'
+    monkeypatch.setattr(SpellChecker, 'MAX_VISITS', 1)
+    assert checker._best(vocab, 'grievence') is None
+    assert checker.metrics()['search_capped'] == 1
+
+
+class FakeLexicalIndex:
+    def __init__(self, frequencies):
+        self.frequencies = frequencies
+
+    def version(self, company_id):
+        return 7
+
+    def vocabulary(self, company_id, known_version=None):
+        return 7, (None if known_version == 7 else dict(self.frequencies))
+
+
+def test_correct_builds_in_background_and_serves_the_tree(monkeypatch):
+    monkeypatch.setattr(spell, 'get_lexical_index', lambda: FakeLexicalIndex({'handbook': 3}))
+    checker = SpellChecker()
+    assert checker.correct('acme', 'handbok please') == ('handbok please', False)  # No tree yet: ask the LLM
+    deadline = time.monotonic() + 2
+    while checker.metrics()['rebuilds'] == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert checker.correct('acme', 'Handbok please') == ('handbook please', True)
+    assert checker.correct('acme', 'zzzqqq') == ('zzzqqq', False)
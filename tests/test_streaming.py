@@ -0,0 +1,89 @@
+# tests/test_streaming.py
+import threading
+
+from src.core.streaming import WHATSAPP_TEXT_LIMIT, OrderedEmitter, ParagraphChunker, iter_sse_events, split_text
+
+
+def test_split_text_keeps_short_text_whole():
+    assert split_text("  Hello world  ") == ["Hello world"]
+    assert split_text("   ") == []
+
+
+def test_split_text_respects_the_whatsapp_limit():
+    paragraph = ("word " * 900).strip()  # ~4500 chars
+    text = "\n\n".join([paragraph] * 3)
+    pieces = split_text(text)
+    assert all(len(p) <= WHATSAPP_TEXT_LIMIT for p in pieces)
+    assert " ".join(" ".join(p.split()) for p in pieces) == " ".join(text.split())  # Nothing lost
+
+
+def test_split_text_prefers_paragraph_then_line_then_word_boundaries():
+    assert split_text("aaaa\n\nbbbb", limit=8) == ["aaaa", "bbbb"]
+    assert split_text("aaaa\nbbbb", limit=8) == ["aaaa", "bbbb"]
+    assert split_text("aaa bbb ccc", limit=8) == ["aaa bbb", "ccc"]
+    assert split_text("x" * 10, limit=4) == ["xxxx", "xxxx", "xx"]  # No boundary: hard cut
+
+
+def test_chunker_flushes_complete_paragraphs_once_min_chars_reached():
+    flushed = []
+    chunker = ParagraphChunker(flushed.append, min_chars=10)
+    for token in ["First para", "graph here.", "\n\n", "Second", " one"]:
+        chunker.feed(token)
+    assert flushed == ["First paragraph here."]
+    chunker.close()
+    assert flushed == ["First paragraph here.", "Second one"]
+
+
+def test_chunker_sends_full_size_pieces_of_one_huge_paragraph():
+    flushed = []
+    chunker = ParagraphChunker(flushed.append, min_chars=10, limit=50)
+    for _ in range(40):
+        chunker.feed("word ")
+    assert flushed and all(len(p) <= 50 for p in flushed)
+    chunker.close()
+    assert " ".join(flushed).split() == ["word"] * 40
+
+
+def test_ordered_emitter_holds_later_producers_until_earlier_ones_finish():
+    sent = []
+    emitter = OrderedEmitter(sent.append, 3)
+    emitter.emit(2, "c1")
+    emitter.emit(0, "a1")  # Head producer goes out live
+    emitter.emit(1, "b1")
+    emitter.finish(1)
+    assert sent == ["a1"]
+    emitter.emit(0, "a2")
+    emitter.finish(0)  # Releases 1's held text; 2 becomes head
+    assert sent == ["a1", "a2", "b1", "c1"]
+    emitter.emit(2, "c2")
+    emitter.finish(2)
+    assert sent == ["a1", "a2", "b1", "c1", "c2"]
+
+
+def test_ordered_emitter_keeps_order_with_concurrent_producers():
+    sent = []
+    emitter = OrderedEmitter(sent.append, 4)
+
+    def produce(index):
+        for i in range(50):
+            emitter.emit(index, (index, i))
+        emitter.finish(index)
+    threads = [threading.Thread(target=produce, args=(i,)) for i in reversed(range(4))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sent == [(index, i) for index in range(4) for i in range(50)]
+
+
+class FakeResponse:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def iter_lines(self, decode_unicode=True):
+        return iter(self.lines)
+
+
+def test_iter_sse_events_skips_noise_and_stops_at_done():
+    lines = ['', ': keep-alive', 'data: {"a": 1}', 'data: not json', 'data: {"a": 2}', 'data: [DONE]', 'data: {"a": 3}']
+    assert list(iter_sse_events(FakeResponse(lines))) == [{"a": 1}, {"a": 2}]
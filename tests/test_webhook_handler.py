@@ -0,0 +1,152 @@
+# tests/test_webhook_handler.py
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from src import webhook_handler
+from src.core import state_store
+from src.core.message_queue import WorkerPool
+from src.core.state_store import RedisStateStore
+from src.core.user_context import UserContext
+
+ALICE, BOB, CAROL = "27820000001", "27820000002", "27820000003"
+USERS = {ALICE: 1, BOB: 2, CAROL: 3}
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    # Claims and sessions go to fakeredis; each test starts with an empty front cache
+    store = RedisStateStore(fakeredis.FakeRedis(decode_responses=True), prefix="test:")
+    monkeypatch.setattr(state_store, "_store", store)
+    state_store._recent_messages.clear()
+    return store
+
+
+@pytest.fixture(autouse=True)
+def contexts(monkeypatch):
+    def get_user_contexts(sender_ids):
+        return {s: UserContext(sender_id=s, user_id=USERS[s], company_id="acme") for s in sender_ids if s in USERS}
+    monkeypatch.setattr(webhook_handler, "get_user_contexts", get_user_contexts)
+
+
+@pytest.fixture(autouse=True)
+def replies(monkeypatch):
+    sent = []
+    monkeypatch.setattr(webhook_handler, "send_whatsapp_text", lambda to, text: sent.append((to, text)))
+    return sent
+
+
+@pytest.fixture
+def dispatched(monkeypatch):
+    """Records (sender, message id) in handling order instead of running the handler chain."""
+    calls = []
+
+    def dispatch(ctx, message, msg_type):
+        calls.append((ctx.sender_id, message['id']))
+        if message.get('explode'):
+            raise RuntimeError("handler bug")
+        return True
+    monkeypatch.setattr(webhook_handler, "_dispatch", dispatch)
+    return calls
+
+
+def message(sender, message_id, **extra):
+    return {'from': sender, 'id': message_id, 'type': 'interactive',
+            'interactive': {'type': 'button_reply', 'button_reply': {'id': 'menu'}}, **extra}
+
+
+def payload(*values):
+    """values: one list of changes per entry, each change a dict of messages/statuses."""
+    return {'object': 'whatsapp_business_account',
+            'entry': [{'changes': [{'field': 'messages', 'value': change} for change in changes]} for changes in values]}
+
+
+def test_handles_every_message_across_entries_and_changes(dispatched):
+    data = payload(
+        [{'messages': [message(ALICE, 'm1'), message(BOB, 'm2')]}, {'messages': [message(ALICE, 'm3')]}],
+        [{'messages': [message(CAROL, 'm4')], 'statuses': [{'id': 'out1', 'status': 'sent'}]}],
+    )
+    assert webhook_handler.process_incoming_message(data) is True
+    assert dispatched == [(ALICE, 'm1'), (BOB, 'm2'), (ALICE, 'm3'), (CAROL, 'm4')]
+
+
+def test_duplicates_within_and_across_batches_are_handled_once(dispatched):
+    data = payload([{'messages': [message(ALICE, 'm1'), message(ALICE, 'm1')]}])
+    assert webhook_handler.process_incoming_message(data) is True
+    state_store._recent_messages.clear()  # A Meta retry landing on another worker
+    assert webhook_handler.process_incoming_message(data) is True
+    assert dispatched == [(ALICE, 'm1')]
+
+
+def test_one_failing_message_does_not_cost_the_rest(dispatched, store):
+    data = payload([{'messages': [message(ALICE, 'm1'), message(BOB, 'm2', explode=True), message(CAROL, 'm3')]}])
+    assert webhook_handler.process_incoming_message(data) is False
+    assert dispatched == [(ALICE, 'm1'), (BOB, 'm2'), (CAROL, 'm3')]
+    # The failed message stays claimed, so a retry of the webhook doesn't run it again
+    state_store._recent_messages.clear()
+    assert store.claim_messages([(UserContext(BOB, 2, "acme"), 'm2')]) == set()
+
+
+def test_unknown_and_invalid_senders_are_skipped(dispatched, replies):
+    data = payload([{'messages': [message("27829999999", 'm1'), message("abc", 'm2'), message(ALICE, 'm3')]}])
+    assert webhook_handler.process_incoming_message(data) is False
+    assert dispatched == [(ALICE, 'm3')]
+    assert replies == [("27829999999", "Unauthorized access. Please contact HR.")]
+
+
+def test_malformed_message_rejects_the_payload(dispatched):
+    assert webhook_handler.process_incoming_message(payload([{'messages': [{'from': ALICE}]}])) is False
+    assert dispatched == []
+
+
+def test_session_changes_are_flushed_per_message(monkeypatch, store):
+    def dispatch(ctx, message, msg_type):
+        ctx.session['last'] = message['id']
+        return True
+    monkeypatch.setattr(webhook_handler, "_dispatch", dispatch)
+    webhook_handler.process_incoming_message(payload([{'messages': [message(ALICE, 'm1'), message(ALICE, 'm2')]}]))
+    assert store.load_session(UserContext(ALICE, 1, "acme")).data == {'last': 'm2'}
+
+
+def test_split_payload_keeps_arrival_order_per_sender():
+    data = payload(
+        [{'metadata': {'phone_number_id': 'p'}, 'messages': [message(ALICE, 'a1'), message(BOB, 'b1')]}],
+        [{'messages': [message(ALICE, 'a2'), message(CAROL, 'c1'), message(BOB, 'b2')],
+          'statuses': [{'id': 'out1', 'recipient_id': ALICE, 'status': 'sent'}]}],
+        [{'messages': [message(ALICE, 'a3')]}],
+    )
+    shard = {ALICE: 0, BOB: 1, CAROL: 0}
+    groups = webhook_handler.split_payload(data, shard.get)
+    ids = [[m['id'] for value in webhook_handler.iter_change_values(g) for m in value['messages']] for g in groups]
+    assert ids == [['a1', 'a2', 'c1', 'a3'], ['b1', 'b2']]
+    assert all(not value.get('statuses') for g in groups for value in webhook_handler.iter_change_values(g))
+    assert [webhook_handler.shard_key(g) for g in groups] == [ALICE, BOB]
+
+
+def test_full_queue_asks_meta_to_retry_instead_of_processing_inline(monkeypatch, dispatched):
+    release = threading.Event()
+    pool = WorkerPool(lambda payload: release.wait(5), workers=1, max_depth=1)
+    monkeypatch.setattr(webhook_handler, "get_worker_pool", lambda: pool)
+    monkeypatch.setattr(webhook_handler, "WEBHOOK_ASYNC", True)
+    monkeypatch.setattr(webhook_handler, "WEBHOOK_ENQUEUE_TIMEOUT", 0.05)
+    assert webhook_handler.enqueue_incoming_message(payload([{'messages': [message(ALICE, 'm1')]}])) is True
+    while pool.metrics()['depth']:  # The worker picks m1 up and blocks on it
+        time.sleep(0.01)
+    assert webhook_handler.enqueue_incoming_message(payload([{'messages': [message(ALICE, 'm2')]}])) is True
+    assert webhook_handler.enqueue_incoming_message(payload([{'messages': [message(ALICE, 'm3')]}])) is False
+    assert dispatched == []  # Nothing ran on the request thread
+    assert pool.metrics()['rejected'] == 1
+    release.set()
+
+
+def test_statuses_are_handled_once_per_webhook(monkeypatch, dispatched):
+    handled = []
+    monkeypatch.setattr(webhook_handler, "handle_message_statuses", handled.append)
+    monkeypatch.setattr(webhook_handler, "WEBHOOK_ASYNC", False)
+    status = {'id': 'out1', 'recipient_id': ALICE, 'status': 'sent'}
+    data = payload([{'messages': [message(ALICE, 'm1')], 'statuses': [status]}])
+    assert webhook_handler.enqueue_incoming_message(data) is True
+    assert handled == [[status]]
+    assert dispatched == [(ALICE, 'm1')]
@@ -0,0 +1,27 @@
+# tools/backfill_document_catalogue.py
+# Fill documents.category/doc_date/display_label for existing rows and rows whose s3_key/doc_type changed.
+# Use --recompute after changing the rules in src/core/document_catalogue.py.
+import argparse
+from src.core.document_catalogue import reset_document_catalogue, sync_document_catalogue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the document catalogue columns")
+    parser.add_argument('--company-id', default=None, help="Only this company (default: all)")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--recompute', action='store_true', help="Recompute rows that are already catalogued")
+    args = parser.parse_args()
+    if args.recompute:
+        print(f"Cleared {reset_document_catalogue(args.company_id)} catalogue entries")
+    total = 0
+    while True:
+        done = sync_document_catalogue(args.company_id, batch_size=args.batch_size)
+        if not done:
+            break
+        total += done
+        print(f"Catalogued {total} documents so far")
+    print(f"Done: {total} documents catalogued")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# tools/backfill_document_chunks.py
+# Chunk every document whose content changed since it was last chunked (run once after deploying document_chunks).
+import argparse
+from src.core.document_chunks import sync_document_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill document_chunks and documents.snippet")
+    parser.add_argument('--company-id', default=None, help="Only this company (default: all)")
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+    total = 0
+    while True:
+        done = sync_document_chunks(args.company_id, args.batch_size)
+        if not done:
+            break
+        total += done
+        print(f"Chunked {total} documents so far")
+    print(f"Done: {total} documents chunked")
+
+
+if __name__ == "__main__":
+    main()
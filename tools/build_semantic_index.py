@@ -0,0 +1,32 @@
+# tools/build_semantic_index.py
+# Build the local embedding matrices used when SEMANTIC_SEARCH=true. Re-run after documents change
+# (e.g. nightly); workers pick up the new build on their next query.
+import argparse
+import sys
+from src.core.db_pool import pg_connection
+from src.core.document_chunks import sync_document_chunks
+from src.core.semantic_index import build_company_index
+
+
+def company_ids():
+    with pg_connection() as conn:
+        if not conn:
+            sys.exit("No PG connection; cannot list companies")
+        with conn.cursor() as cur:
+            cur.execute("SELECT DISTINCT company_id FROM documents WHERE company_id IS NOT NULL")
+            return [row[0] for row in cur.fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build per-company semantic search indexes")
+    parser.add_argument('--company-id', default=None, help="Only this company (default: all)")
+    args = parser.parse_args()
+    for company_id in [args.company_id] if args.company_id else company_ids():
+        while sync_document_chunks(company_id):  # Vectors are built from document_chunks
+            pass
+        count = build_company_index(company_id)
+        print(f"{company_id}: {count} chunk vectors")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,10 @@
 import boto3
 import json
-import requests
 import os
 from dotenv import load_dotenv
 import re
-import time
 import difflib
+from src.core.llm_client import LLMClient
 
 load_dotenv()
 
@@ -16,9 +15,12 @@ S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 COMPANY_ID = "meditest"
 GROK_API_KEY = os.getenv("GROK_API_KEY")
 GROK_MODEL = "grok-4-1-fast-reasoning"
+GROK_API_URL = os.getenv("GROK_API_URL", "https://api.x.ai/v1")
 QUERY = ("payslip")  # Change this to your search term
 SENDER_ID = "27828530605"  # Change to test for different users
 
+llm = LLMClient(GROK_API_URL, GROK_API_KEY, GROK_MODEL)
+
 
 def get_s3_client():
     return boto3.client(
@@ -73,53 +75,31 @@ def get_clean_title(filepath: str) -> str:
     return filename.capitalize()
 
 
-def interpret_query(query, retries=3, backoff=2):
+def interpret_query(query):
     prompt = f"Query: '{query}'\nIf this seems misspelled or unclear, suggest a corrected version (e.g., 'code of condct' -> 'code of conduct'). Consider common HR/pharma terms like 'payslip', 'leave policy', 'patient marketing'. If no correction needed, output the original query. Output ONLY the query (corrected or original)."
-    headers = {"Authorization": f"Bearer {GROK_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": GROK_MODEL, "messages": [{"role": "user", "content": prompt}]}
-    for attempt in range(retries):
-        try:
-            response = requests.post("https://api.x.ai/v1/chat/completions", headers=headers, json=payload, timeout=30)
-            if response.status_code == 200:
-                corrected = response.json()['choices'][0]['message']['content'].strip()
-                if corrected != query:
-                    print(
-                        f"Interpreted '{query}' as '{corrected}' for better results. If incorrect, rerun with exact spelling.")
-                    return corrected
-                else:
-                    return query  # No print if unchanged
-        except requests.Timeout:
-            print(f"Timeout on attempt {attempt + 1}. Retrying after {backoff} seconds...")
-            time.sleep(backoff)
-            backoff *= 2
-        except Exception as e:
-            print(f"Interpretation failed on attempt {attempt + 1}: {e}")
-            time.sleep(backoff)
-    print("All retries failed. Using original query.")
-    return query
-
-
-def generate_keywords(query, retries=3, backoff=2):
+    corrected = llm.complete(prompt, kind='interpret')
+    if corrected is None:
+        print("All retries failed. Using original query.")
+        return query
+    if corrected != query:
+        print(
+            f"Interpreted '{query}' as '{corrected}' for better results. If incorrect, rerun with exact spelling.")
+    return corrected
+
+
+def generate_keywords(query):
     prompt = f"Query: '{query}'\nExtract key non-stopwords (ignore 'the', 'and', 'or', etc.). Generate variations: common misspellings, American/British spellings (e.g., color/colour), synonyms. Output ONLY a JSON array of unique strings."
-    headers = {"Authorization": f"Bearer {GROK_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": GROK_MODEL, "messages": [{"role": "user", "content": prompt}]}
-    for attempt in range(retries):
-        try:
-            response = requests.post("https://api.x.ai/v1/chat/completions", headers=headers, json=payload, timeout=30)
-            if response.status_code == 200:
-                content = response.json()['choices'][0]['message']['content'].strip()
-                keywords = json.loads(content)
-                print(f"Generated keywords: {keywords}")
-                return keywords
-        except requests.Timeout:
-            print(f"Timeout on attempt {attempt + 1}. Retrying after {backoff} seconds...")
-            time.sleep(backoff)
-            backoff *= 2  # Exponential backoff
-        except Exception as e:
-            print(f"Keyword generation failed on attempt {attempt + 1}: {e}")
-            time.sleep(backoff)
-    print("All retries failed. Using original query words.")
-    return re.findall(r'\b\w+\b', query.lower())  # Fallback
+    content = llm.complete(prompt, kind='keywords')
+    try:
+        keywords = json.loads(content) if content is not None else None
+    except ValueError as e:
+        print(f"Keyword generation failed: {e}")
+        keywords = None
+    if keywords is None:
+        print("All retries failed. Using original query words.")
+        return re.findall(r'\b\w+\b', query.lower())  # Fallback
+    print(f"Generated keywords: {keywords}")
+    return keywords
 
 
 def search_docs(files, keywords, interpreted_query):
@@ -151,23 +131,16 @@ def summarize_docs(matching_files, query):
         content = fetch_json_content(client, f)
         title = get_clean_title(f)
         prompt = f"Document Name: {title}\nContent: {content}\nQuery: {query}\nOutput Markdown: Start with **{title}** - Relevance: High/Medium/Low. 1-sentence summary. Bullet key details, including relevant sections/subsections where info is found (extract quotes/snippets from those sections if huge doc). Numbered insights. Clean, mobile-friendly, emojis optional. No hashes like # or ### in text."
-        headers = {"Authorization": f"Bearer {GROK_API_KEY}", "Content-Type": "application/json"}
-        payload = {"model": GROK_MODEL, "messages": [{"role": "user", "content": prompt}]}
-        try:
-            response = requests.post("https://api.x.ai/v1/chat/completions", headers=headers, json=payload, timeout=30)
-            if response.status_code == 200:
-                summary = response.json()['choices'][0]['message']['content'].strip()
-                # Remove any hashes
-                summary = re.sub(r'#+\s*', '', summary)
-                # Parse relevance
-                relevance_match = re.search(r'Relevance:\s*(\w+)', summary, re.I)
-                relevance = relevance_match.group(1).capitalize() if relevance_match else 'Unknown'
-                summaries.append((summary, relevance))
-            else:
-                summary = f"**{title}** - Error: Summary failed."
-                summaries.append((summary, 'Unknown'))
-        except Exception as e:
-            summary = f"**{title}** - Error: {str(e)}"
+        summary = llm.complete(prompt, kind='summary')
+        if summary is not None:
+            # Remove any hashes
+            summary = re.sub(r'#+\s*', '', summary)
+            # Parse relevance
+            relevance_match = re.search(r'Relevance:\s*(\w+)', summary, re.I)
+            relevance = relevance_match.group(1).capitalize() if relevance_match else 'Unknown'
+            summaries.append((summary, relevance))
+        else:
+            summary = f"**{title}** - Error: Summary failed."
             summaries.append((summary, 'Unknown'))
 
     # Sort by relevance: High > Medium > Low > Unknown
@@ -0,0 +1,131 @@
+# tools/migrate_schema.py
+# Apply the DDL the app relies on beyond the base tables (users, sessions, documents, ...).
+# Run at deploy time, before new app code starts (see the release line in Procfile); the app itself runs no DDL.
+# Every statement must be safe to re-run. Each runs in its own autocommit transaction with a lock_timeout,
+# so a busy table makes the migration fail fast (re-run it) instead of queueing every read behind it.
+# Indexes are built CONCURRENTLY. Note that adding the STORED content_md5 column and the bigserial doc_id
+# rewrites the documents table once under an ACCESS EXCLUSIVE lock: run the first migration at a quiet time.
+import argparse
+import re
+import sys
+from src.core.db_pool import pg_connection
+
+SCHEMA_STATEMENTS = [
+    # Optimistic versioning for write-back session flushes
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 0",
+    # Webhook dedup: one row per WhatsApp message id, claimed with INSERT ... ON CONFLICT DO NOTHING
+    """CREATE TABLE IF NOT EXISTS processed_messages (
+        message_id text PRIMARY KEY,
+        user_id integer,
+        processed_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS processed_messages_processed_at_idx ON processed_messages (processed_at)",
+    # Set once a claimed message was handled; journal replay re-claims only the ones that never were
+    "ALTER TABLE processed_messages ADD COLUMN IF NOT EXISTS completed_at timestamptz",
+    # Outbound delivery statuses shared across workers, so a sender waiting on one is released wherever it landed
+    """CREATE TABLE IF NOT EXISTS outbound_statuses (
+        message_id text PRIMARY KEY,
+        status text NOT NULL,
+        recorded_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS outbound_statuses_recorded_at_idx ON outbound_statuses (recorded_at)",
+    # Shared tier of the LLM response cache (content-addressed keys, see llm_cache.cache_key)
+    """CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key text PRIMARY KEY,
+        value jsonb NOT NULL,
+        expires_at timestamptz NOT NULL
+    )""",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS llm_cache_expires_at_idx ON llm_cache (expires_at)",
+    # Content fingerprint kept by Postgres on write, so change detection never re-hashes every document
+    """ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_md5 text
+        GENERATED ALWAYS AS (md5(coalesce(content::text, ''))) STORED""",
+    # Ingestion-time chunking: snippet for AI selection, chunks for summaries (see document_chunks.py)
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS snippet text",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS chunked_hash text",  # content_md5 when last chunked
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_unchunked_idx ON documents (company_id) WHERE chunked_hash IS DISTINCT FROM content_md5",
+    """CREATE TABLE IF NOT EXISTS document_chunks (
+        s3_key text NOT NULL,
+        chunk_index integer NOT NULL,
+        section text,
+        start_offset integer NOT NULL,
+        end_offset integer NOT NULL,
+        text text NOT NULL,
+        PRIMARY KEY (s3_key, chunk_index)
+    )""",
+    # S3 object manifest, maintained by object_manifest.ManifestReconciler so sends can skip head_object
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS s3_exists boolean",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS s3_size bigint",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS s3_etag text",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS s3_verified_at timestamptz",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_s3_key_idx ON documents (s3_key)",
+    # When the last full listing finished: vouches for rows it found unchanged without rewriting them
+    """CREATE TABLE IF NOT EXISTS manifest_state (
+        id boolean PRIMARY KEY DEFAULT true CHECK (id),
+        reconciled_at timestamptz NOT NULL
+    )""",
+    # Document catalogue computed once per row (see document_catalogue.py), so listings need no Python regexes
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS category text",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS doc_date date",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS display_label text",
+    # md5 of the inputs (s3_key, doc_type) the entry was computed from; rows whose inputs changed are re-catalogued
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS catalogued_hash text",
+    "DROP INDEX CONCURRENTLY IF EXISTS documents_uncatalogued_idx",
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_catalogue_stale_idx ON documents (company_id)
+        WHERE catalogued_hash IS DISTINCT FROM md5(coalesce(s3_key, '') || '|' || coalesce(doc_type, ''))""",
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_catalogue_idx
+        ON documents (company_id, user_id, category, doc_date DESC NULLS LAST)""",
+    # Stable per-row id for WhatsApp list replies (doc_file_<doc_id>); existing rows are numbered on first run
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS doc_id bigserial",
+    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS documents_doc_id_idx ON documents (doc_id)",
+]
+
+
+_INDEX_NAME_RE = re.compile(r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (\w+)")
+
+
+def _drop_invalid_index(cur, name: str):
+    """A failed CONCURRENTLY build leaves an invalid index that IF NOT EXISTS would skip; drop it so it is rebuilt."""
+    cur.execute(
+        "SELECT NOT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = %s",
+        (name,)
+    )
+    row = cur.fetchone()
+    if row and row[0]:
+        print(f"Dropping invalid index {name}")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def migrate(lock_timeout: str) -> bool:
+    with pg_connection() as conn:
+        if not conn:
+            print("No PG connection; schema not migrated", file=sys.stderr)
+            return False
+        conn.autocommit = True  # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET lock_timeout = %s", (lock_timeout,))
+                for statement in SCHEMA_STATEMENTS:
+                    index = _INDEX_NAME_RE.search(statement)
+                    if index:
+                        _drop_invalid_index(cur, index.group(1))
+                    print(" ".join(statement.split())[:100])
+                    cur.execute(statement)
+            return True
+        except Exception as e:
+            print(f"Schema migration failed: {e}", file=sys.stderr)
+            return False
+        finally:
+            conn.autocommit = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply idempotent schema changes (run at deploy time)")
+    parser.add_argument('--lock-timeout', default='5s', help="Give up on a statement that waits this long for a lock")
+    args = parser.parse_args()
+    if not migrate(args.lock_timeout):
+        sys.exit(1)
+    print("Schema up to date")
+
+
+if __name__ == "__main__":
+    main()